@@ -27,12 +27,22 @@ api/data_setting_api.py
   DELETE /api/mold/dictionary/process_methods/<id>
 
 - 模具与物料对照（MJWLDZhao）：
-  GET    /api/mold/mjwldzhao/list?kw=&page=&size=
+  GET    /api/mold/mjwldzhao/list?kw=&cursor=&size=&match=contains|prefix&with_total=1
+  POST   /api/mold/mjwldzhao/search-index   （可选：建检索列与索引）
+  POST   /api/mold/mjwldzhao/cache/clear    （对照表被外部程序改动后清空总数缓存）
+
+- 批量增删改（一个事务，逐条返回结果）：
+  POST   /api/users/batch
+  POST   /api/mold/dictionary/refund_methods/batch
+  POST   /api/mold/dictionary/process_methods/batch
+  POST   /api/mold/mjwldzhao/batch
+  body: {"ops": [{"op": "create"|"update"|"delete", ...}], "atomic": true}
 """
 
 
 from flask import Blueprint, request, jsonify
 from modules.data_setting import DataSettingService
+from modules import ref_cache
 
 
 data_setting_api = Blueprint("data_setting", __name__)
@@ -82,9 +92,8 @@ def users_delete(uid: int):
 @data_setting_api.route("/mold/dictionary/refund_methods", methods=["GET"])
 def refund_list():
     try:
-        rows = svc.list_refund_methods()
-        # 前端已兼容直接数组或 {data: []}，这里直接返回数组
-        return jsonify(rows)
+        # 前端已兼容直接数组或 {data: []}，这里直接返回数组（字典缓存 + ETag）
+        return ref_cache.response("setting.refund_methods")
     except Exception as e:
         return jsonify({"success": False, "msg": f"查询失败: {e}"}), 500
 
@@ -126,8 +135,7 @@ def refund_delete(rid: int):
 @data_setting_api.route("/mold/dictionary/process_methods", methods=["GET"])
 def proc_list():
     try:
-        rows = svc.list_process_methods()
-        return jsonify(rows)  # 直接数组
+        return ref_cache.response("setting.process_methods")  # 直接数组
     except Exception as e:
         return jsonify({"success": False, "msg": f"查询失败: {e}"}), 500
 
@@ -170,9 +178,63 @@ def proc_delete(pid: int):
 def mjwldzhao_list():
     try:
         kw = (request.args.get("kw") or "").strip()
+        cursor = (request.args.get("cursor") or "").strip() or None
         page = int(request.args.get("page") or 1)
         size = int(request.args.get("size") or 20)
-        rows, total = svc.list_mjwldzhao(kw=kw, page=page, size=size)
-        return jsonify({"success": True, "data": rows, "total": total})
+        res = svc.page_mjwldzhao(
+            kw=kw, cursor=cursor, size=size, page=page,
+            match=(request.args.get("match") or "contains"),
+            with_total=request.args.get("with_total", "1") != "0",
+        )
+        return jsonify({"success": True, **res})
     except Exception as e:
         return jsonify({"success": False, "msg": f"查询失败: {e}"}), 500
+
+
+@data_setting_api.route("/mold/mjwldzhao/search-index", methods=["POST"])
+def mjwldzhao_search_index():
+    try:
+        return jsonify({"success": True, **svc.ensure_mjwldzhao_search_column()})
+    except Exception as e:
+        return jsonify({"success": False, "msg": f"创建失败: {e}"}), 400
+
+
+@data_setting_api.route("/mold/mjwldzhao/cache/clear", methods=["POST"])
+def mjwldzhao_cache_clear():
+    svc.invalidate_mjwldzhao_cache()
+    return jsonify({"success": True})
+
+
+# -------- 批量增删改 --------
+def _batch(entity: str):
+    try:
+        payload = request.get_json(force=True, silent=True)
+        if isinstance(payload, list):
+            payload = {"ops": payload}
+        payload = payload or {}
+        res = svc.batch_apply(entity, payload.get("ops"), atomic=payload.get("atomic", True) is not False)
+        return jsonify(res)
+    except ValueError as e:
+        return jsonify({"success": False, "msg": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "msg": f"批量操作失败: {e}"}), 500
+
+
+@data_setting_api.route("/users/batch", methods=["POST"])
+def users_batch():
+    return _batch("users")
+
+
+@data_setting_api.route("/mold/dictionary/refund_methods/batch", methods=["POST"])
+def refund_batch():
+    return _batch("refund_methods")
+
+
+@data_setting_api.route("/mold/dictionary/process_methods/batch", methods=["POST"])
+def proc_batch():
+    return _batch("process_methods")
+
+
+@data_setting_api.route("/mold/mjwldzhao/batch", methods=["POST"])
+def mjwldzhao_batch():
+    return _batch("mappings")
@@ -1,13 +1,10 @@
 # api/mold_api.py
 from flask import Blueprint, request, jsonify, send_file
-from modules import mold
+from modules import mold, attachment_store, ref_cache
 import json
 import os
-import io, csv, datetime
-try:
-    import pandas as pd
-except Exception:
-    pd = None
+import io, csv, datetime, itertools
+import tempfile
 from flask import Response
 
 mold_api = Blueprint('mold_api', __name__)
@@ -25,13 +22,19 @@ def inventory_search():
 
 @mold_api.route('/dictionary/refund_methods')
 def dict_refund_methods():
-    """返还方式下拉：Mujufanhuan"""
-    return jsonify(mold.list_refund_methods())
+    """返还方式下拉：Mujufanhuan（字典缓存 + ETag）"""
+    try:
+        return ref_cache.response('refund_methods')
+    except Exception as e:
+        return jsonify({'success': False, 'msg': f'返还方式加载失败：{e}'}), 500
 
 @mold_api.route('/dictionary/process_methods')
 def dict_process_methods():
-    """模具工艺下拉：MJGYi"""
-    return jsonify(mold.list_process_methods())
+    """模具工艺下拉：MJGYi（字典缓存 + ETag）"""
+    try:
+        return ref_cache.response('process_methods')
+    except Exception as e:
+        return jsonify({'success': False, 'msg': f'模具工艺加载失败：{e}'}), 500
 
 # ---------- 工具 ----------
 def _parse_material_codes(form):
@@ -68,6 +71,14 @@ def _safe_int(x):
     except Exception:
         return None
 
+def _request_list(key, cast=_safe_int):
+    """列表参数：GET ?key=1,2,3 或 POST JSON {"key": [1,2,3]}；无法转换的值丢弃"""
+    data = request.get_json(silent=True) or {}
+    raw = data.get(key) or request.values.get(key, '')
+    if isinstance(raw, str):
+        raw = raw.split(',')
+    return [v for v in (cast(str(x).strip()) for x in raw) if v not in (None, '')]
+
 # ---------- 台账：新增/更新/列表/详情/删除 ----------
 @mold_api.route('/period', methods=['POST'])
 def add_mold_period():
@@ -162,9 +173,44 @@ def update_mold_period(mold_id):
     )
     return jsonify(result)
 
+def _period_filters(args):
+    """从查询参数解析台账过滤条件（与 modules.mold._mold_filters 对应）"""
+    return {
+        'keyword': (args.get('kw') or '').strip() or None,
+        'product': (args.get('product') or '').strip() or None,
+        'supplier': (args.get('supplier') or '').strip() or None,
+        'supplier_id': _safe_int(args.get('supplier_id')),
+        'company': (args.get('company') or '').strip() or None,
+        'date_from': args.get('date_from') or None,
+        'date_to': args.get('date_to') or None,
+        'is_invoiced': args.get('is_invoiced') if args.get('is_invoiced') in ('0', '1') else None,
+        'casting_supplier_id': _safe_int(args.get('casting_supplier_id')),
+        'mold_supplier_id': _safe_int(args.get('mold_supplier_id')),
+        'process': (args.get('process') or '').strip() or None,
+    }
+
 @mold_api.route('/period/list')
 def period_list():
-    return jsonify({'data': mold.list_mold_period_v2()})
+    """
+    台账列表（服务端分页/过滤/排序）
+    查询参数：
+      - page_size: 每页条数（默认 50，最大 500）
+      - cursor: 上一页返回的 next_cursor（键集翻页）
+      - sort: id_desc / id_asc / start_date_desc / start_date_asc / end_date_* / amount_* / product_name_*
+      - kw, product, supplier, supplier_id, company, date_from, date_to, is_invoiced(0/1)
+      - with_total: 0 时不返回总数
+    """
+    try:
+        result = mold.page_mold_period_v2(
+            sort=request.args.get('sort') or 'id_desc',
+            after=request.args.get('cursor') or None,
+            limit=_safe_int(request.args.get('page_size')) or mold.MOLD_PAGE_SIZE,
+            with_total=request.args.get('with_total') != '0',
+            **_period_filters(request.args)
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'msg': str(e)}), 400
+    return jsonify(result)
 
 @mold_api.route('/period/<int:mold_id>')
 def period_detail(mold_id):
@@ -178,6 +224,63 @@ def period_detail(mold_id):
         print(traceback.format_exc())
         return jsonify({'success': False, 'msg': str(e)}), 500
 
+# ---------- 批量查询（一次请求取回多条，每类一条语句） ----------
+def _batch_args(key, cast=_safe_int):
+    values = _request_list(key, cast)
+    if len(values) > mold.MAX_BATCH_IDS:
+        raise ValueError(f'{key} 一次最多 {mold.MAX_BATCH_IDS} 个')
+    return values
+
+@mold_api.route('/period/batch', methods=['GET', 'POST'])
+def period_batch():
+    """多个台账详情（含附件）：mold_ids -> {"data": {"<id>": {...}}}"""
+    try:
+        mold_ids = _batch_args('mold_ids')
+    except ValueError as e:
+        return jsonify({'success': False, 'msg': str(e)}), 400
+    data = mold.get_mold_periods_v2(mold_ids)
+    return jsonify({'success': True, 'data': {str(k): v for k, v in data.items()}})
+
+@mold_api.route('/inventory/batch', methods=['GET', 'POST'])
+def inventory_batch():
+    """多个物料编码：cinvcodes -> {"data": {"<cInvCode>": {"cInvCode", "cInvName"}}}"""
+    try:
+        codes = _batch_args('cinvcodes', cast=str)
+    except ValueError as e:
+        return jsonify({'success': False, 'msg': str(e)}), 400
+    return jsonify({'success': True, 'data': mold.get_inventory_by_codes(codes)})
+
+@mold_api.route('/supplier/batch', methods=['GET', 'POST'])
+def supplier_batch():
+    """多个供应商：supplier_ids -> {"data": {"<id>": {...}}}"""
+    try:
+        supplier_ids = _batch_args('supplier_ids')
+    except ValueError as e:
+        return jsonify({'success': False, 'msg': str(e)}), 400
+    data = mold.get_suppliers_by_ids(supplier_ids)
+    return jsonify({'success': True, 'data': {str(k): v for k, v in data.items()}})
+
+@mold_api.route('/lookup', methods=['GET', 'POST'])
+def batch_lookup():
+    """
+    组合批量查询：mold_ids / cinvcodes / supplier_ids 任意组合，一次往返
+    返回 {"molds": {...}, "inventory": {...}, "suppliers": {...}}（只含请求了的部分）
+    """
+    try:
+        mold_ids = _batch_args('mold_ids')
+        codes = _batch_args('cinvcodes', cast=str)
+        supplier_ids = _batch_args('supplier_ids')
+    except ValueError as e:
+        return jsonify({'success': False, 'msg': str(e)}), 400
+    result = {'success': True}
+    if mold_ids:
+        result['molds'] = {str(k): v for k, v in mold.get_mold_periods_v2(mold_ids).items()}
+    if codes:
+        result['inventory'] = mold.get_inventory_by_codes(codes)
+    if supplier_ids:
+        result['suppliers'] = {str(k): v for k, v in mold.get_suppliers_by_ids(supplier_ids).items()}
+    return jsonify(result)
+
 @mold_api.route('/period/delete/<int:mold_id>', methods=['POST'])
 def period_delete(mold_id):
     result = mold.delete_mold_period(mold_id)
@@ -195,23 +298,71 @@ def attachment_download(attachment_id):
         files = mold.get_attachments_by_id(attachment_id)
         if not files or not files.get('file_path') or not os.path.isfile(files['file_path']):
             return jsonify({'success': False, 'msg': '文件不存在'}), 404
-        return send_file(files['file_path'], as_attachment=True, download_name=files['file_name'])
+        # conditional=True：支持 If-None-Match / If-Modified-Since（304）与 Range（断点续传、206）
+        # 内容寻址的附件以 SHA-256 作 ETag，历史附件沿用按修改时间/大小生成的 ETag
+        return send_file(
+            files['file_path'],
+            as_attachment=True,
+            download_name=files['file_name'],
+            conditional=True,
+            etag=files.get('etag') or True,
+        )
     except Exception as e:
         import traceback
         print('【ERROR】下载接口traceback：\n', traceback.format_exc())
         return jsonify({'success': False, 'msg': '下载失败: ' + str(e)}), 500
 
+MAX_ZIP_MOLDS = 500
+
+@mold_api.route('/attachment/zip/<int:mold_id>')
+@mold_api.route('/attachment/zip', methods=['GET', 'POST'])
+def attachment_zip(mold_id=None):
+    """
+    打包下载附件（流式 ZIP，边读边发，不生成临时文件）
+    - /attachment/zip/<mold_id>：单个台账
+    - /attachment/zip?mold_ids=1,2,3 或 POST JSON {"mold_ids": [1,2,3]}：多个台账
+    - compress=1 时压缩（默认仅存储）
+    压缩包内按 "<模具ID>_<产品名称>/<附件名>" 分目录
+    """
+    if mold_id is not None:
+        mold_ids = [mold_id]
+    else:
+        mold_ids = _request_list('mold_ids')
+    if not mold_ids:
+        return jsonify({'success': False, 'msg': 'mold_ids无效'}), 400
+    if len(mold_ids) > MAX_ZIP_MOLDS:
+        return jsonify({'success': False, 'msg': f'一次最多打包 {MAX_ZIP_MOLDS} 个台账'}), 400
+
+    rows = mold.list_attachments_for_molds(mold_ids)
+    if not rows:
+        return jsonify({'success': False, 'msg': '无附件'}), 404
+    entries = [(f"{m_id}_{product or ''}", file_name, path) for m_id, product, _, file_name, path in rows]
+
+    ts = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f"mold_{mold_ids[0]}_attachments_{ts}.zip" if len(mold_ids) == 1 else f"mold_attachments_{ts}.zip"
+    return Response(
+        attachment_store.iter_zip(entries, compress=request.args.get('compress') == '1'),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': f"attachment; filename={filename}; filename*=UTF-8''{filename}",
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
 # ---------- 兼容：模具搜索（简单用列表结果做前端下拉/模糊） ----------
+@mold_api.route('/search')
 @mold_api.route('/mold/search')
 def mold_search():
-    kw = (request.args.get('kw') or '').strip().lower()
-    rows = mold.list_mold_period_v2()
+    """
+    模具联想（mold_transfer.html 使用 /api/mold/search）
+    有关键字时走内存索引（ID / 产品名称 / 物料编码 / 供应商 / 拼音首字母），按得分排序；
+    无关键字时返回最新登记的 100 条
+    """
+    kw = (request.args.get('kw') or '').strip()
+    limit = min(_safe_int(request.args.get('limit')) or 20, 100)
     if kw:
-        rows = [
-            r for r in rows
-            if kw in str(r.get('mold_id', '')).lower()
-               or kw in (r.get('product_name', '') or '').lower()
-        ]
+        return jsonify(mold.search_molds(kw, limit))
+    rows = mold.list_mold_period_v2(limit=100)
     # 精简返回，但包含前端需要的供应商名
     brief = [{
         'mold_id': r['mold_id'],
@@ -222,49 +373,67 @@ def mold_search():
     return jsonify(brief)
 
 # ---------- 导出 ----------
+# 默认导出列（与 list_mold_period_v2 返回的键一致）
+EXPORT_DEFAULT_FIELDS = [
+    'mold_id','product_name','casting_supplier','mold_supplier','materials',
+    'start_date','end_date','amount','refund','process','company','remark'
+]
+# 中文表头（可按需调整）
+EXPORT_HEADERS = {
+    'mold_id':'模具ID','product_name':'产品名称','casting_supplier':'铸造供应商',
+    'mold_supplier':'模具供应商','materials':'物料编码(汇总)','start_date':'开模时间',
+    'end_date':'交付时间','amount':'金额','refund':'返还方式','process':'模具工艺',
+    'company':'所属公司','remark':'备注','advance_amount':'预付款','balance_unpaid':'余款未付',
+    'is_invoiced':'是否开票'
+}
+
+def _export_fields(args):
+    """fields 参数：逗号分隔；只接受已知字段名（字段会拼进 SELECT）"""
+    fields_param = (args.get('fields') or '').strip()
+    fields = [f.strip() for f in fields_param.split(',') if f.strip() in EXPORT_HEADERS]
+    return fields or EXPORT_DEFAULT_FIELDS
+
+def _export_chunks(args, fields):
+    """返回 (首批行, 批次迭代器)；无数据时首批为 None"""
+    chunks = mold.iter_mold_period_v2(fields, sort=args.get('sort') or 'id_desc', **_period_filters(args))
+    first = next(chunks, None)
+    return first, chunks
+
 @mold_api.route('/period/export/csv', methods=['GET'])
 def period_export_csv():
     """
-    导出全部模具列表为 CSV（UTF-8-SIG，Excel 直接打开不乱码）
+    导出模具列表为 CSV（UTF-8-SIG，Excel 直接打开不乱码）
+    按批从数据库游标读取、边读边写出，内存中只保留一批数据
     可选查询参数：
-      - fields: 用逗号分隔的字段名，默认导出全部常用列
+      - fields: 用逗号分隔的字段名，默认导出全部常用列（只查询所选列）
+      - sort 及过滤条件：同 /period/list
     """
-    rows = mold.list_mold_period_v2()  # 数据来源
-    if not rows:
+    fields = _export_fields(request.args)
+    first, chunks = _export_chunks(request.args, fields)
+    if first is None:
         return jsonify({'success': False, 'msg': '没有可导出的数据'}), 404
 
-    # 默认导出列（与 list_mold_period_v2 返回的键一致）
-    default_fields = [
-        'mold_id','product_name','casting_supplier','mold_supplier','materials',
-        'start_date','end_date','amount','refund','process','company','remark'
-    ]
-    fields_param = (request.args.get('fields') or '').strip()
-    fields = [f.strip() for f in fields_param.split(',') if f.strip()] or default_fields
-
-    # 中文表头（可按需调整）
-    header_map = {
-        'mold_id':'模具ID','product_name':'产品名称','casting_supplier':'铸造供应商',
-        'mold_supplier':'模具供应商','materials':'物料编码(汇总)','start_date':'开模时间',
-        'end_date':'交付时间','amount':'金额','refund':'返还方式','process':'模具工艺',
-        'company':'所属公司','remark':'备注'
-    }
-    titles = [header_map.get(f, f) for f in fields]
+    def generate():
+        sio = io.StringIO(newline='')
+        writer = csv.writer(sio)
 
-    # 写入 CSV 文本
-    sio = io.StringIO(newline='')
-    writer = csv.writer(sio)
-    writer.writerow(titles)
-    for r in rows:
-        writer.writerow([(r.get(f, '') if r.get(f, '') is not None else '') for f in fields])
+        def flush():
+            data = sio.getvalue()
+            sio.seek(0); sio.truncate(0)
+            return data.encode('utf-8')
 
-    # 关键：以 UTF-8-SIG 编码返回，Excel 不会乱码
-    data = sio.getvalue().encode('utf-8-sig')
-    sio.close()
+        # 关键：UTF-8 BOM 开头，Excel 不会乱码
+        writer.writerow([EXPORT_HEADERS.get(f, f) for f in fields])
+        yield '\ufeff'.encode('utf-8') + flush()
+        for rows in itertools.chain([first], chunks):
+            for r in rows:
+                writer.writerow(['' if v is None else v for v in r])
+            yield flush()
 
     ts = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
     filename = f"mold_list_{ts}.csv"
     return Response(
-        data,
+        generate(),
         mimetype='text/csv; charset=utf-8',
         headers={
             'Content-Disposition': f"attachment; filename={filename}; filename*=UTF-8''{filename}"
@@ -274,43 +443,147 @@ def period_export_csv():
 @mold_api.route('/period/export/xlsx', methods=['GET'])
 def period_export_xlsx():
     """
-    导出全部模具列表为 Excel（.xlsx）
-    需要 pandas + openpyxl；若环境无 pandas，请使用上面的 CSV 接口
+    导出模具列表为 Excel（.xlsx）
+    需要 openpyxl；使用只写模式（write_only）逐批追加行，工作簿写入临时文件后按块发送
+    参数同 CSV 接口；若环境无 openpyxl，请使用上面的 CSV 接口
     """
-    if pd is None:
-        return jsonify({'success': False, 'msg': '服务器未安装 pandas，请改用 /period/export/csv'}), 500
+    # openpyxl 首次导出时才加载，不拖慢启动
+    try:
+        from openpyxl import Workbook
+    except Exception:
+        return jsonify({'success': False, 'msg': '服务器未安装 openpyxl，请改用 /period/export/csv'}), 500
 
-    rows = mold.list_mold_period_v2()
-    if not rows:
+    fields = _export_fields(request.args)
+    first, chunks = _export_chunks(request.args, fields)
+    if first is None:
         return jsonify({'success': False, 'msg': '没有可导出的数据'}), 404
 
-    df = pd.DataFrame(rows, columns=[
-        'mold_id','product_name','casting_supplier','mold_supplier','materials',
-        'start_date','end_date','amount','refund','process','company','remark'
-    ])
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('模具列表')
+    ws.append([EXPORT_HEADERS.get(f, f) for f in fields])
+    for rows in itertools.chain([first], chunks):
+        for r in rows:
+            ws.append(list(r))
 
-    # 可选：重命名表头为中文
-    df = df.rename(columns={
-        'mold_id':'模具ID','product_name':'产品名称','casting_supplier':'铸造供应商',
-        'mold_supplier':'模具供应商','materials':'物料编码(汇总)','start_date':'开模时间',
-        'end_date':'交付时间','amount':'金额','refund':'返还方式','process':'模具工艺',
-        'company':'所属公司','remark':'备注'
-    })
-
-    bio = io.BytesIO()
-    with pd.ExcelWriter(bio, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='模具列表', index=False)
-    bio.seek(0)
+    # 临时文件在响应发送完毕关闭时自动删除
+    tmp = tempfile.TemporaryFile(suffix='.xlsx')
+    wb.save(tmp)
+    tmp.seek(0)
 
     ts = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
     filename = f"mold_list_{ts}.xlsx"
     return send_file(
-        bio,
+        tmp,
         as_attachment=True,
         download_name=filename,
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
 
+@mold_api.route('/period/import', methods=['POST'])
+def period_import():
+    """
+    批量导入模具台账（multipart：file=.xlsx/.xls/.csv）
+    表头可用导出文件的中文表头；dry_run=1 时只校验不写入
+    校验失败的行跳过并逐行返回错误，其余行一次事务写入
+    """
+    from modules import mold_import  # 依赖 pandas，首次导入时才加载
+
+    f = request.files.get('file')
+    if not f or not f.filename:
+        return jsonify({'success': False, 'msg': '请上传文件'}), 400
+    try:
+        df = mold_import.read_sheet(f)
+    except ValueError as e:
+        return jsonify({'success': False, 'msg': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'msg': f'文件读取失败：{e}'}), 400
+    dry_run = (request.values.get('dry_run') or '').lower() in ('1', 'true', 'yes')
+    return jsonify(mold_import.import_molds(df, dry_run=dry_run))
+
+# ---------- 费用汇总报表 ----------
+# 汇总维度 -> 台账列表的过滤参数（下钻到模具明细时使用）
+_DRILL_FILTERS = {
+    'casting_supplier': 'casting_supplier_id',
+    'mold_supplier': 'mold_supplier_id',
+    'company': 'company',
+    'process': 'process',
+}
+
+def _month_range(period):
+    """'YYYY-MM' -> ('YYYY-MM-01', 该月最后一天)"""
+    first = datetime.datetime.strptime(period + '-01', '%Y-%m-%d').date()
+    nxt = (first.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return first.isoformat(), (nxt - datetime.timedelta(days=1)).isoformat()
+
+@mold_api.route('/report/cost')
+def report_cost():
+    """
+    模具费用汇总（读增量维护的 MoldCostSummary）
+    查询参数：
+      - dim: all / casting_supplier / mold_supplier / company / process（默认 casting_supplier）
+      - period_from, period_to: 开模月份范围 YYYY-MM
+      - key: 下钻到某个维度取值，返回按月份展开
+      - key + period: 再下钻到模具明细（分页参数同 /period/list）
+    """
+    dim = request.args.get('dim') or 'casting_supplier'
+    key = request.args.get('key')
+    period = (request.args.get('period') or '').strip()
+    period_from = request.args.get('period_from') or None
+    period_to = request.args.get('period_to') or None
+    try:
+        if key is not None and period:
+            filters = {}
+            if dim in _DRILL_FILTERS:
+                filters[_DRILL_FILTERS[dim]] = key
+            filters['date_from'], filters['date_to'] = _month_range(period)
+            result = mold.page_mold_period_v2(
+                after=request.args.get('cursor') or None,
+                limit=_safe_int(request.args.get('page_size')) or mold.MOLD_PAGE_SIZE,
+                **filters
+            )
+            return jsonify(dict(result, success=True, level='molds'))
+        if key is not None:
+            data = mold.mold_cost_summary(dim, key, period_from, period_to)
+            return jsonify({'success': True, 'level': 'periods', 'data': data})
+        data = mold.mold_cost_summary(dim, None, period_from, period_to)
+        total = mold.mold_cost_summary('all', None, period_from, period_to)
+        return jsonify({'success': True, 'level': 'keys', 'data': data, 'total': total[0] if total else None})
+    except ValueError as e:
+        return jsonify({'success': False, 'msg': str(e)}), 400
+
+@mold_api.route('/report/cost/rebuild', methods=['POST'])
+def report_cost_rebuild():
+    """按台账全量重算费用汇总（校准用）"""
+    return jsonify(mold.rebuild_mold_cost_summary())
+
+# ---------- 模具-物料对照 ----------
+@mold_api.route('/material/<path:cinvcode>/molds')
+def material_molds(cinvcode):
+    """物料 -> 使用该物料的模具"""
+    return jsonify({'success': True, 'cinvcode': cinvcode, 'data': mold.molds_for_material(cinvcode)})
+
+@mold_api.route('/period/<int:mold_id>/materials')
+def mold_materials(mold_id):
+    """模具 -> 物料编码及存货名称"""
+    return jsonify({'success': True, 'mold_id': mold_id, 'data': mold.materials_for_molds([mold_id]).get(mold_id, [])})
+
+@mold_api.route('/materials', methods=['GET', 'POST'])
+def molds_materials_bulk():
+    """
+    多个模具的物料，一次查询
+    GET ?mold_ids=1,2,3 或 POST JSON {"mold_ids": [1,2,3]}
+    """
+    mold_ids = _request_list('mold_ids')
+    if not mold_ids:
+        return jsonify({'success': False, 'msg': 'mold_ids无效'}), 400
+    data = mold.materials_for_molds(mold_ids)
+    return jsonify({'success': True, 'data': {str(k): v for k, v in data.items()}})
+
+@mold_api.route('/materials/rebuild', methods=['POST'])
+def molds_materials_rebuild():
+    """按 Mold.materials 全量重建模具-物料对照"""
+    return jsonify(mold.rebuild_mold_materials())
+
 # ---------- 调拨记录 ----------
 @mold_api.route('/transfer/list')
 def transfer_list():
@@ -319,3 +592,44 @@ def transfer_list():
         return jsonify({'success': False, 'msg': 'mold_id无效'}), 400
     data = mold.list_transfer_records(int(mold_id))
     return jsonify({'success': True, 'data': data})
+
+@mold_api.route('/transfer', methods=['POST'])
+def transfer_add():
+    """
+    登记调拨（JSON 或表单）：mold_id, to_supplier_id|to_supplier, from_supplier_id|from_supplier,
+    transfer_date, quantity, note
+    """
+    data = request.get_json(silent=True) or request.form.to_dict()
+    mold_id = _safe_int(data.get('mold_id'))
+    if mold_id is None:
+        return jsonify({'success': False, 'msg': 'mold_id无效'}), 400
+    result = mold.add_transfer_record(
+        mold_id=mold_id,
+        to_supplier_id=_safe_int(data.get('to_supplier_id')),
+        from_supplier_id=_safe_int(data.get('from_supplier_id')),
+        to_supplier=(data.get('to_supplier') or '').strip() or None,
+        from_supplier=(data.get('from_supplier') or '').strip() or None,
+        transfer_date=data.get('transfer_date') or None,
+        quantity=_safe_int(data.get('quantity')),
+        note=data.get('note') or ''
+    )
+    return jsonify(result)
+
+@mold_api.route('/latest-transfer/<int:mold_id>')
+def latest_transfer(mold_id):
+    """单个模具当前位置（最近一次调拨）"""
+    info = mold.get_current_locations([mold_id]).get(mold_id)
+    return jsonify(dict(info or {'mold_id': mold_id}, success=True))
+
+@mold_api.route('/latest-transfer', methods=['GET', 'POST'])
+def latest_transfer_bulk():
+    """
+    多个模具当前位置，一次查询
+    GET ?mold_ids=1,2,3 或 POST JSON {"mold_ids": [1,2,3]}
+    返回 {"success": true, "data": {"1": {...}, ...}}，无调拨记录的模具不在 data 中
+    """
+    mold_ids = _request_list('mold_ids')
+    if not mold_ids:
+        return jsonify({'success': False, 'msg': 'mold_ids无效'}), 400
+    locations = mold.get_current_locations(mold_ids)
+    return jsonify({'success': True, 'data': {str(k): v for k, v in locations.items()}})
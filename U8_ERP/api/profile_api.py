@@ -0,0 +1,78 @@
+# api/profile_api.py
+"""
+按需剖析接口（仅管理员，见 modules/profiler.py）
+- 任意请求带请求头 X-Profile: 1 且当前用户为管理员时剖析该请求，响应头 X-Profile-Id 为剖析编号
+- GET  /api/profile/list                    最近的剖析记录
+- GET  /api/profile/<id>                    元数据 + SQL 耗时明细
+- GET  /api/profile/<id>/wall.folded        墙钟折叠栈（flamegraph.pl / speedscope）
+- GET  /api/profile/<id>/cpu.folded         CPU 折叠栈
+- POST /api/profile/arm  {"job": "sync_all", "count": 1}   预约剖析下一次后台任务
+"""
+
+from flask import Blueprint, request, jsonify, send_file
+
+from modules import profiler
+from api.user_api import current_identity, login_required
+
+profile_api = Blueprint('profile_api', __name__)
+
+def ok(data=None, msg='success'):
+    return jsonify({'code': 0, 'msg': msg, 'data': data})
+
+def fail(msg, code=-1):
+    return jsonify({'code': code, 'msg': msg, 'data': None})
+
+
+# ---------- 请求剖析（全局钩子） ----------
+@profile_api.before_app_request
+def _start_profile():
+    if request.headers.get(profiler.PROFILE_HEADER) not in ('1', 'true'):
+        return
+    identity = current_identity()
+    if identity and identity.get('role') == 'admin':
+        profiler.start_request(f"{request.method} {request.path}")
+
+@profile_api.after_app_request
+def _finish_profile(response):
+    if profiler.active():
+        meta = profiler.finish_request(status=response.status_code, query=request.query_string.decode('utf-8', 'replace'))
+        response.headers['X-Profile-Id'] = meta['id']
+    return response
+
+@profile_api.teardown_app_request
+def _discard_profile(exc):
+    # after_request 未执行（如响应生成前连接中断）时停止采样线程
+    profiler.finish_request(save=False)
+
+
+# ---------- 查询 / 预约 ----------
+@profile_api.route('/list', methods=['GET'])
+@login_required('admin')
+def profile_list():
+    return ok({'profiles': profiler.list_profiles(), 'armed': profiler.armed()})
+
+@profile_api.route('/<profile_id>', methods=['GET'])
+@login_required('admin')
+def profile_detail(profile_id):
+    meta = profiler.load_meta(profile_id)
+    if meta is None:
+        return fail('剖析记录不存在'), 404
+    return ok(meta)
+
+@profile_api.route('/<profile_id>/<kind>.folded', methods=['GET'])
+@login_required('admin')
+def profile_folded(profile_id, kind):
+    path = profiler.folded_path(profile_id, kind)
+    if path is None:
+        return fail('剖析记录不存在'), 404
+    return send_file(path, mimetype='text/plain', as_attachment=True, download_name=f"{profile_id}.{kind}.folded")
+
+@profile_api.route('/arm', methods=['POST'])
+@login_required('admin')
+def profile_arm():
+    data = request.get_json(silent=True) or {}
+    try:
+        armed = profiler.arm(data.get('job'), data.get('count') or 1)
+    except (TypeError, ValueError) as e:
+        return fail(str(e)), 400
+    return ok(armed, msg=f"已预约剖析任务 {data.get('job')}")
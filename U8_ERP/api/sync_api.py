@@ -1,7 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from datetime import datetime, timedelta
+import json
+import time
 import traceback
 from modules import sync
+from modules.sync_progress import progress
+from db.statements import stats as statement_stats
 
 sync_api = Blueprint('sync_api', __name__)
 
@@ -13,6 +17,11 @@ def fail(msg, code=-1):
 
 DATE_FMT = "%Y-%m-%d"
 
+# 进度流：无同步进行满 SSE_IDLE_SECONDS 秒后发送 end 事件并结束；单次连接最长 SSE_MAX_SECONDS 秒
+# （到时直接断开，浏览器按 retry 携带 Last-Event-ID 自动重连），避免一个页面永久占用一个工作线程
+SSE_IDLE_SECONDS = 10
+SSE_MAX_SECONDS = 300
+
 def get_dates():
     """
     智能获取区间，若前端未选，默认用今天到今天+30天
@@ -98,3 +107,77 @@ def sync_all_api():
         return ok(msg=f'全量同步完成 {start_date} ~ {end_date}')
     except Exception as e:
         return fail(str(e) + "\n" + traceback.format_exc())
+
+@sync_api.route('/all_accounts', methods=['POST'])
+def sync_all_accounts_api():
+    """
+    多账套并行全量同步接口（需区间参数）
+    可选 JSON 参数 account_codes: ["022", "088"]，不传则同步 ACCOUNT_SETS 全部账套
+    """
+    try:
+        start_date, end_date = get_dates()
+        account_codes = (request.json or {}).get('account_codes') or None
+        summary = sync.sync_all_accounts(start_date, end_date, account_codes)
+        msg = f"多账套同步完成 {start_date} ~ {end_date}，共{len(summary['accounts'])}个账套，失败{summary['failed']}个，耗时{summary['elapsed']}秒"
+        if summary['failed']:
+            return jsonify({'code': -1, 'msg': msg, 'data': summary})
+        return ok(summary, msg=msg)
+    except Exception as e:
+        return fail(str(e) + "\n" + traceback.format_exc())
+
+@sync_api.route('/progress', methods=['GET'])
+def sync_progress_api():
+    """
+    各阶段最新进度快照（非流式，便于轮询/排查）
+    """
+    return ok({'last_seq': progress.last_seq, 'stages': progress.latest()})
+
+@sync_api.route('/statements', methods=['GET'])
+def sync_statements_api():
+    """
+    参数化语句执行统计（按总耗时倒序），?reset=1 读取后清零
+    """
+    data = statement_stats.snapshot()
+    if request.args.get('reset') in ('1', 'true'):
+        statement_stats.reset()
+    return ok(data)
+
+@sync_api.route('/progress/stream', methods=['GET'])
+def sync_progress_stream():
+    """
+    同步进度 Server-Sent Events 流
+    - 事件类型 progress，data 为 JSON：stage/status/query/rows_read/rows_written/rows_per_sec/errors/elapsed
+    - 支持 Last-Event-ID（或 ?since=）断线续传；每 15 秒一次心跳注释防止代理断开
+    - 没有同步在进行时（含刚连接时的 SSE_IDLE_SECONDS 秒宽限）发送 end 事件后结束，前端收到后关闭连接，
+      下次发起同步时再订阅；连接最长保持 SSE_MAX_SECONDS 秒
+    """
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        last_seq = int(since) if since is not None else progress.last_seq
+    except ValueError:
+        last_seq = progress.last_seq
+
+    def gen(last_seq):
+        yield 'retry: 3000\n\n'
+        deadline = time.monotonic() + SSE_MAX_SECONDS
+        idle_since = None
+        while time.monotonic() < deadline:
+            events = progress.events_after(last_seq, timeout=min(15, SSE_IDLE_SECONDS))
+            for e in events:
+                last_seq = e['seq']
+                yield f"id: {e['seq']}\nevent: progress\ndata: {json.dumps(e, ensure_ascii=False)}\n\n"
+            if progress.running():
+                idle_since = None
+            elif idle_since is None:
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since >= SSE_IDLE_SECONDS:
+                yield f"id: {last_seq}\nevent: end\ndata: {{}}\n\n"
+                return
+            if not events:
+                yield ': keep-alive\n\n'
+
+    return Response(
+        stream_with_context(gen(last_seq)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -4,19 +4,61 @@
 - 提供注册、登录、用户查询、启用/禁用等接口
 - 所有路由均以 /api/user/ 前缀对外
 - 支持多账套操作（可接收account_code参数）
+- 登录成功返回签名令牌，同时写入 HttpOnly Cookie；之后的请求用 Cookie 或
+  Authorization: Bearer <token> 识别身份（current_identity / login_required）
 """
 
-from flask import Blueprint, request, jsonify
+from functools import wraps
+
+from flask import Blueprint, request, jsonify, g
+from config import TOKEN_MAX_AGE
 from modules.user import (
     create_user,
     check_user_login,
     get_user_by_username,
     set_user_active,
-    list_users
+    list_users,
+    issue_token,
+    verify_token
 )
 
 user_api = Blueprint('user_api', __name__)
 
+TOKEN_COOKIE = 'u8_token'
+
+def current_identity():
+    """
+    当前请求的登录身份（dict）或 None；同一请求内只校验一次
+    校验令牌签名在本地完成，身份走用户缓存，不访问数据库
+    """
+    if 'identity' not in g:
+        token = request.cookies.get(TOKEN_COOKIE)
+        auth = request.headers.get('Authorization', '')
+        if auth.startswith('Bearer '):
+            token = auth[7:].strip()
+        g.identity = verify_token(token)
+    return g.identity
+
+def login_required(*roles):
+    """
+    路由装饰器：未登录返回 401；指定角色时角色不符返回 403
+    用法：
+        @mold_api.route('/xxx')
+        @login_required('admin')
+        def xxx(): ...
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            identity = current_identity()
+            if identity is None:
+                return jsonify({"msg": "未登录或登录已过期"}), 401
+            if roles and identity.get('role') not in roles:
+                return jsonify({"msg": "没有权限"}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
 @user_api.route('/register', methods=['POST'])
 def register():
     """
@@ -65,7 +107,8 @@ def login():
         "password": "123456",
         "account_code": "022"
     }
-    返回：{"msg": "...", "user": {...}}
+    返回：{"msg": "...", "user": {...}, "token": "...", "expires_in": 秒}
+    令牌同时写入 HttpOnly Cookie（u8_token），页面请求自动携带
     """
     data = request.json
     user = check_user_login(
@@ -74,7 +117,8 @@ def login():
         account_code=data.get('account_code')
     )
     if user:
-        return jsonify({
+        token = issue_token(user, data.get('account_code'))
+        resp = jsonify({
             "msg": "登录成功",
             "user": {
                 "id": user.id,
@@ -82,11 +126,29 @@ def login():
                 "realname": user.realname,
                 "role": user.role,
                 "is_active": user.is_active
-            }
+            },
+            "token": token,
+            "expires_in": TOKEN_MAX_AGE
         })
+        resp.set_cookie(TOKEN_COOKIE, token, max_age=TOKEN_MAX_AGE, httponly=True,
+                        samesite='Lax', secure=request.is_secure)
+        return resp
     else:
         return jsonify({"msg": "用户名或密码错误，或账号被禁用"}), 401
 
+@user_api.route('/me', methods=['GET'])
+@login_required()
+def me():
+    """当前登录用户（按令牌识别，不访问数据库）"""
+    return jsonify(current_identity())
+
+@user_api.route('/logout', methods=['POST'])
+def logout():
+    """退出登录：清除令牌 Cookie（令牌本身到期前仍有效，前端应同时丢弃）"""
+    resp = jsonify({"msg": "已退出"})
+    resp.delete_cookie(TOKEN_COOKIE)
+    return resp
+
 @user_api.route('/list', methods=['GET'])
 def get_user_list():
     """
@@ -5,10 +5,20 @@
 - 注册所有业务相关的蓝图（API路由模块）
 - 支持全局配置和后续中间件扩展
 - 根路径自动跳转到 login.html
-- 支持 templates/ 目录下的静态HTML页面直接访问
+- 支持 templates/ 目录下的静态HTML页面直接访问（内存缓存 + 预压缩 + ETag，见 modules/static_cache.py）
+- 接口 JSON 用 modules/fastjson.py 序列化，较大的响应按 Accept-Encoding 压缩（modules/compression.py）
 """
 
-from flask import Flask, redirect, send_from_directory
+import time
+_import_started = time.perf_counter()  # 统计本模块及各蓝图的导入耗时
+
+import os
+
+from flask import Flask, redirect, abort
+from config import STATIC_RELOAD, DEBUG_MODE
+from modules.static_cache import StaticCache
+from modules.fastjson import FastJSONProvider
+from modules import compression, startup
 
 # 导入API蓝图（注意：需在/api/目录下先创建好相关py文件，并在此处导入）
 from api.user_api import user_api            # 用户与权限接口
@@ -17,13 +27,19 @@ from api.sync_api import sync_api            # U8主数据同步接口
 # from api.purchase_api import purchase_api  # 采购请购单接口
 from api.mold_api import mold_api          # 模具管理接口
 from api.data_setting_api import data_setting_api
+from api.profile_api import profile_api      # 按需剖析（管理员）
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
 
 def create_app():
     """
     工厂方法，创建并配置Flask应用
     可方便扩展多环境/测试场景
     """
+    started = time.perf_counter()
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    compression.init_app(app)
 
     # 注册各业务模块API蓝图
     app.register_blueprint(user_api, url_prefix='/api/user')           # 用户相关接口
@@ -31,6 +47,7 @@ def create_app():
     # app.register_blueprint(mrp_api, url_prefix='/api/mrp')           # MRP运算
     # app.register_blueprint(purchase_api, url_prefix='/api/purchase') # 采购请购单
     app.register_blueprint(mold_api, url_prefix='/api/mold')         # 模具管理
+    app.register_blueprint(profile_api, url_prefix='/api/profile')   # 请求/任务剖析
     app.register_blueprint(data_setting_api, url_prefix='/api')
 
     # =========== 根路由跳转到登录页 ===========
@@ -39,15 +56,24 @@ def create_app():
         return redirect('/login.html')
 
     # =========== 访问 templates 下静态HTML页面 ===========
+    # 启动时整目录读入内存并预压缩；STATIC_RELOAD=True 时文件改动后自动重新加载
+    pages = StaticCache(os.path.join(app.root_path, 'templates'), reload=STATIC_RELOAD)
+    app.extensions['static_pages'] = pages
+
     @app.route('/<path:filename>')
     def serve_html(filename):
         # 如果有安全要求，可限制白名单页面
-        return send_from_directory('templates', filename)
+        resp = pages.response(filename)
+        if resp is None:
+            abort(404)
+        return resp
 
+    # 启动耗时与重型依赖加载情况（app.extensions['startup']）
+    startup.record(app, started, IMPORT_SECONDS)
     return app
 
-# 支持命令行启动
+# 支持命令行启动（开发用，单进程；生产部署使用 python wsgi.py 或 gunicorn -c gunicorn.conf.py wsgi:app）
 if __name__ == '__main__':
     app = create_app()
-    # debug=True便于开发调试，生产环境请关闭
-    app.run(host='0.0.0.0', port=5050, debug=True)
+    # DEBUG_MODE=True 便于开发调试，生产环境请关闭
+    app.run(host='0.0.0.0', port=5050, debug=DEBUG_MODE, threaded=True)
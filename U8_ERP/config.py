@@ -47,7 +47,88 @@ def get_conn_str(account_code=None):
         f"PWD={DB_PWD}"
     )
 
+# 目标库（本系统业务库，同步结果写入此库）
+DST_DB_NAME = os.getenv('DST_DB_NAME', 'U8_ERP')
+
+# 多账套并行同步时，各账套写入各自的目标库（账套代码 -> 目标库名）
+DST_ACCOUNT_SETS = {
+    '022': os.getenv('DST_DB_022', DST_DB_NAME),
+    '088': os.getenv('DST_DB_088', f'{DST_DB_NAME}_088'),
+}
+
+def get_dst_db_name(account_code=None):
+    """
+    根据账套代码获取目标库名
+    :param account_code: 账套代码（如'022'），不传则取当前配置
+    :return: 目标库名字符串（未配置的账套回落到 DST_DB_NAME）
+    """
+    code = account_code or CURRENT_ACCOUNT_CODE
+    return DST_ACCOUNT_SETS.get(code, DST_DB_NAME)
+
+def get_dst_conn_str(account_code=None):
+    """
+    生成指定账套对应目标库的ODBC连接字符串
+    :param account_code: 账套代码（如'022'）
+    :return: ODBC连接字符串
+    """
+    db_name = get_dst_db_name(account_code)
+    return (
+        f"DRIVER={{SQL Server}};"
+        f"SERVER={DB_SERVER};"
+        f"DATABASE={db_name};"
+        f"UID={DB_USER};"
+        f"PWD={DB_PWD}"
+    )
+
+# 多账套并行同步的最大并发账套数
+SYNC_MAX_WORKERS = int(os.getenv('SYNC_MAX_WORKERS', '4'))
+
 # 日志目录配置
 LOG_DIR = os.getenv('LOG_DIR', os.path.join(os.path.dirname(__file__), 'logs'))
+# 本地列式快照目录（同步抽取结果的 Parquet 副本，供 MRP/报表本地读取）
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', os.path.join(os.path.dirname(__file__), 'snapshots'))
+# 快照新鲜度（小时），超过则回落数据库查询
+SNAPSHOT_MAX_AGE_HOURS = float(os.getenv('SNAPSHOT_MAX_AGE_HOURS', '24'))
+# 每个快照保留的代次数
+SNAPSHOT_KEEP = int(os.getenv('SNAPSHOT_KEEP', '2'))
+# 附件内容寻址存储目录（按 SHA-256 存放，相同文件只存一份）
+ATTACHMENT_STORE_DIR = os.getenv('ATTACHMENT_STORE_DIR', os.path.join(os.path.dirname(__file__), 'uploads', 'store'))
+# 登录令牌签名密钥：多进程/多机部署必须通过环境变量设置同一个值，
+# 未设置时每次启动随机生成（重启后已签发的令牌全部失效）
+SECRET_KEY = os.getenv('SECRET_KEY') or os.urandom(32).hex()
+# 登录令牌有效期（秒）
+TOKEN_MAX_AGE = int(os.getenv('TOKEN_MAX_AGE', str(8 * 3600)))
+# 用户身份缓存有效期（秒）；启用/禁用、用户增删改时立即失效
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '300'))
 # 调试模式
 DEBUG_MODE = os.getenv('DEBUG_MODE', 'True').lower() == 'true'
+# 页面文件修改后自动重新加载（开发用；默认跟随调试模式）
+STATIC_RELOAD = os.getenv('STATIC_RELOAD', str(DEBUG_MODE)).lower() == 'true'
+# 接口响应压缩：响应体不小于此字节数才压缩；gzip 压缩级别
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', '6'))
+# create_app 冷启动耗时目标（秒），超过时启动日志告警；测量见 python -m modules.startup
+STARTUP_TARGET_SECONDS = float(os.getenv('STARTUP_TARGET_SECONDS', '0.5'))
+# 按需剖析（modules/profiler.py）：结果目录、采样间隔（毫秒）、单次最长采样秒数、保留份数
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(LOG_DIR, 'profiles'))
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '5'))
+PROFILE_MAX_SECONDS = int(os.getenv('PROFILE_MAX_SECONDS', '1800'))
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '50'))
+
+# ---------- 生产部署（gunicorn，见 gunicorn.conf.py / wsgi.py） ----------
+# 监听地址
+WEB_BIND = os.getenv('WEB_BIND', '0.0.0.0:5050')
+# 工作进程数与每进程线程数；长耗时的同步请求只占用一个线程。
+# 默认单进程多线程：同步进度流、字典/用户/台账缓存、联想索引、剖析预约、附件锁都在进程内，
+# 多进程时彼此不通知（进度流可能连到没在同步的进程，缓存最长到各自 TTL 才刷新），见 README「生产部署」
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', '1'))
+WEB_THREADS = int(os.getenv('WEB_THREADS', '16'))
+# 工作进程失去响应多少秒后重启（线程模式下不限制单个请求耗时，/api/sync/all 可跑满）
+WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', '120'))
+# 平滑重启/停止时等待进行中请求完成的秒数（应覆盖一次同步耗时；进度流无同步时 10 秒内结束，最长 300 秒）
+WEB_GRACEFUL_TIMEOUT = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '600'))
+# HTTP keep-alive 空闲连接保持秒数
+WEB_KEEPALIVE = int(os.getenv('WEB_KEEPALIVE', '15'))
+# 每个工作进程处理多少请求后自动轮换（释放 pandas 等占用的内存），0 为不轮换。
+# 单进程时轮换期间旧进程等进行中的请求（含同步）结束才退出，新请求要排队，故默认不轮换
+WEB_MAX_REQUESTS = int(os.getenv('WEB_MAX_REQUESTS', '0'))
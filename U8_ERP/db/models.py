@@ -92,6 +92,29 @@ class MoldPeriodRecord(Base):
     mold = relationship("Mold")
     supplier = relationship("Supplier")
 
+class MoldCostSummary(Base):
+    """
+    模具费用汇总表（由 modules/mold_summary.py 增量维护）
+    """
+    __tablename__ = 'MoldCostSummary'
+    dim = Column(NVARCHAR(20), primary_key=True, comment='维度：all/casting_supplier/mold_supplier/company/process')
+    dim_key = Column(NVARCHAR(200), primary_key=True, comment='维度取值（供应商ID/公司/工艺）')
+    period = Column(NVARCHAR(7), primary_key=True, comment='开模月份 YYYY-MM')
+    mold_count = Column(Integer, nullable=False, default=0, comment='模具数')
+    amount = Column(DECIMAL(18,2), nullable=False, default=0, comment='金额')
+    advance_amount = Column(DECIMAL(18,2), nullable=False, default=0, comment='预付款')
+    balance_unpaid = Column(DECIMAL(18,2), nullable=False, default=0, comment='余款未付')
+    invoiced_count = Column(Integer, nullable=False, default=0, comment='已开票模具数')
+    invoiced_amount = Column(DECIMAL(18,2), nullable=False, default=0, comment='已开票金额')
+
+class MoldMaterial(Base):
+    """
+    模具-物料对照表（由 modules/mold_material.py 与 Mold.materials 同步维护）
+    """
+    __tablename__ = 'MoldMaterial'
+    mold_id = Column(Integer, ForeignKey('Mold.id'), primary_key=True, comment='模具ID')
+    cinvcode = Column(NVARCHAR(60), primary_key=True, index=True, comment='物料编码')
+
 class MoldTransferRecord(Base):
     """
     模具调拨记录表
@@ -109,6 +132,20 @@ class MoldTransferRecord(Base):
     from_supplier = relationship("Supplier", foreign_keys=[from_supplier_id])
     to_supplier = relationship("Supplier", foreign_keys=[to_supplier_id])
 
+class MoldCurrentLocation(Base):
+    """
+    模具当前位置表（每个模具最近一次调拨，由 modules/mold_location.py 维护）
+    """
+    __tablename__ = 'MoldCurrentLocation'
+    mold_id = Column(Integer, primary_key=True, comment='模具ID')
+    transfer_id = Column(Integer, nullable=False, comment='最近一次调拨记录ID')
+    supplier_id = Column(Integer, comment='当前所在供应商ID（调入供应商）')
+    from_supplier_id = Column(Integer, comment='调出供应商ID')
+    transfer_date = Column(Date, comment='调拨日期')
+    quantity = Column(Integer, comment='数量')
+    note = Column(NVARCHAR(255), comment='备注')
+    updated_at = Column(DateTime, default=datetime.datetime.now, nullable=False, comment='更新时间')
+
 class SysUser(Base):
     """
     用户表
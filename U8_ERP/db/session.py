@@ -2,12 +2,14 @@
 """
 数据库会话管理
 - 统一管理与SQL Server的连接，支持多账套动态切换
-- 对外只暴露 get_connection 方法，避免重复造轮子
-- 后续业务模块需数据库操作时，只需 import 并调用 get_connection
+- 对外暴露 get_connection / get_u8_connection / get_dst_connection，避免重复造轮子
+- 后续业务模块需数据库操作时，只需 import 并调用对应方法
+- 剖析请求/任务期间返回带 SQL 耗时统计的包装连接（db/sql_trace.py），其余时间为原始连接
 """
 
 import pyodbc
-from config import get_conn_str, CURRENT_ACCOUNT_CODE
+from db import sql_trace
+from config import get_conn_str, get_dst_conn_str, CURRENT_ACCOUNT_CODE
 
 def get_connection(account_code=None):
     """
@@ -21,8 +23,26 @@ def get_connection(account_code=None):
     conn_str = get_conn_str(account_code)
     try:
         conn = pyodbc.connect(conn_str)
-        return conn
+        return sql_trace.wrap(conn)
     except Exception as e:
         # 建议可在此扩展日志记录
         raise RuntimeError(f"数据库连接失败: {e}")
 
+
+def get_u8_connection(account_code=None):
+    """
+    获取U8账套库连接（同步数据源）
+    :param account_code: 账套代码，不传则取当前账套
+    """
+    return get_connection(account_code)
+
+def get_dst_connection(account_code=None):
+    """
+    获取目标业务库连接（同步写入 / 模具、MRP等业务读写）
+    :param account_code: 账套代码，不传则取当前账套对应的目标库；多账套并行同步时各账套互不干扰
+    """
+    conn_str = get_dst_conn_str(account_code)
+    try:
+        return sql_trace.wrap(pyodbc.connect(conn_str))
+    except Exception as e:
+        raise RuntimeError(f"目标库连接失败: {e}")
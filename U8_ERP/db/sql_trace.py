@@ -0,0 +1,225 @@
+# db/sql_trace.py
+"""
+SQL 耗时追踪（配合 modules/profiler.py 剖析单个请求/任务）
+- 追踪开启时 db/session.py 返回包装过的连接，游标的 execute/executemany/fetch*/迭代 按语句累计次数、行数、耗时
+- 语句键：STATEMENTS 中登记过的语句用登记名（如 'u8.bom'），其余用压缩空白后的 SQL 文本前 160 字符
+- 追踪挂在开启它的线程上（请求剖析只记本线程）；任务提交到线程池的函数用 bind() 包一层，
+  工作线程继承同一追踪（如多账套并行同步），同时段其他请求线程的 SQL 不会混入
+- 未开启追踪时 get_*_connection 直接返回原始 pyodbc 连接，没有任何额外开销
+用法：
+    trace = sql_trace.begin()              # scope 仅作标记：'thread' 请求 / 'job' 任务
+    pool.map(sql_trace.bind(func), items)  # 工作线程计入同一追踪
+    sql_trace.end(trace)
+    trace.breakdown()                      # 按总耗时倒序
+"""
+
+import functools
+import threading
+import time
+
+SQL_KEY_MAX_LEN = 160
+
+_local = threading.local()
+_statement_names = None
+_END = object()
+
+
+class SqlTrace:
+    """一次剖析期间的语句耗时汇总（线程安全）"""
+
+    def __init__(self, scope='thread'):
+        self.scope = scope
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._threads = set()  # 正在本追踪下执行的线程 ident（开启线程 + bind() 的工作线程）
+
+    def record(self, key, elapsed, rows=0, calls=1, failed=False):
+        with self._lock:
+            s = self._stats.get(key)
+            if s is None:
+                s = self._stats[key] = {'sql': key, 'calls': 0, 'rows': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+            ms = elapsed * 1000
+            s['calls'] += calls
+            s['rows'] += max(rows or 0, 0)
+            s['errors'] += 1 if failed else 0
+            s['total_ms'] += ms
+            s['max_ms'] = max(s['max_ms'], ms)
+
+    def breakdown(self):
+        with self._lock:
+            items = [dict(s) for s in self._stats.values()]
+        for s in items:
+            s['total_ms'] = round(s['total_ms'], 2)
+            s['max_ms'] = round(s['max_ms'], 2)
+        return sorted(items, key=lambda s: s['total_ms'], reverse=True)
+
+    def total_ms(self):
+        with self._lock:
+            return round(sum(s['total_ms'] for s in self._stats.values()), 2)
+
+    def thread_ids(self):
+        with self._lock:
+            return set(self._threads)
+
+    def _enter(self):
+        with self._lock:
+            self._threads.add(threading.get_ident())
+
+    def _leave(self):
+        with self._lock:
+            self._threads.discard(threading.get_ident())
+
+
+def begin(scope='thread'):
+    """在当前线程开启追踪"""
+    trace = SqlTrace(scope)
+    trace._enter()
+    _local.trace = trace
+    return trace
+
+def end(trace):
+    if getattr(_local, 'trace', None) is trace:
+        _local.trace = None
+        trace._leave()
+
+def active():
+    return getattr(_local, 'trace', None)
+
+def bind(func):
+    """包装要交给其他线程执行的函数，使其继承当前线程的追踪；未在追踪时原样返回"""
+    trace = active()
+    if trace is None:
+        return func
+
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        prev = getattr(_local, 'trace', None)
+        _local.trace = trace
+        trace._enter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            trace._leave()
+            _local.trace = prev
+    return run
+
+def wrap(conn):
+    """追踪开启时包装连接，否则原样返回"""
+    trace = active()
+    return TracedConnection(conn, trace) if trace is not None else conn
+
+
+def _sql_key(sql):
+    global _statement_names
+    if _statement_names is None:
+        from db.statements import STATEMENTS
+        _statement_names = {' '.join(text.split()): name for name, (text, _) in STATEMENTS.items()}
+    text = ' '.join(str(sql).split())
+    return _statement_names.get(text) or text[:SQL_KEY_MAX_LEN]
+
+
+# ====================== 连接 / 游标包装 ======================
+class TracedCursor:
+
+    def __init__(self, cursor, trace):
+        object.__setattr__(self, '_cursor', cursor)
+        object.__setattr__(self, '_trace', trace)
+        object.__setattr__(self, '_key', None)
+
+    def _run(self, method, sql, args, rows_of):
+        key = _sql_key(sql)
+        object.__setattr__(self, '_key', key)
+        started = time.perf_counter()
+        try:
+            getattr(self._cursor, method)(sql, *args)
+        except Exception:
+            self._trace.record(key, time.perf_counter() - started, failed=True)
+            raise
+        self._trace.record(key, time.perf_counter() - started, rows_of())
+        return self
+
+    def execute(self, sql, *params):
+        return self._run('execute', sql, params, lambda: self._cursor.rowcount)
+
+    def executemany(self, sql, seq_of_params):
+        return self._run('executemany', sql, (seq_of_params,),
+                         lambda: len(seq_of_params) if hasattr(seq_of_params, '__len__') else 0)
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        result = getattr(self._cursor, method)(*args)
+        if self._key is not None:
+            if isinstance(result, list):
+                rows = len(result)
+            else:
+                rows = 1 if method == 'fetchone' and result is not None else 0
+            self._trace.record(self._key, time.perf_counter() - started, rows, calls=0)
+        return result
+
+    def fetchone(self):
+        return self._fetch('fetchone')
+
+    def fetchall(self):
+        return self._fetch('fetchall')
+
+    def fetchmany(self, size=None):
+        return self._fetch('fetchmany', size) if size is not None else self._fetch('fetchmany')
+
+    def fetchval(self):
+        return self._fetch('fetchval')
+
+    def __iter__(self):
+        # for row in cursor：逐行取数的耗时与行数计入最近一条语句
+        it, key = iter(self._cursor), self._key
+        rows, elapsed = 0, 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                row = next(it, _END)
+                elapsed += time.perf_counter() - started
+                if row is _END:
+                    return
+                rows += 1
+                yield row
+        finally:
+            if key is not None:
+                self._trace.record(key, elapsed, rows, calls=0)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._cursor.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)  # fast_executemany 等
+
+
+class TracedConnection:
+
+    def __init__(self, conn, trace):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_trace', trace)
+
+    def cursor(self):
+        return TracedCursor(self._conn.cursor(), self._trace)
+
+    def execute(self, sql, *params):
+        return self.cursor().execute(sql, *params)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)  # autocommit 等
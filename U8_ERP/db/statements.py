@@ -0,0 +1,368 @@
+# db/statements.py
+"""
+SQL 语句目录（U8 抽取 / 目标库写入 / MRP 输入输出）
+- sync.py、mrp.py 使用的语句集中登记在 STATEMENTS 中，全部用 ? 参数化，不再拼接日期等变量
+  SQL Server 端按参数化文本缓存执行计划，每次运行复用同一计划，也杜绝注入
+- Statements(conn) 绑定到单个连接：每个语句名独占一个游标，pyodbc 对同一游标重复执行相同文本时
+  复用已准备（SQLPrepare）的句柄，即每个连接每条语句只准备一次
+- 每条语句记录执行次数、返回/影响行数、总耗时、最大耗时、失败次数，供 /api/sync/statements 查看
+用法：
+    with get_u8_connection() as u8:
+        u8s = Statements(u8)
+        rows = u8s.fetchall('u8.prospect.po_in_transit', {'end_date': end_date})
+"""
+
+import threading
+import time
+
+# 语句名 -> (SQL文本, 参数名元组)
+# 参数名元组为空表示按位置传参（如批量写入的整行元组）；按名传参时用 dict，按元组顺序绑定
+STATEMENTS = {
+    # ---- 1. 存货档案 ----
+    'u8.inventory': ("""
+        SELECT cInvCode, cInvName FROM inventory
+    """, ()),
+    'dst.inventory.select': ("""
+        SELECT cInvCode, cInvName FROM Inventory
+    """, ()),
+    'dst.inventory.update': ("""
+        UPDATE Inventory SET cInvName=? WHERE cInvCode=?
+    """, ('cInvName', 'cInvCode')),
+    'dst.inventory.insert': ("""
+        INSERT INTO Inventory (cInvCode, cInvName) VALUES (?,?)
+    """, ('cInvCode', 'cInvName')),
+    'dst.inventory.delete': ("""
+        DELETE FROM Inventory WHERE cInvCode=?
+    """, ('cInvCode',)),
+    # ---- 2. 供应商 ----
+    'u8.vendor': ("""
+        SELECT cVenName, cVenPerson, cVenPhone FROM Vendor
+    """, ()),
+    'dst.supplier.select': ("""
+        SELECT supplier_name, contact, phone FROM Supplier
+    """, ()),
+    'dst.supplier.update': ("""
+        UPDATE Supplier SET contact=?, phone=? WHERE supplier_name=?
+    """, ('contact', 'phone', 'supplier_name')),
+    'dst.supplier.insert': ("""
+        INSERT INTO Supplier (supplier_name, contact, phone) VALUES (?, ?, ?)
+    """, ('supplier_name', 'contact', 'phone')),
+    'dst.supplier.delete': ("""
+        DELETE FROM Supplier WHERE supplier_name=?
+    """, ('supplier_name',)),
+    # ---- 3. BOM（主键：母件编码+版本+子件编码+工序） ----
+    'u8.bom': ("""
+        SELECT
+            E.cInvCode, E.cInvName, E.cInvStd, F.cComUnitName, C.ParentScrap,
+            A.Version, A.VersionDesc, A.VersionEffDate, A.IdentCode, A.IdentDesc,
+            CASE WHEN A.CloseTime IS NULL THEN '审核' ELSE '停用' END,
+            CASE WHEN E.iPlanDefault = 1 THEN '自制件'
+                 WHEN E.iPlanDefault = 2 THEN '委外件'
+                 WHEN E.iPlanDefault = 3 THEN '采购件' END,
+            A.ApplyDId, NULL, B.SortSeq, B.OpSeq, NULL,
+            H.cInvCode, H.cInvName, H.cInvStd, I.cComUnitName, B.BaseQtyN, B.BaseQtyD, B.CompScrap,
+            CASE WHEN B.FVFlag = 0 THEN '是' ELSE '否' END,
+            CASE WHEN H.iSupplyType = 0 THEN '领用'
+                 WHEN H.iSupplyType = 1 THEN '入库倒冲'
+                 WHEN H.iSupplyType = 2 THEN '工序倒冲'
+                 WHEN H.iSupplyType = 3 THEN '虚拟件' END,
+            B.BaseQtyN, B.EffBegDate, B.EffEndDate,
+            CASE WHEN B.ByproductFlag = 0 THEN '否' END,
+            CASE WHEN H.iPlanDefault = 1 THEN '自制件'
+                 WHEN H.iPlanDefault = 2 THEN '委外件'
+                 WHEN H.iPlanDefault = 3 THEN '采购件' END,
+            B.Remark
+        FROM bom_bom A
+        LEFT JOIN bom_opcomponent B ON A.BomId = B.BomId
+        LEFT JOIN bom_parent C ON A.BomId = C.BomId
+        LEFT JOIN bas_part D ON C.ParentId = D.PartId
+        LEFT JOIN Inventory E ON D.InvCode = E.cInvCode
+        LEFT JOIN ComputationUnit F ON F.cComunitCode = E.cComUnitCode
+        LEFT JOIN bas_part G ON B.ComponentId = G.PartId
+        LEFT JOIN Inventory H ON G.InvCode = H.cInvCode
+        LEFT JOIN ComputationUnit I ON H.cComunitCode = I.cComUnitCode
+        WHERE A.CloseTime IS NULL and E.cInvCode is not null
+    """, ()),
+    'dst.bom.keys': ("""
+        SELECT mother_code, version, child_code, process_seq FROM BOM
+    """, ()),
+    'dst.bom.insert': ("""
+        INSERT INTO BOM (
+            mother_code, mother_name, mother_std, mother_unit, parent_scrap,
+            version, version_desc, version_effdate, ident_code, ident_desc, status,
+            mother_type, apply_did, row_no, child_sort_seq, process_seq, process_name,
+            child_code, child_name, child_std, child_unit, base_qty_n, base_qty_d, comp_scrap,
+            is_fixed, supply_type, use_qty, eff_beg_date, eff_end_date, is_byproduct,
+            material_type, remark
+        ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+    """, ()),
+    'dst.bom.delete': ("""
+        DELETE FROM BOM WHERE mother_code=? AND version=? AND child_code=? AND process_seq=?
+    """, ()),
+    # ---- 4. 生产订单（计划完工日区间） ----
+    'u8.mom_order': ("""
+        SELECT A.MoCode, B.sortseq, G.EnumName, H.EnumName, I.EnumName, B.InvCode,
+               E.cInvName, C.StartDate, C.DueDate, F.cComUnitName, B.Qty, B.MrpQty, B.MDeptCode,
+               D.cDepName, B.DeclaredQty, B.QualifiedInQty, (B.Qty - B.QualifiedInQty), B.Define31,
+               B.Define33, J.EnumName, B.DemandCode, A.CreateUser, B.CloseUser, A.Define11
+        FROM mom_order A
+        LEFT JOIN mom_orderdetail B ON A.MoId = B.MoId
+        LEFT JOIN mom_morder C ON A.MoId = C.MoId
+        LEFT JOIN Department D ON B.MDeptCode = D.cDepCode
+        LEFT JOIN Inventory E ON B.InvCode = E.cInvCode
+        LEFT JOIN ComputationUnit F ON E.cComUnitCode = F.cComunitCode
+        LEFT JOIN (select * from AA_Enum where enumtype = 'MO.Status' AND LocaleID = 'zh-CN') G ON B.Status = G.EnumCode
+        LEFT JOIN (select * from AA_Enum where enumtype = 'MO.AuditStatus' AND LocaleID = 'zh-CN') H ON B.AuditStatus = H.EnumCode
+        LEFT JOIN (select * from AA_Enum where enumtype = 'MO.MoClass' AND LocaleID = 'zh-CN') I ON B.MoClass = I.EnumCode
+        LEFT JOIN (select * from AA_Enum where enumtype = 'MO.SoType' AND LocaleID = 'zh-CN') J ON B.SoType = J.EnumCode
+        WHERE G.EnumName = '审核'
+          AND C.DueDate >= ? AND C.DueDate <= ?
+    """, ('start_date', 'end_date')),
+    'dst.mom_order.truncate': ("""
+        TRUNCATE TABLE mom_order
+    """, ()),
+    'dst.mom_order.insert': ("""
+        INSERT INTO mom_order (
+            MoCode, sortseq, status, audit_status, mo_type, InvCode,
+            InvName, StartDate, DueDate, UnitName, Qty, MrpQty, MDeptCode,
+            DepName, DeclaredQty, QualifiedInQty, UnfinishedQty, Assembler,
+            SOCode, track_type, DemandCode, CreateUser, CloseUser, Define11
+        ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+    """, ()),
+    'dst.mom_order.snapshot': ("""
+        SELECT id, MoCode, sortseq, status, audit_status, mo_type, InvCode,
+               InvName, StartDate, DueDate, UnitName, Qty, MrpQty, MDeptCode,
+               DepName, DeclaredQty, QualifiedInQty, UnfinishedQty, Assembler,
+               SOCode, track_type, DemandCode, CreateUser, CloseUser, Define11
+        FROM mom_order
+    """, ()),
+    # ---- 5. 库存展望（截止日期 end_date） ----
+    # 1. 现存量结存数
+    'u8.prospect.current_stock': ("""
+        SELECT a.cInvCode, b.cInvName, SUM(a.iQuantity) AS qty, '现存量结存数' AS source_type
+        FROM CurrentStock a
+        LEFT JOIN inventory b ON a.cInvCode = b.cInvCode
+        WHERE a.iQuantity > 0 AND a.cwhcode IN ('0401','0402','0403') AND a.cInvCode NOT LIKE '51%'
+        GROUP BY a.cInvCode, b.cInvName
+    """, ()),
+    # 2. 在途采购订单数
+    'u8.prospect.po_in_transit': ("""
+        SELECT a.cInvCode, c.cInvName, SUM(a.iQuantity - ISNULL(e.在途采购订单数, 0)) AS qty, '在途采购订单数' AS source_type
+        FROM PO_Podetails a
+        LEFT JOIN PO_Pomain b ON a.POID = b.POID
+        LEFT JOIN Inventory c ON a.cInvCode = c.cInvCode
+        LEFT JOIN (
+            SELECT cInvCode, iPOsID, SUM(iQuantity) AS 在途采购订单数
+            FROM rdrecords01
+            GROUP BY cInvCode, iPOsID
+        ) e ON a.ID = e.iPOsID
+        WHERE a.dArriveDate <= ? AND a.cbCloser IS NULL AND b.cPOID IS NOT NULL AND a.cInvCode NOT LIKE '51%'
+        GROUP BY a.cInvCode, c.cInvName
+    """, ('end_date',)),
+    # 3. 采购到货待检数
+    'u8.prospect.arrival_pending': ("""
+        SELECT d.cInvCode, a.cInvName, SUM(d.iQuantity) AS qty, '采购到货待检数' AS source_type
+        FROM rdrecords01 d
+        LEFT JOIN RdRecord01 e ON d.ID = e.ID
+        LEFT JOIN inventory a ON a.cInvCode = d.cInvCode
+        WHERE e.dDate <= ? AND e.cHandler IS NULL AND d.cInvCode NOT LIKE '51%'
+        GROUP BY d.cInvCode, a.cInvName
+    """, ('end_date',)),
+    # 4. 生产未完成数量
+    'u8.prospect.mo_unfinished': ("""
+        SELECT B.InvCode, E.cInvName, SUM(B.Qty - B.QualifiedInQty) AS qty, '生产未完成数量' AS source_type
+        FROM mom_order A
+        LEFT JOIN mom_orderdetail B ON A.MoId = B.MoId
+        LEFT JOIN mom_morder C ON A.MoId = C.MoId
+        LEFT JOIN Inventory E ON B.InvCode = E.cInvCode
+        WHERE C.DueDate <= ? AND B.Status <> '4' AND B.InvCode NOT LIKE '51%'
+        GROUP BY B.InvCode, E.cInvName
+    """, ('end_date',)),
+    # 5. 销售订单未发货数量
+    'u8.prospect.so_undelivered': ("""
+        SELECT a.cInvCode, b.cInvName, SUM(a.iQuantity - ISNULL(d.发货数量, 0)) AS qty, '销售订单未发货数量' AS source_type
+        FROM SO_SODetails a
+        LEFT JOIN Inventory b ON a.cInvCode = b.cInvCode
+        LEFT JOIN SO_SOMain c ON a.cSOCode = c.cSOCode
+        LEFT JOIN (
+            SELECT cInvCode, iSOsID, SUM(iQuantity) AS 发货数量
+            FROM DispatchLists
+            GROUP BY cInvCode, iSOsID
+        ) d ON a.iSOsID = d.iSOsID
+        WHERE c.dPreDateBT <= ? AND a.cSCloser IS NULL AND c.cVerifier IS NOT NULL AND a.cInvCode NOT LIKE '51%'
+        GROUP BY a.cInvCode, b.cInvName
+    """, ('end_date',)),
+    # 6. 发货未出库数量
+    'u8.prospect.dispatch_unshipped': ("""
+        SELECT a.cInvCode, c.cInvName, SUM(a.iQuantity - ISNULL(d.出库数量, 0)) AS qty, '发货未出库数量' AS source_type
+        FROM DispatchLists a
+        LEFT JOIN DispatchList b ON a.DLID = b.DLID
+        LEFT JOIN Inventory c ON a.cInvCode = c.cInvCode
+        LEFT JOIN (
+            SELECT cInvCode, iDLsID, SUM(iQuantity) AS 出库数量
+            FROM rdrecords32
+            GROUP BY cInvCode, iDLsID
+        ) d ON a.iDLsID = d.iDLsID
+        WHERE b.dDate <= ? AND a.cSCloser IS NULL AND a.cInvCode NOT LIKE '51%'
+        GROUP BY a.cInvCode, c.cInvName
+    """, ('end_date',)),
+    # 7. 材料出库单未审核数量
+    'u8.prospect.material_out_unaudited': ("""
+        SELECT b.cInvCode, c.cInvName, b.iQuantity AS qty, '材料出库单未审核数量' AS source_type
+        FROM rdrecords11 b
+        LEFT JOIN rdRecord11 a ON a.ID = b.ID
+        LEFT JOIN Inventory c ON b.cInvCode = c.cInvCode
+        WHERE a.dDate <= ? AND a.cHandler IS NULL AND b.cInvCode NOT LIKE '51%'
+    """, ('end_date',)),
+    # 8. 生产未领料数量
+    'u8.prospect.mo_unissued': ("""
+        SELECT A.InvCode, D.cInvName, SUM(A.Qty - A.IssQty) AS qty, '生产未领料数量' AS source_type
+        FROM mom_moallocate A
+        LEFT JOIN mom_orderdetail B ON A.MoDId = B.MoDId
+        LEFT JOIN mom_morder C ON B.MoId = C.MoId
+        LEFT JOIN Inventory D ON A.InvCode = D.cInvCode
+        WHERE C.DueDate <= ? AND B.Status <> '4' AND A.InvCode NOT LIKE '51%'
+        GROUP BY A.InvCode, D.cInvName
+    """, ('end_date',)),
+    'dst.prospect_stock.truncate': ("""
+        TRUNCATE TABLE prospect_stock
+    """, ()),
+    'dst.prospect_stock.insert': ("""
+        INSERT INTO prospect_stock (cInvCode, cInvName, qty, source_type, snapshot_date, created_time) VALUES (?, ?, ?, ?, ?, ?)
+    """, ()),
+    # ---- MRP 输入 / 输出（modules/mrp.py） ----
+    # 区间端传 NULL 表示不限；两端都不限时 DueDate 为空的订单也返回（与原 WHERE 1=1 拼接一致）
+    'mrp.orders': ("""
+        SELECT id, MoCode, InvCode, InvName, DueDate, Qty
+        FROM mom_order
+        WHERE (? IS NULL OR DueDate >= ?)
+          AND (? IS NULL OR DueDate <= ?)
+    """, ('start_date', 'start_date', 'end_date', 'end_date')),
+    'mrp.bom': ("""
+        SELECT mother_code, child_code, base_qty_n
+        FROM BOM
+    """, ()),
+    'mrp.inventory_snapshot': ("""
+        SELECT cInvCode, qty
+        FROM prospect_stock
+        WHERE snapshot_date = ?
+        AND source_type = '现存量结存数'
+    """, ('snapshot_date',)),
+    'mrp.inventory_names': ("""
+        SELECT cInvCode, cInvName FROM Inventory
+    """, ()),
+    'mrp.clear_today': ("""
+        DELETE FROM MRPYSJG WHERE dRequirDate = ?
+    """, ('dRequirDate',)),
+    'mrp.insert_result': ("""
+        INSERT INTO MRPYSJG
+        (cinvcode, cinvname, Total_demand, dRequirDate, AS_iQuantity)
+        VALUES (?, ?, ?, ?, ?)
+    """, ()),
+}
+
+
+# ====================== 执行统计 ======================
+class StatementStats:
+    """按语句名累计执行耗时（线程安全，进程内）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, name, elapsed, rows=0, failed=False):
+        with self._lock:
+            s = self._stats.get(name)
+            if s is None:
+                s = self._stats[name] = {'name': name, 'calls': 0, 'rows': 0, 'errors': 0,
+                                         'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0}
+            ms = elapsed * 1000
+            s['calls'] += 1
+            s['rows'] += max(rows or 0, 0)
+            s['errors'] += 1 if failed else 0
+            s['total_ms'] += ms
+            s['last_ms'] = ms
+            s['max_ms'] = max(s['max_ms'], ms)
+
+    def snapshot(self):
+        """按总耗时倒序返回各语句统计"""
+        with self._lock:
+            items = [dict(s) for s in self._stats.values()]
+        for s in items:
+            s['avg_ms'] = round(s['total_ms'] / s['calls'], 2) if s['calls'] else 0.0
+            s['total_ms'] = round(s['total_ms'], 2)
+            s['max_ms'] = round(s['max_ms'], 2)
+            s['last_ms'] = round(s['last_ms'], 2)
+        return sorted(items, key=lambda s: s['total_ms'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+stats = StatementStats()
+
+
+def sql_of(name):
+    """取语句文本（供 pandas.read_sql 等需要原始 SQL 的场景）"""
+    return STATEMENTS[name][0]
+
+def bind(name, params=()):
+    """把 dict 形式的命名参数按登记顺序转成位置参数元组"""
+    if isinstance(params, dict):
+        return tuple(params[p] for p in STATEMENTS[name][1])
+    return tuple(params)
+
+
+class Statements:
+    """绑定到单个连接的语句执行器（每个语句名一个游标，重复执行复用已准备句柄）"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._cursors = {}
+
+    def cursor(self, name):
+        cur = self._cursors.get(name)
+        if cur is None:
+            cur = self._cursors[name] = self.conn.cursor()
+        return cur
+
+    def execute(self, name, params=()):
+        """执行语句并返回游标（DML 计入影响行数；查询的耗时请用 fetchall 以包含取数时间）"""
+        cur = self.cursor(name)
+        started = time.perf_counter()
+        try:
+            cur.execute(STATEMENTS[name][0], bind(name, params))
+        except Exception:
+            stats.record(name, time.perf_counter() - started, failed=True)
+            raise
+        stats.record(name, time.perf_counter() - started, cur.rowcount)
+        return cur
+
+    def fetchall(self, name, params=()):
+        """执行查询并取回全部行，耗时包含网络取数"""
+        cur = self.cursor(name)
+        started = time.perf_counter()
+        try:
+            cur.execute(STATEMENTS[name][0], bind(name, params))
+            rows = cur.fetchall()
+        except Exception:
+            stats.record(name, time.perf_counter() - started, failed=True)
+            raise
+        stats.record(name, time.perf_counter() - started, len(rows))
+        return rows
+
+    def executemany(self, name, rows):
+        cur = self.cursor(name)
+        started = time.perf_counter()
+        try:
+            cur.executemany(STATEMENTS[name][0], rows)
+        except Exception:
+            stats.record(name, time.perf_counter() - started, failed=True)
+            raise
+        stats.record(name, time.perf_counter() - started, len(rows))
+        return cur
+
+    def columns(self, name):
+        """最近一次执行该语句的结果列名"""
+        return [d[0] for d in (self.cursor(name).description or [])]
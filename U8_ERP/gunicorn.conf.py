@@ -0,0 +1,46 @@
+# gunicorn.conf.py
+"""
+gunicorn 生产配置（参数见 config.py 的 WEB_* 项，均可用环境变量覆盖）
+- gthread：默认单进程 × 多线程（WEB_WORKERS=1），一个长耗时的 /api/sync/all 只占一个线程，不阻塞其他请求
+- preload_app：主进程加载一次应用（页面缓存、模块导入）再 fork，子进程共享内存页；
+  未配置 SECRET_KEY 时随机密钥也在主进程生成，各工作进程签发的登录令牌互认
+- 信号：HUP 平滑轮换工作进程；代码更新后用 USR2 启动新主进程，确认正常后向旧主进程发 QUIT
+- 注意：同步进度（/api/sync/progress*）、字典/用户/台账缓存的失效、联想索引、剖析预约、附件写入锁都在进程内。
+  WEB_WORKERS>1 时进度流可能落到未执行同步的进程，其他进程的缓存最长到各自 TTL 才刷新；
+  并发不够时优先调大 WEB_THREADS（数据库等待期间线程释放 GIL）
+"""
+
+import os
+
+from config import (
+    WEB_BIND, WEB_WORKERS, WEB_THREADS, WEB_TIMEOUT, WEB_GRACEFUL_TIMEOUT,
+    WEB_KEEPALIVE, WEB_MAX_REQUESTS, LOG_DIR,
+)
+
+bind = WEB_BIND
+workers = WEB_WORKERS
+worker_class = 'gthread'
+threads = WEB_THREADS
+preload_app = True
+
+timeout = WEB_TIMEOUT
+graceful_timeout = WEB_GRACEFUL_TIMEOUT
+keepalive = WEB_KEEPALIVE
+max_requests = WEB_MAX_REQUESTS
+max_requests_jitter = WEB_MAX_REQUESTS // 10
+
+# 心跳文件放内存盘，避免磁盘繁忙时工作进程被误判为失去响应
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+os.makedirs(LOG_DIR, exist_ok=True)
+accesslog = os.getenv('WEB_ACCESS_LOG', os.path.join(LOG_DIR, 'access.log'))
+errorlog = os.getenv('WEB_ERROR_LOG', '-')
+loglevel = os.getenv('WEB_LOG_LEVEL', 'info')
+proc_name = 'u8_erp'
+
+
+def post_fork(server, worker):
+    """子进程不沿用主进程可能已建立的数据库连接池"""
+    from modules.user import dispose_engines
+    dispose_engines()
@@ -0,0 +1,204 @@
+# modules/attachment_store.py
+"""
+附件内容寻址存储
+- 上传流边写临时文件边计算 SHA-256，写完后按摘要落到 ATTACHMENT_STORE_DIR/ab/cd/<sha256>
+- 相同内容只存一份；MoldAttachment.file_path 指向该内容文件，引用计数即引用同一路径的附件行数
+- 删除附件行后调用 release()，无引用时才删除物理文件
+- 写附件行的事务包在 Upload 范围内：范围内写入的内容文件被钉住，release() 不会在事务提交前删掉它；
+  范围异常退出（事务回滚）时释放本次写入且无引用的文件。put/release 按摘要分段加锁（进程内）
+- 下载时摘要直接作为 ETag（内容不可变），配合 send_file(conditional=True) 支持 304 与 Range 续传
+- iter_zip() 边读附件边产出 ZIP 字节流（不落临时文件、不整文件读入内存）
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+import zipfile
+from datetime import datetime
+
+from config import ATTACHMENT_STORE_DIR
+from db.session import get_dst_connection
+
+CHUNK_SIZE = 1024 * 1024
+LOCK_STRIPES = 64
+
+_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+_pinned = {}  # 存储路径 -> 未结束的 Upload 范围数
+
+
+def _object_path(digest):
+    return os.path.join(ATTACHMENT_STORE_DIR, digest[:2], digest[2:4], digest)
+
+def _lock_for(path):
+    return _locks[hash(path) % LOCK_STRIPES]
+
+def put(fileobj, _pin=False):
+    """
+    写入内容（fileobj 为 FileStorage / 文件对象 / bytes）；写附件行时请用 Upload.put
+    :return: (sha256, 文件大小, 存储路径)
+    """
+    os.makedirs(ATTACHMENT_STORE_DIR, exist_ok=True)
+    tmp = os.path.join(ATTACHMENT_STORE_DIR, f".upload-{uuid.uuid4().hex}.tmp")
+    h, size = hashlib.sha256(), 0
+    try:
+        with open(tmp, 'wb') as f:
+            if isinstance(fileobj, (bytes, bytearray)):
+                h.update(fileobj); f.write(fileobj); size = len(fileobj)
+            else:
+                stream = getattr(fileobj, 'stream', fileobj)  # FileStorage
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    h.update(chunk); f.write(chunk); size += len(chunk)
+        digest = h.hexdigest()
+        path = _object_path(digest)
+        with _lock_for(path):
+            if os.path.isfile(path):
+                os.remove(tmp)  # 已有相同内容，复用
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp, path)
+            if _pin:
+                _pinned[path] = _pinned.get(path, 0) + 1
+        return digest, size, path
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def digest_of(path):
+    """存储路径对应的 SHA-256；非内容寻址路径（历史附件）返回 None"""
+    if not path:
+        return None
+    name = os.path.basename(path)
+    if len(name) == 64 and os.path.abspath(path) == os.path.abspath(_object_path(name)):
+        return name
+    return None
+
+def _unpin(paths):
+    for path in paths:
+        with _lock_for(path):
+            n = _pinned.get(path, 0) - 1
+            if n > 0:
+                _pinned[path] = n
+            else:
+                _pinned.pop(path, None)
+
+def release(paths):
+    """
+    附件行删除并提交后调用：逐个检查仍引用该路径的 MoldAttachment 行数，无引用时删除文件
+    （有未提交的 Upload 正在引用该内容时跳过）
+    :return: 实际删除的文件数
+    """
+    paths = {p for p in (paths or []) if p}
+    if not paths:
+        return 0
+    removed = 0
+    with get_dst_connection() as conn:
+        cur = conn.cursor()
+        for path in paths:
+            # 计数与删除在同一把锁内，与同内容的 put 互斥
+            with _lock_for(path):
+                if _pinned.get(path):
+                    continue
+                cur.execute("SELECT COUNT(*) FROM MoldAttachment WHERE file_path=?", path)
+                if int(cur.fetchone()[0]) > 0 or not os.path.isfile(path):
+                    continue
+                try:
+                    os.remove(path)
+                    removed += 1
+                except Exception:
+                    pass  # 文件被占用等，留待下次
+    return removed
+
+
+class Upload:
+    """
+    附件写入范围，包住 put 与写 MoldAttachment 行的事务：
+        with attachment_store.Upload() as upload, get_dst_connection() as conn:
+            digest, size, path = upload.put(file_storage)
+            ...INSERT MoldAttachment...; conn.commit()
+    """
+
+    def __init__(self):
+        self.paths = []
+
+    def put(self, fileobj):
+        digest, size, path = put(fileobj, _pin=True)
+        self.paths.append(path)
+        return digest, size, path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _unpin(self.paths)
+        if exc_type is not None and self.paths:
+            # 事务已回滚：本次写入的内容若无其他引用则删除
+            try:
+                release(self.paths)
+            except Exception as ex:
+                print(f"[WARN] 回滚后清理附件文件失败：{ex}")
+        return False
+
+
+# ====================== 打包下载（流式 ZIP） ======================
+class _ZipSink:
+    """只写、不可 seek 的输出缓冲：zipfile 检测到不可 seek 时改用数据描述符，写完一个块即可取走"""
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def write(self, data):
+        self.buf += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = bytes(self.buf)
+        self.buf.clear()
+        return data
+
+
+def _safe_part(name):
+    return str(name or '').replace('/', '_').replace('\\', '_').strip() or '_'
+
+def iter_zip(entries, compress=False):
+    """
+    流式生成 ZIP
+    :param entries: [(压缩包内目录, 文件名, 磁盘路径), ...]
+    :param compress: True 时 DEFLATE 压缩（图纸/PDF 多已压缩，默认仅存储以省 CPU）
+    :return: bytes 块生成器；缺失的文件记入 "缺失文件.txt"
+    """
+    sink = _ZipSink()
+    method = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    used, missing = set(), []
+    with zipfile.ZipFile(sink, 'w', compression=method, allowZip64=True) as zf:
+        for folder, file_name, path in entries:
+            if not path or not os.path.isfile(path):
+                missing.append(f"{folder}/{file_name}")
+                continue
+            # 同目录重名文件追加序号
+            base, ext = os.path.splitext(_safe_part(file_name))
+            arcname, n = f"{_safe_part(folder)}/{base}{ext}", 1
+            while arcname in used:
+                arcname = f"{_safe_part(folder)}/{base}({n}){ext}"; n += 1
+            used.add(arcname)
+
+            info = zipfile.ZipInfo(arcname, date_time=datetime.fromtimestamp(os.path.getmtime(path)).timetuple()[:6])
+            info.compress_type = method
+            with open(path, 'rb') as src, zf.open(info, 'w', force_zip64=True) as dst:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    yield sink.take()
+            yield sink.take()
+        if missing:
+            zf.writestr('缺失文件.txt', '\r\n'.join(missing))
+    yield sink.take()
@@ -0,0 +1,61 @@
+# modules/compression.py
+"""
+接口响应压缩（after_request）
+- 按 Accept-Encoding 协商 br（已安装 brotli 包时）/ gzip，响应体不小于 COMPRESS_MIN_SIZE 才压缩
+- 只处理 JSON / 文本类响应；流式响应（SSE 进度、导出）、send_file、已带 Content-Encoding 的响应
+  （页面缓存 modules/static_cache.py 已预压缩）原样放行
+- 压缩后强 ETag 改为弱 ETag（同内容不同编码），字典接口的 If-None-Match/304 仍然有效
+用法：
+    init_app(app)
+"""
+
+import gzip
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    brotli = None
+
+from config import COMPRESS_MIN_SIZE, COMPRESS_LEVEL
+
+_COMPRESSIBLE = ('text/', 'application/json', 'application/javascript', 'application/xml')
+# 动态内容压缩取速度优先的级别
+BROTLI_QUALITY = 4
+
+
+def _accepted(accept_encoding):
+    return {part.split(';')[0].strip().lower() for part in (accept_encoding or '').split(',')}
+
+def compress_response(response, accept_encoding):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(_COMPRESSIBLE)):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    response.vary.add('Accept-Encoding')
+
+    accepted = _accepted(accept_encoding)
+    if brotli is not None and 'br' in accepted:
+        encoding, data = 'br', brotli.compress(body, quality=BROTLI_QUALITY)
+    elif 'gzip' in accepted:
+        encoding, data = 'gzip', gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+    else:
+        return response
+    if len(data) >= len(body):
+        return response
+
+    response.set_data(data)  # 同时更新 Content-Length
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def init_app(app):
+    from flask import request
+
+    @app.after_request
+    def _compress(response):
+        return compress_response(response, request.headers.get('Accept-Encoding'))
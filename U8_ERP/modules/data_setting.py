@@ -7,13 +7,22 @@ data_setting.py
 1) 用户管理：查询 / 新增 / 更新 / 删除
 2) 模具费返还方式（Mujufanhuan）：查询 / 新增 / 更新 / 删除
 3) 模具工艺（MJGYi）：查询 / 新增 / 更新 / 删除
-4) 模具与物料对照（MJWLDZhao）：条件 + 分页查询
+4) 模具与物料对照（MJWLDZhao）：条件 + 游标（keyset）分页查询，总数按关键字缓存
+5) 批量增删改：以上四类按条目数组在一个事务内执行（batch_apply）
+
+返还方式、工艺列表经 modules/ref_cache.py 缓存，本模块增删改后按分组失效（refund / process）
 """
 
 from typing import List, Dict, Any, Tuple, Optional
 from datetime import datetime
+import base64
 import hashlib
+import json
+import threading
+import time
 from db.session import get_dst_connection
+from modules import ref_cache
+from modules.user import invalidate_user
 
 class DataSettingService:
     """数据设置服务"""
@@ -42,6 +51,16 @@ class DataSettingService:
     MAP_MJNAME_CAND = ["MJ_name", "mj_name"]
     MAP_CINVCODE_CAND = ["cinvcode", "cInvCode"]
     MAP_CINVNAME_CAND = ["cinvname", "cInvName"]
+    MAP_ID_CAND = ["id", "autoid", "AutoID"]
+    MAP_SEARCH_COL = "search_text"   # 可选的检索列（ensure_mjwldzhao_search_column 创建）
+    MAP_COLUMNS_TTL = 300
+    MAP_COUNT_TTL = 300
+    MAP_COUNT_MAX_KEYS = 500
+
+    # 对照表列探测 / 总数缓存（类级共享，接口层每个请求共用）
+    _map_lock = threading.Lock()
+    _map_columns: Dict[str, Any] = {"at": 0.0, "cols": None}
+    _map_counts: Dict[Tuple[str, str], Tuple[int, bool, float]] = {}
 
     # ---------- 私有工具 ----------
     def _get_columns(self, cursor, table: str) -> List[str]:
@@ -172,6 +191,7 @@ class DataSettingService:
             sql = f"INSERT INTO {self.USER_TABLE} ({', '.join(insert_cols)}) VALUES ({placeholders})"
             cur.execute(sql, values)
             conn.commit()
+            invalidate_user()  # 按 ID 修改，身份缓存整体失效
             cur.execute("SELECT SCOPE_IDENTITY()")
             row = cur.fetchone()
             new_id = int(row[0]) if row and row[0] is not None else 0
@@ -225,6 +245,7 @@ class DataSettingService:
             values.append(user_id)
             cur.execute(sql, values)
             conn.commit()
+            invalidate_user()  # 按 ID 修改，身份缓存整体失效
 
     def delete_user(self, user_id: int) -> None:
         if not user_id:
@@ -235,9 +256,13 @@ class DataSettingService:
             id_col = self._pick_col(cols, [self.USER_ID_COL], self.USER_ID_COL)
             cur.execute(f"DELETE FROM {self.USER_TABLE} WHERE {id_col} = ?", (user_id,))
             conn.commit()
+            invalidate_user()  # 按 ID 修改，身份缓存整体失效
 
     # ============== 返还方式 ==============
     def list_refund_methods(self) -> List[Dict[str, Any]]:
+        return ref_cache.get("setting.refund_methods")[0]
+
+    def _load_refund_methods(self) -> List[Dict[str, Any]]:
         with get_dst_connection() as conn:
             cur = conn.cursor()
             cols = self._get_columns(cur, self.REFUND_TABLE)
@@ -261,6 +286,7 @@ class DataSettingService:
             sql = f"INSERT INTO {self.REFUND_TABLE} ({name_col}) VALUES (?)"
             cur.execute(sql, (name.strip(),))
             conn.commit()
+            ref_cache.invalidate("refund")
             cur.execute("SELECT SCOPE_IDENTITY()")
             row = cur.fetchone()
             new_id = int(row[0]) if row and row[0] is not None else 0
@@ -277,6 +303,7 @@ class DataSettingService:
             sql = f"UPDATE {self.REFUND_TABLE} SET {name_col} = ? WHERE {id_col} = ?"
             cur.execute(sql, (name.strip(), rid))
             conn.commit()
+            ref_cache.invalidate("refund")
 
     def delete_refund_method(self, rid: int) -> None:
         if not rid:
@@ -287,9 +314,13 @@ class DataSettingService:
             id_col = self._pick_col(cols, [self.REFUND_ID_COL], self.REFUND_ID_COL)
             cur.execute(f"DELETE FROM {self.REFUND_TABLE} WHERE {id_col} = ?", (rid,))
             conn.commit()
+            ref_cache.invalidate("refund")
 
     # ============== 模具工艺 ==============
     def list_process_methods(self) -> List[Dict[str, Any]]:
+        return ref_cache.get("setting.process_methods")[0]
+
+    def _load_process_methods(self) -> List[Dict[str, Any]]:
         with get_dst_connection() as conn:
             cur = conn.cursor()
             cols = self._get_columns(cur, self.PROC_TABLE)
@@ -313,6 +344,7 @@ class DataSettingService:
             sql = f"INSERT INTO {self.PROC_TABLE} ({name_col}) VALUES (?)"
             cur.execute(sql, (name.strip(),))
             conn.commit()
+            ref_cache.invalidate("process")
             cur.execute("SELECT SCOPE_IDENTITY()")
             row = cur.fetchone()
             new_id = int(row[0]) if row and row[0] is not None else 0
@@ -329,6 +361,7 @@ class DataSettingService:
             sql = f"UPDATE {self.PROC_TABLE} SET {name_col} = ? WHERE {id_col} = ?"
             cur.execute(sql, (name.strip(), pid))
             conn.commit()
+            ref_cache.invalidate("process")
 
     def delete_process_method(self, pid: int) -> None:
         if not pid:
@@ -339,62 +372,469 @@ class DataSettingService:
             id_col = self._pick_col(cols, [self.PROC_ID_COL], self.PROC_ID_COL)
             cur.execute(f"DELETE FROM {self.PROC_TABLE} WHERE {id_col} = ?", (pid,))
             conn.commit()
-
-    # ============== 模具与物料对照（分页 + 查询） ==============
-    def list_mjwldzhao(self, kw: str = "", page: int = 1, size: int = 20) -> Tuple[List[Dict[str, Any]], int]:
-        page = max(1, int(page or 1))
+            ref_cache.invalidate("process")
+
+    # ============== 模具与物料对照（游标分页 + 查询） ==============
+    # 按稳定键倒序做 keyset 分页：有自增列时用自增列，否则用 (模具ID, 物料编码)
+    # 下一页条件为 "键 < 上一页最后一行的键"，任何页深都是索引定位，不再 OFFSET 跳行
+    # 总数：无关键字取分区统计行数（估算，不扫表）；有关键字时 COUNT 一次后按关键字缓存
+    def _map_meta(self, cur) -> Dict[str, Any]:
+        with self._map_lock:
+            cached = self._map_columns
+            if cached["cols"] is not None and time.time() - cached["at"] < self.MAP_COLUMNS_TTL:
+                return cached["cols"]
+        cols = self._get_columns(cur, self.MAP_TABLE)
+        meta = {
+            "mjid": self._pick_col(cols, self.MAP_MJID_CAND),
+            "mjname": self._pick_col(cols, self.MAP_MJNAME_CAND),
+            "cinvcode": self._pick_col(cols, self.MAP_CINVCODE_CAND),
+            "cinvname": self._pick_col(cols, self.MAP_CINVNAME_CAND),
+            "id": self._pick_col(cols, self.MAP_ID_CAND),
+            "search": self._pick_col(cols, [self.MAP_SEARCH_COL]),
+        }
+        meta["select"] = [meta[k] for k in ("mjid", "mjname", "cinvcode", "cinvname") if meta[k]]
+        if not meta["select"]:
+            raise RuntimeError("MJWLDZhao 表缺少必要列（MJ_id/MJ_name/cinvcode/cinvname）")
+        meta["keys"] = [meta["id"]] if meta["id"] else [c for c in (meta["mjid"], meta["cinvcode"]) if c] or meta["select"][:1]
+        with self._map_lock:
+            type(self)._map_columns = {"at": time.time(), "cols": meta}
+        return meta
+
+    @classmethod
+    def invalidate_mjwldzhao_cache(cls) -> None:
+        """对照表写入（或表结构变化）后调用：清空总数与列探测缓存"""
+        with cls._map_lock:
+            cls._map_counts.clear()
+            cls._map_columns = {"at": 0.0, "cols": None}
+
+    @staticmethod
+    def _encode_map_cursor(values: List[Any]) -> str:
+        raw = json.dumps(values, ensure_ascii=False, default=str).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def _decode_map_cursor(cursor: str) -> Optional[List[Any]]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            values = json.loads(raw.decode("utf-8"))
+            return values if isinstance(values, list) else None
+        except Exception:
+            return None
+
+    def _map_where(self, meta: Dict[str, Any], kw: str, match: str) -> Tuple[List[str], List[Any]]:
+        if not kw:
+            return [], []
+        if match == "prefix":
+            # 前缀匹配可走编码/模具名称上的索引
+            cols = [c for c in (meta["cinvcode"], meta["mjname"], meta["cinvname"]) if c]
+            return ["(" + " OR ".join(f"{c} LIKE ?" for c in cols) + ")"], [f"{kw}%"] * len(cols)
+        if meta["search"]:
+            # 检索列已建：只扫这一列上的窄索引
+            return [f"{meta['search']} LIKE ?"], [f"%{kw}%"]
+        return ["(" + " OR ".join(f"{c} LIKE ?" for c in meta["select"]) + ")"], [f"%{kw}%"] * len(meta["select"])
+
+    def _map_total(self, cur, meta: Dict[str, Any], kw: str, match: str,
+                   where: List[str], params: List[Any]) -> Tuple[int, bool]:
+        """返回 (总数, 是否估算)"""
+        key = (kw, match)
+        with self._map_lock:
+            hit = self._map_counts.get(key)
+            if hit and time.time() - hit[2] < self.MAP_COUNT_TTL:
+                return hit[0], hit[1]
+        total, estimated = None, False
+        if not where:
+            try:
+                cur.execute("""
+                    SELECT SUM(row_count) FROM sys.dm_db_partition_stats
+                    WHERE object_id = OBJECT_ID(?) AND index_id IN (0, 1)
+                """, (self.MAP_TABLE,))
+                row = cur.fetchone()
+                if row and row[0] is not None:
+                    total, estimated = int(row[0]), True
+            except Exception:
+                total = None  # 无 VIEW DATABASE STATE 权限时退回 COUNT
+        if total is None:
+            cur.execute(f"SELECT COUNT(1) FROM {self.MAP_TABLE}" + (" WHERE " + " AND ".join(where) if where else ""), params)
+            row = cur.fetchone()
+            total = int(row[0]) if row and row[0] is not None else 0
+        with self._map_lock:
+            if len(self._map_counts) >= self.MAP_COUNT_MAX_KEYS:
+                self._map_counts.clear()
+            self._map_counts[key] = (total, estimated, time.time())
+        return total, estimated
+
+    def page_mjwldzhao(self, kw: str = "", cursor: Optional[str] = None, size: int = 20,
+                       match: str = "contains", with_total: bool = True,
+                       page: Optional[int] = None) -> Dict[str, Any]:
+        """
+        游标分页：返回 {data, next_cursor, has_more, total, total_estimated}
+        cursor 为上一页返回的 next_cursor；不传 cursor 时为第一页
+        兼容旧参数 page（>1 时按 OFFSET 跳页，深页较慢，仅为兼容保留）
+        """
         size = max(1, min(int(size or 20), 200))
+        kw = (kw or "").strip()
+        match = "prefix" if match == "prefix" else "contains"
 
         with get_dst_connection() as conn:
             cur = conn.cursor()
-            cols = self._get_columns(cur, self.MAP_TABLE)
-
-            mjid_col = self._pick_col(cols, self.MAP_MJID_CAND)
-            mjname_col = self._pick_col(cols, self.MAP_MJNAME_CAND)
-            cinvcode_col = self._pick_col(cols, self.MAP_CINVCODE_CAND)
-            cinvname_col = self._pick_col(cols, self.MAP_CINVNAME_CAND)
-
-            select_cols = [c for c in [mjid_col, mjname_col, cinvcode_col, cinvname_col] if c]
-            if not select_cols:
-                raise RuntimeError("MJWLDZhao 表缺少必要列（MJ_id/MJ_name/cinvcode/cinvname）")
-
-            # WHERE
-            where_sql: str = ""
-            params: List[Any] = []
-            if kw:
-                like = f"%{kw}%"
-                parts: List[str] = []
-                for col in select_cols:
-                    parts.append(f"{col} LIKE ?")
-                    params.append(like)
-                where_sql = " WHERE " + " OR ".join(parts)
-
-            # 总数
-            count_sql = f"SELECT COUNT(1) FROM {self.MAP_TABLE}" + where_sql
-            cur.execute(count_sql, params)
-            row = cur.fetchone()
-            total = int(row[0]) if row and row[0] is not None else 0
-
-            # 列表（分页）
-            offset = (page - 1) * size
-            list_sql = f"""
-            SELECT {', '.join(select_cols)}
-            FROM {self.MAP_TABLE}
-            {where_sql}
-            ORDER BY {select_cols[0]} DESC
-            OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
-            """
-            cur.execute(list_sql, (*params, offset, size))
+            meta = self._map_meta(cur)
+            keys = meta["keys"]
+            where, params = self._map_where(meta, kw, match)
+
+            total, estimated = (self._map_total(cur, meta, kw, match, where, params)
+                                if with_total else (None, False))
+
+            seek_where, seek_params = list(where), list(params)
+            after = self._decode_map_cursor(cursor) if cursor else None
+            if after is not None and len(after) == len(keys):
+                # (k1, k2) < (v1, v2) 展开为 k1 < v1 OR (k1 = v1 AND k2 < v2)
+                ors = []
+                for i, k in enumerate(keys):
+                    ors.append("(" + " AND ".join([f"{keys[j]} = ?" for j in range(i)] + [f"{k} < ?"]) + ")")
+                    seek_params += after[:i] + [after[i]]
+                seek_where.append("(" + " OR ".join(ors) + ")")
+
+            extra_keys = [k for k in keys if k not in meta["select"]]
+            offset_sql, offset_params = "", []
+            if after is None and page and int(page) > 1:
+                offset_sql, offset_params = "OFFSET ? ROWS FETCH NEXT ? ROWS ONLY", [(int(page) - 1) * size, size + 1]
+            cur.execute(f"""
+                SELECT {'' if offset_sql else f'TOP ({size + 1})'} {', '.join(meta['select'] + extra_keys)}
+                FROM {self.MAP_TABLE}
+                {('WHERE ' + ' AND '.join(seek_where)) if seek_where else ''}
+                ORDER BY {', '.join(f'{k} DESC' for k in keys)}
+                {offset_sql}
+            """, (*seek_params, *offset_params))
             rows = cur.fetchall()
 
-            result: List[Dict[str, Any]] = []
-            for r in rows:
-                idx = 0
-                item: Dict[str, Any] = {}
-                if mjid_col:    item["mj_id"] = r[idx]; idx += 1
-                if mjname_col:  item["mj_name"] = r[idx]; idx += 1
-                if cinvcode_col:item["cinvcode"] = r[idx]; idx += 1
-                if cinvname_col:item["cinvname"] = r[idx]; idx += 1
-                result.append(item)
+        has_more = len(rows) > size
+        rows = rows[:size]
+        names = dict(zip(meta["select"] + extra_keys, range(len(meta["select"]) + len(extra_keys))))
+        result: List[Dict[str, Any]] = []
+        for r in rows:
+            item: Dict[str, Any] = {}
+            if meta["mjid"]:    item["mj_id"] = r[names[meta["mjid"]]]
+            if meta["mjname"]:  item["mj_name"] = r[names[meta["mjname"]]]
+            if meta["cinvcode"]:item["cinvcode"] = r[names[meta["cinvcode"]]]
+            if meta["cinvname"]:item["cinvname"] = r[names[meta["cinvname"]]]
+            result.append(item)
+        next_cursor = self._encode_map_cursor([rows[-1][names[k]] for k in keys]) if has_more else None
+        return {"data": result, "next_cursor": next_cursor, "has_more": has_more,
+                "total": total, "total_estimated": estimated}
 
-            return result, total
+    def list_mjwldzhao(self, kw: str = "", page: int = 1, size: int = 20) -> Tuple[List[Dict[str, Any]], int]:
+        """兼容旧接口：(当前页数据, 总数)"""
+        res = self.page_mjwldzhao(kw=kw, size=size, page=page)
+        return res["data"], res["total"]
+
+    def ensure_mjwldzhao_search_column(self) -> Dict[str, Any]:
+        """
+        可选：为对照表增加持久化计算列 search_text（模具ID|模具名称|物料编码|物料名称）并建索引
+        包含匹配（%kw%）只需扫描这一列的窄索引，不再逐列 LIKE 整表；前缀匹配另建编码索引；
+        无自增列时为分页键 (模具ID, 物料编码) 建索引
+        """
+        with get_dst_connection() as conn:
+            cur = conn.cursor()
+            meta = self._map_meta(cur)
+            created = []
+            if not meta["search"]:
+                parts = " + N'|' + ".join(f"ISNULL(CAST({c} AS NVARCHAR(200)), N'')" for c in meta["select"])
+                cur.execute(f"ALTER TABLE {self.MAP_TABLE} ADD {self.MAP_SEARCH_COL} AS ({parts}) PERSISTED")
+                created.append(self.MAP_SEARCH_COL)
+            indexes = {f"IX_{self.MAP_TABLE}_search": self.MAP_SEARCH_COL}
+            if meta["cinvcode"]:
+                indexes[f"IX_{self.MAP_TABLE}_cinvcode"] = meta["cinvcode"]
+            if not meta["id"]:
+                indexes[f"IX_{self.MAP_TABLE}_key"] = ", ".join(meta["keys"])
+            for name, col in indexes.items():
+                cur.execute("SELECT 1 FROM sys.indexes WHERE name = ? AND object_id = OBJECT_ID(?)", (name, self.MAP_TABLE))
+                if not cur.fetchone():
+                    cur.execute(f"CREATE INDEX {name} ON {self.MAP_TABLE} ({col})")
+                    created.append(name)
+            conn.commit()
+        self.invalidate_mjwldzhao_cache()
+        return {"created": created}
+
+    # ============== 批量增删改（单连接、单事务） ==============
+    # ops: [{"op": "create"|"update"|"delete", ...字段}]，同一实体一次请求
+    # 每条先在本地校验并生成 (SQL, 参数)；改/删的目标行一次查回并加锁，不存在的条目判为失败
+    # （按条目顺序推演本批内的增删，如先删后改同一行）；按条目顺序执行，相邻且 SQL 相同的条目合并为一次 executemany；
+    # 整批在一个事务内提交，任何语句失败整体回滚并逐条重放定位出错条目；atomic=True（默认）时有条目校验失败则整批不执行
+    BATCH_MAX_ITEMS = 500
+    BATCH_ENTITIES = ("users", "refund_methods", "process_methods", "mappings")
+
+    @staticmethod
+    def _key_norm(values) -> Tuple[str, ...]:
+        # 与 SQL Server 默认排序规则一致：不区分大小写、忽略尾部空格
+        return tuple(str(v).strip().lower() for v in values)
+
+    def _locked_existing(self, cur, table: str, key_cols: List[str], keys: List[Tuple]) -> set:
+        """keys 中实际存在的键（规范化后）；UPDLOCK + HOLDLOCK 持有到事务结束，校验后不会被并发删改"""
+        found = set()
+        per = max(1, 1000 // len(key_cols))
+        for n in range(0, len(keys), per):
+            part = keys[n:n + per]
+            if len(key_cols) == 1:
+                where = f"{key_cols[0]} IN ({', '.join('?' * len(part))})"
+            else:
+                where = " OR ".join("(" + " AND ".join(f"{c} = ?" for c in key_cols) + ")" for _ in part)
+            cur.execute(f"SELECT {', '.join(key_cols)} FROM {table} WITH (UPDLOCK, HOLDLOCK) WHERE {where}",
+                        [v for k in part for v in k])
+            found.update(self._key_norm(r) for r in cur.fetchall())
+        return found
+
+    @staticmethod
+    def _batch_runs(steps: List[Tuple[int, str, List[Any]]]) -> List[Tuple[str, List[Tuple[int, List[Any]]]]]:
+        """相邻且 SQL 相同的条目合并为一组，组间保持条目顺序"""
+        runs: List[Tuple[str, List[Tuple[int, List[Any]]]]] = []
+        for i, sql, params in steps:
+            if runs and runs[-1][0] == sql:
+                runs[-1][1].append((i, params))
+            else:
+                runs.append((sql, [(i, params)]))
+        return runs
+
+    @staticmethod
+    def _locate_batch_error(conn, steps, run, error):
+        """
+        executemany 失败后（已回滚）定位出错条目：单条组直接返回；否则逐条重放到出错为止再回滚
+        :return: (出错条目序号, 异常)；重放未能复现时序号为 None
+        """
+        if len(run) == 1:
+            return run[0][0], error
+        cur = conn.cursor()
+        try:
+            for i, sql, params in steps:
+                try:
+                    cur.execute(sql, params)
+                except Exception as e:
+                    return i, e
+            return None, error
+        finally:
+            conn.rollback()
+
+    def _plan_users(self, cur):
+        cols = self._get_columns(cur, self.USER_TABLE)
+        id_col = self._pick_col(cols, [self.USER_ID_COL], self.USER_ID_COL)
+        name_col = self._pick_col(cols, [self.USER_NAME_COL], self.USER_NAME_COL)
+        real_col = self._pick_col(cols, self.USER_REALNAME_CAND)
+        role_col = self._pick_col(cols, self.USER_ROLE_CAND)
+        enabled_col = self._pick_col(cols, self.USER_ENABLED_CAND)
+        pwd_col = self._pick_col(cols, self.USER_PWD_CAND)
+        created_col = self._pick_col(cols, self.USER_CREATED_AT_CAND)
+        use_plain = True
+        if pwd_col:
+            maxlen = self._get_char_max_length(cur, self.USER_TABLE, pwd_col)
+            use_plain = (self.USER_TABLE.lower() == "sysuser") or (maxlen is not None and maxlen < 60)
+
+        def pwd(p: str) -> str:
+            return p if use_plain else self._hash_password(p)
+
+        def plan(op: str, item: Dict[str, Any]):
+            if op == "delete":
+                return f"DELETE FROM {self.USER_TABLE} WHERE {id_col} = ?", [int(item["id"])], None, (int(item["id"]),)
+            if op == "create":
+                username = (item.get("username") or "").strip()
+                password = (item.get("password") or "").strip()
+                if not username:
+                    raise ValueError("用户名不能为空")
+                if not password:
+                    raise ValueError("新增用户必须设置密码")
+                pairs = [(name_col, username)]
+                if real_col: pairs.append((real_col, item.get("real_name")))
+                if role_col: pairs.append((role_col, item.get("role") or "user"))
+                if enabled_col: pairs.append((enabled_col, 1 if item.get("enabled") else 0))
+                if pwd_col: pairs.append((pwd_col, pwd(password)))
+                if created_col: pairs.append((created_col, datetime.now()))
+                sql = (f"INSERT INTO {self.USER_TABLE} ({', '.join(c for c, _ in pairs)}) "
+                       f"VALUES ({', '.join('?' * len(pairs))})")
+                return sql, [v for _, v in pairs], username, None
+            # update：只改传入的字段，相同字段组合的条目合并执行
+            pairs = []
+            if "username" in item: pairs.append((name_col, (item["username"] or "").strip()))
+            if real_col and "real_name" in item: pairs.append((real_col, item["real_name"]))
+            if role_col and "role" in item: pairs.append((role_col, item["role"]))
+            if enabled_col and "enabled" in item: pairs.append((enabled_col, 1 if item["enabled"] else 0))
+            if pwd_col and item.get("password"): pairs.append((pwd_col, pwd(item["password"])))
+            if not pairs:
+                raise ValueError("没有可更新字段")
+            sql = f"UPDATE {self.USER_TABLE} SET {', '.join(f'{c} = ?' for c, _ in pairs)} WHERE {id_col} = ?"
+            return sql, [v for _, v in pairs] + [int(item["id"])], None, (int(item["id"]),)
+
+        def created_ids(keys: List[str]) -> Dict[str, int]:
+            cur.execute(f"SELECT {id_col}, {name_col} FROM {self.USER_TABLE} "
+                        f"WHERE {name_col} IN ({', '.join('?' * len(keys))})", keys)
+            return {r[1]: int(r[0]) for r in cur.fetchall()}
+
+        def existing(keys: List[Tuple]) -> set:
+            return self._locked_existing(cur, self.USER_TABLE, [id_col], keys)
+
+        return plan, created_ids, invalidate_user, existing
+
+    def _plan_dictionary(self, cur, table: str, id_col: str, name_cand: List[str], label: str, group: str):
+        cols = self._get_columns(cur, table)
+        id_col = self._pick_col(cols, [id_col], id_col)
+        name_col = self._pick_col(cols, name_cand)
+        if not name_col:
+            raise RuntimeError(f"{table} 表缺少名称列")
+
+        def plan(op: str, item: Dict[str, Any]):
+            if op == "delete":
+                return f"DELETE FROM {table} WHERE {id_col} = ?", [int(item["id"])], None, (int(item["id"]),)
+            name = (item.get("name") or "").strip()
+            if not name:
+                raise ValueError(f"{label}名称不能为空")
+            if op == "create":
+                return f"INSERT INTO {table} ({name_col}) VALUES (?)", [name], name, None
+            return f"UPDATE {table} SET {name_col} = ? WHERE {id_col} = ?", [name, int(item["id"])], None, (int(item["id"]),)
+
+        def created_ids(keys: List[str]) -> Dict[str, int]:
+            # 同名取最新一条
+            cur.execute(f"SELECT {id_col}, {name_col} FROM {table} "
+                        f"WHERE {name_col} IN ({', '.join('?' * len(keys))}) ORDER BY {id_col}", keys)
+            return {r[1]: int(r[0]) for r in cur.fetchall()}
+
+        def existing(keys: List[Tuple]) -> set:
+            return self._locked_existing(cur, table, [id_col], keys)
+
+        return plan, created_ids, lambda: ref_cache.invalidate(group), existing
+
+    def _plan_refund_methods(self, cur):
+        return self._plan_dictionary(cur, self.REFUND_TABLE, self.REFUND_ID_COL, self.REFUND_NAME_CAND, "返还方式", "refund")
+
+    def _plan_process_methods(self, cur):
+        return self._plan_dictionary(cur, self.PROC_TABLE, self.PROC_ID_COL, self.PROC_NAME_CAND, "工艺", "process")
+
+    def _plan_mappings(self, cur):
+        meta = self._map_meta(cur)
+        fields = {"mj_id": meta["mjid"], "mj_name": meta["mjname"], "cinvcode": meta["cinvcode"], "cinvname": meta["cinvname"]}
+        key_fields = [f for f in ("mj_id", "cinvcode") if fields[f]]
+        if not key_fields:
+            raise RuntimeError("MJWLDZhao 表缺少 MJ_id/cinvcode 列，无法按键维护")
+
+        def key_of(item: Dict[str, Any]):
+            values = [item.get(f) for f in key_fields]
+            if any(v in (None, "") for v in values):
+                raise ValueError(f"{'/'.join(key_fields)} 不能为空")
+            return " AND ".join(f"{fields[f]} = ?" for f in key_fields), values
+
+        def plan(op: str, item: Dict[str, Any]):
+            if op == "delete":
+                where, params = key_of(item)
+                return f"DELETE FROM {self.MAP_TABLE} WHERE {where}", params, None, tuple(params)
+            if op == "create":
+                _, params = key_of(item)
+                pairs = [(c, item.get(f)) for f, c in fields.items() if c]
+                sql = (f"INSERT INTO {self.MAP_TABLE} ({', '.join(c for c, _ in pairs)}) "
+                       f"VALUES ({', '.join('?' * len(pairs))})")
+                return sql, [v for _, v in pairs], None, tuple(params)
+            where, params = key_of(item)
+            pairs = [(fields[f], item[f]) for f in ("mj_name", "cinvname") if fields[f] and f in item]
+            if not pairs:
+                raise ValueError("没有可更新字段（mj_name / cinvname）")
+            sql = f"UPDATE {self.MAP_TABLE} SET {', '.join(f'{c} = ?' for c, _ in pairs)} WHERE {where}"
+            return sql, [v for _, v in pairs] + params, None, tuple(params)
+
+        def existing(keys: List[Tuple]) -> set:
+            return self._locked_existing(cur, self.MAP_TABLE, [fields[f] for f in key_fields], keys)
+
+        return plan, None, self.invalidate_mjwldzhao_cache, existing
+
+    def batch_apply(self, entity: str, ops: List[Dict[str, Any]], atomic: bool = True) -> Dict[str, Any]:
+        """
+        批量增删改：返回 {"success", "results": [{"index", "op", "success", "id"?, "msg"?}]}
+        条目按提交顺序执行；改/删的记录不存在时该条失败
+        新增条目的 id 在提交前按自然键（用户名 / 名称）一次查回
+        """
+        if entity not in self.BATCH_ENTITIES:
+            raise ValueError(f"不支持的实体：{entity}")
+        ops = list(ops or [])
+        if not ops:
+            raise ValueError("ops 不能为空")
+        if len(ops) > self.BATCH_MAX_ITEMS:
+            raise ValueError(f"一次最多 {self.BATCH_MAX_ITEMS} 条")
+
+        results: List[Dict[str, Any]] = [{"index": i, "op": (o or {}).get("op") if isinstance(o, dict) else None}
+                                         for i, o in enumerate(ops)]
+        with get_dst_connection() as conn:
+            cur = conn.cursor()
+            plan, created_ids, after_commit, existing = getattr(self, f"_plan_{entity}")(cur)
+
+            steps: List[Tuple[int, str, List[Any]]] = []  # (条目序号, SQL, 参数)，按提交顺序
+            targets: Dict[int, Tuple] = {}
+            new_keys: Dict[int, Any] = {}
+            for i, item in enumerate(ops):
+                try:
+                    if not isinstance(item, dict) or item.get("op") not in ("create", "update", "delete"):
+                        raise ValueError("op 只能是 create / update / delete")
+                    sql, params, key, target = plan(item["op"], item)
+                except (KeyError, TypeError, ValueError) as e:
+                    results[i].update(success=False, msg=str(e) if isinstance(e, ValueError) else "缺少或无效的 id")
+                    continue
+                steps.append((i, sql, params))
+                if key is not None:
+                    new_keys[i] = key
+                if target is not None:
+                    targets[i] = target
+
+            # 改/删的目标行须存在：一次查回并加锁，再按条目顺序推演本批内的新增与删除
+            if targets:
+                present = existing(list({self._key_norm(t): t for t in targets.values()}.values()))
+                kept = []
+                for i, sql, params in steps:
+                    op = ops[i]["op"]
+                    target = self._key_norm(targets[i]) if i in targets else None
+                    if op == "create":
+                        if target is not None:
+                            present.add(target)
+                    elif target not in present:
+                        results[i].update(success=False, msg="记录不存在（或已在本批中删除）")
+                        new_keys.pop(i, None)
+                        continue
+                    elif op == "delete":
+                        present.discard(target)
+                    kept.append((i, sql, params))
+                steps = kept
+
+            invalid = [r for r in results if r.get("success") is False]
+            if invalid and atomic:
+                for r in results:
+                    if "success" not in r:
+                        r.update(success=False, msg="同批有条目校验失败，整批未执行")
+                return {"success": False, "results": results}
+
+            current: List[Tuple[int, List[Any]]] = []
+            try:
+                cur.fast_executemany = True
+                for sql, items in self._batch_runs(steps):
+                    current = items
+                    cur.executemany(sql, [p for _, p in items])
+                current = []
+                ids = created_ids(sorted(set(new_keys.values()))) if created_ids and new_keys else {}
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                failed, error = self._locate_batch_error(conn, steps, current, e) if current else (None, e)
+                in_run = {i for i, _ in current}
+                for r in results:
+                    if "success" not in r:
+                        if r["index"] == failed:
+                            msg = f"执行失败：{error}"
+                        elif failed is None and r["index"] in in_run:
+                            msg = f"所在组执行失败（未能定位到具体条目）：{error}"
+                        else:
+                            msg = "同批执行失败，已整体回滚"
+                        r.update(success=False, msg=msg)
+                return {"success": False, "results": results}
+
+        for r in results:
+            if "success" not in r:
+                r["success"] = True
+                if r["index"] in new_keys and new_keys[r["index"]] in ids:
+                    r["id"] = ids[new_keys[r["index"]]]
+        if after_commit:
+            after_commit()
+        return {"success": not invalid, "results": results}
+
+ref_cache.register("setting.refund_methods", lambda: DataSettingService()._load_refund_methods(), group="refund")
+ref_cache.register("setting.process_methods", lambda: DataSettingService()._load_process_methods(), group="process")
@@ -1,11 +1,15 @@
 # modules/mold.py
 
 import os
-import shutil
-from datetime import datetime
+import json
+import time
+import base64
+from datetime import datetime, date
+from modules import attachment_store, mold_summary, mold_location, mold_material, ref_cache
+from modules.search_index import MoldSearchIndex, inventory_index, supplier_index
 from db.session import get_dst_connection  # 如果你的项目是 db/session.py，请改为: from db.session import get_dst_connection
 
-# 上传根目录（可按需调整）
+# 历史附件上传根目录（新附件改存 ATTACHMENT_STORE_DIR，见 modules/attachment_store.py）
 UPLOAD_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../uploads/mold'))
 
 # ====================== 工具函数 ======================
@@ -35,60 +39,73 @@ def _safe_float(v):
     except Exception:
         return None
 
-def _ensure_upload_dir(mold_id: int):
-    d = os.path.join(UPLOAD_ROOT, str(mold_id))
-    os.makedirs(d, exist_ok=True)
-    return d
-
 # ====================== 字典/下拉 ======================
-def search_supplier(keyword):
-    """模糊搜索供应商，返回 [{'id':..., 'supplier_name':...}, ...]"""
+def search_supplier(keyword, limit=50):
+    """供应商联想（内存索引，名称前缀优先），返回 [{'id':..., 'supplier_name':...}, ...]"""
     if not keyword:
         return []
-    with get_dst_connection() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT id, supplier_name FROM Supplier WHERE supplier_name LIKE ? ORDER BY supplier_name",
-            f"%{keyword}%"
-        )
-        return [{'id': r[0], 'supplier_name': r[1]} for r in cur.fetchall()]
+    return supplier_index.search(keyword, limit)
 
-def search_inventory(keyword):
-    """物料编码或名称精确/模糊查找"""
+def search_inventory(keyword, limit=100):
+    """物料编码或名称联想（内存索引：编码前缀树 + 三字 gram），编码完全/前缀命中排前"""
     if not keyword:
         return []
-    kw = f"%{keyword}%"
-    with get_dst_connection() as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT TOP (100) cInvCode, cInvName
-            FROM Inventory
-            WHERE cInvCode LIKE ? OR cInvName LIKE ?
-            ORDER BY cInvCode
-        """, kw, kw)
-        return [{'cInvCode': row[0], 'cInvName': row[1]} for row in cur.fetchall()]
+    return inventory_index.search(keyword, limit)
 
-def list_refund_methods():
+# 下拉字典走 modules/ref_cache.py：数据设置增删改时失效，平时不访问数据库
+# 表不存在时返回空列表（可以缓存）；其他查询错误（锁超时、死锁等）直接抛出，不把空结果缓存一小时
+def _table_exists(cur, table):
+    cur.execute("SELECT OBJECT_ID(?, 'U')", table)
+    return cur.fetchone()[0] is not None
+
+def _load_refund_methods():
     with get_dst_connection() as conn:
         cur = conn.cursor()
-        try:
-            cur.execute("SELECT id, name FROM RefundMethod ORDER BY id")
-            return [{'id': r[0], 'name': r[1]} for r in cur.fetchall()]
-        except Exception:
+        if not _table_exists(cur, 'RefundMethod'):
             return []
+        cur.execute("SELECT id, name FROM RefundMethod ORDER BY id")
+        return [{'id': r[0], 'name': r[1]} for r in cur.fetchall()]
 
-def list_process_methods():
+def _load_process_methods():
     with get_dst_connection() as conn:
         cur = conn.cursor()
         for tbl in ('MoldProcess', 'ProcessMethod'):
-            try:
+            if _table_exists(cur, tbl):
                 cur.execute(f"SELECT id, name FROM {tbl} ORDER BY id")
                 return [{'id': r[0], 'name': r[1]} for r in cur.fetchall()]
-            except Exception:
-                continue
         return []
 
+ref_cache.register('refund_methods', _load_refund_methods, group='refund')
+ref_cache.register('process_methods', _load_process_methods, group='process')
+
+def list_refund_methods():
+    return ref_cache.get('refund_methods')[0]
+
+def list_process_methods():
+    return ref_cache.get('process_methods')[0]
+
+def _refund_name(cur, refund_method_id):
+    """返还方式 ID -> 名称：先查字典缓存，缓存中没有（如刚新增）再查库"""
+    try:
+        rid = int(refund_method_id)
+    except (TypeError, ValueError):
+        return None
+    try:
+        for r in list_refund_methods():
+            if r['id'] == rid:
+                return r['name']
+    except Exception:
+        pass  # 字典加载失败时直接查库
+    try:
+        cur.execute("SELECT name FROM RefundMethod WHERE id=?", rid)
+        rr = cur.fetchone()
+        return rr[0] if rr else None
+    except Exception:
+        return None
+
 # ====================== 附件 ======================
+# 附件内容按 SHA-256 存放（modules/attachment_store.py），MoldAttachment.file_path 指向内容文件，
+# 相同文件被多个台账引用时只存一份
 def save_attachment(mold_id, file_storage):
     """保存单个附件（供上传接口调用）"""
     if not file_storage:
@@ -97,13 +114,8 @@ def save_attachment(mold_id, file_storage):
     if not filename:
         return None
 
-    upload_dir = _ensure_upload_dir(mold_id)
-    ts = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-    safe_name = f"{ts}_{filename}"
-    abs_path = os.path.join(upload_dir, safe_name)
-    file_storage.save(abs_path)
-
-    with get_dst_connection() as conn:
+    with attachment_store.Upload() as upload, get_dst_connection() as conn:
+        digest, size, abs_path = upload.put(file_storage)
         cur = conn.cursor()
         cur.execute(
             "INSERT INTO MoldAttachment (mold_id, file_name, file_path, upload_time) VALUES (?, ?, ?, ?)",
@@ -112,7 +124,7 @@ def save_attachment(mold_id, file_storage):
         cur.execute("SELECT @@IDENTITY")
         attach_id = int(cur.fetchone()[0])
         conn.commit()
-    return {'id': attach_id, 'file_name': filename, 'file_path': abs_path}
+    return {'id': attach_id, 'file_name': filename, 'file_path': abs_path, 'sha256': digest, 'size': size}
 
 def get_attachment_path(attach_id: int):
     with get_dst_connection() as conn:
@@ -122,13 +134,14 @@ def get_attachment_path(attach_id: int):
         return row[0] if row else None
 
 def get_attachments_by_id(attach_id: int):
+    """附件信息；etag 为内容摘要（历史附件没有摘要时为 None）"""
     with get_dst_connection() as conn:
         cur = conn.cursor()
         cur.execute("SELECT file_name, file_path FROM MoldAttachment WHERE id=?", attach_id)
         row = cur.fetchone()
         if not row:
             return None
-        return {'file_name': row[0], 'file_path': row[1]}
+        return {'file_name': row[0], 'file_path': row[1], 'etag': attachment_store.digest_of(row[1])}
 
 def delete_attachment(attachment_id: int):
     path = None
@@ -140,45 +153,46 @@ def delete_attachment(attachment_id: int):
             path = r[0]
         cur.execute("DELETE FROM MoldAttachment WHERE id=?", attachment_id)
         conn.commit()
-    if path and os.path.isfile(path):
-        try:
-            os.remove(path)
-        except Exception:
-            pass
+    # 内容文件无其他引用时才删除
+    attachment_store.release([path])
     return {'success': True}
 
-def save_attachments_to_db(cursor, mold_id, attachments):
-    """批量保存附件（与 add/update 组合使用）"""
-    upload_dir = _ensure_upload_dir(mold_id)
+def list_attachments_for_molds(mold_ids):
+    """多个台账的附件清单 [(mold_id, product_name, attach_id, file_name, file_path), ...]，按台账、附件 ID 排序"""
+    ids = sorted({int(x) for x in mold_ids or []})
+    if not ids:
+        return []
+    rows = []
+    with get_dst_connection() as conn:
+        cur = conn.cursor()
+        # SQL Server 单语句参数上限 2100，分批查询
+        for i in range(0, len(ids), 1000):
+            part = ids[i:i + 1000]
+            cur.execute(f"""
+                SELECT a.mold_id, m.product_name, a.id, a.file_name, a.file_path
+                FROM MoldAttachment a
+                LEFT JOIN Mold m ON m.id = a.mold_id
+                WHERE a.mold_id IN ({', '.join('?' * len(part))})
+                ORDER BY a.mold_id, a.id
+            """, *part)
+            rows.extend(tuple(r) for r in cur.fetchall())
+    return rows
+
+def save_attachments_to_db(cursor, mold_id, attachments, upload):
+    """批量保存附件（与 add/update 组合使用；upload 为包住该事务的 attachment_store.Upload）"""
     for item in attachments or []:
         if hasattr(item, 'save'):  # FileStorage
             filename = (item.filename or '').strip()
-            if not filename:
-                continue
-            ts = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-            safe_name = f"{ts}_{filename}"
-            abs_path = os.path.join(upload_dir, safe_name)
-            item.save(abs_path)
-            cursor.execute(
-                "INSERT INTO MoldAttachment (mold_id, file_name, file_path, upload_time) VALUES (?, ?, ?, ?)",
-                mold_id, filename, abs_path, datetime.now()
-            )
+            fileobj = item
         else:
             filename, fileobj = item
-            if not filename:
-                continue
-            ts = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-            safe_name = f"{ts}_{filename}"
-            abs_path = os.path.join(upload_dir, safe_name)
-            with open(abs_path, 'wb') as f:
-                if hasattr(fileobj, 'read'):
-                    shutil.copyfileobj(fileobj, f)
-                else:
-                    f.write(fileobj)
-            cursor.execute(
-                "INSERT INTO MoldAttachment (mold_id, file_name, file_path, upload_time) VALUES (?, ?, ?, ?)",
-                mold_id, filename, abs_path, datetime.now()
-            )
+        if not filename:
+            continue
+        _, _, abs_path = upload.put(fileobj)
+        cursor.execute(
+            "INSERT INTO MoldAttachment (mold_id, file_name, file_path, upload_time) VALUES (?, ?, ?, ?)",
+            mold_id, filename, abs_path, datetime.now()
+        )
 
 # ====================== 台账：新增（v2，含三新字段） ======================
 def add_mold_period_v2(*, product_name, casting_supplier_id, mold_supplier_id,
@@ -192,19 +206,20 @@ def add_mold_period_v2(*, product_name, casting_supplier_id, mold_supplier_id,
     if not casting_supplier_id or not mold_supplier_id:
         return {'success': False, 'msg': '请选择供应商'}
 
-    with get_dst_connection() as conn:
+    with attachment_store.Upload() as upload, get_dst_connection() as conn:
         cur = conn.cursor()
 
         # 列存在性检查
-        has_adv = _col_exists(cur, 'Mold', 'advance_amount')
-        has_bal = _col_exists(cur, 'Mold', 'balance_unpaid')
-        has_inv = _col_exists(cur, 'Mold', 'is_invoiced')
-        has_materials = _col_exists(cur, 'Mold', 'materials')
-        has_material_code = _col_exists(cur, 'Mold', 'material_code')
-        has_company = _col_exists(cur, 'Mold', 'company')
-        has_process_id = _col_exists(cur, 'Mold', 'process_id')
-        has_refund = _col_exists(cur, 'Mold', 'refund')
-        has_create_time = _col_exists(cur, 'Mold', 'create_time')
+        mold_cols = _mold_columns(cur)
+        has_adv = 'advance_amount' in mold_cols
+        has_bal = 'balance_unpaid' in mold_cols
+        has_inv = 'is_invoiced' in mold_cols
+        has_materials = 'materials' in mold_cols
+        has_material_code = 'material_code' in mold_cols
+        has_company = 'company' in mold_cols
+        has_process_id = 'process_id' in mold_cols
+        has_refund = 'refund' in mold_cols
+        has_create_time = 'create_time' in mold_cols
 
         cols = ['product_name', 'casting_supplier_id', 'mold_supplier_id', 'amount', 'start_date', 'end_date', 'remark']
         vals = [product_name, int(casting_supplier_id), int(mold_supplier_id), _safe_float(amount), start_date, end_date, (remark or '')]
@@ -230,12 +245,7 @@ def add_mold_period_v2(*, product_name, casting_supplier_id, mold_supplier_id,
 
         # 返还方式（refund 存名称，列宽仅 NVARCHAR(4)，安全截断）
         if has_refund and refund_method_id not in (None, '',):
-            try:
-                cur.execute("SELECT name FROM RefundMethod WHERE id=?", int(refund_method_id))
-                rr = cur.fetchone()
-                refund_name = rr[0] if rr else None
-            except Exception:
-                refund_name = None
+            refund_name = _refund_name(cur, refund_method_id)
             cols.append('refund'); vals.append((refund_name or '')[:4])
 
         # 三个新字段
@@ -243,19 +253,26 @@ def add_mold_period_v2(*, product_name, casting_supplier_id, mold_supplier_id,
         if has_bal: cols.append('balance_unpaid'); vals.append(_safe_float(balance_unpaid))
         if has_inv: cols.append('is_invoiced'); vals.append(_to_bit(is_invoiced))
 
-        # INSERT
+        # INSERT（汇总表/物料关联表须在写 Mold 前就绪，首次建表时的全量重建/回填不能包含本行）
+        mold_summary.ensure(cur, mold_cols)
+        mold_material.ensure(cur, mold_cols)
         placeholders = ', '.join(['?'] * len(cols))
         sql = f"INSERT INTO Mold ({', '.join(cols)}) VALUES ({placeholders})"
         cur.execute(sql, *vals)
 
         cur.execute("SELECT @@IDENTITY")
         mold_id = int(cur.fetchone()[0])
+        mold_summary.apply(cur, mold_cols, mold_id, +1)
+        if material_codes:
+            mold_material.set_codes(cur, mold_cols, mold_id, material_codes)
 
         # 附件
         if attachments:
-            save_attachments_to_db(cur, mold_id, attachments)
+            save_attachments_to_db(cur, mold_id, attachments, upload)
 
         conn.commit()
+    _invalidate_mold_cache()
+    _reindex_mold(mold_id)
     return {'success': True, 'mold_id': mold_id}
 
 # ====================== 台账：更新（v2） ======================
@@ -268,14 +285,15 @@ def update_mold_period_v2(*, mold_id, product_name=None, casting_supplier_id=Non
 
     with get_dst_connection() as conn:
         cur = conn.cursor()
-        has_adv = _col_exists(cur, 'Mold', 'advance_amount')
-        has_bal = _col_exists(cur, 'Mold', 'balance_unpaid')
-        has_inv = _col_exists(cur, 'Mold', 'is_invoiced')
-        has_materials = _col_exists(cur, 'Mold', 'materials')
-        has_material_code = _col_exists(cur, 'Mold', 'material_code')
-        has_company = _col_exists(cur, 'Mold', 'company')
-        has_process_id = _col_exists(cur, 'Mold', 'process_id')
-        has_refund = _col_exists(cur, 'Mold', 'refund')
+        mold_cols = _mold_columns(cur)
+        has_adv = 'advance_amount' in mold_cols
+        has_bal = 'balance_unpaid' in mold_cols
+        has_inv = 'is_invoiced' in mold_cols
+        has_materials = 'materials' in mold_cols
+        has_material_code = 'material_code' in mold_cols
+        has_company = 'company' in mold_cols
+        has_process_id = 'process_id' in mold_cols
+        has_refund = 'refund' in mold_cols
 
         if product_name is not None: sets.append('product_name=?'); params.append(product_name)
         if casting_supplier_id is not None: sets.append('casting_supplier_id=?'); params.append(int(casting_supplier_id))
@@ -292,12 +310,7 @@ def update_mold_period_v2(*, mold_id, product_name=None, casting_supplier_id=Non
 
         # refund：名称查出来后安全截断到 4
         if has_refund and refund_method_id is not None:
-            try:
-                cur.execute("SELECT name FROM RefundMethod WHERE id=?", int(refund_method_id))
-                rr = cur.fetchone()
-                refund_name = rr[0] if rr else None
-            except Exception:
-                refund_name = None
+            refund_name = _refund_name(cur, refund_method_id)
             sets.append('refund=?'); params.append((refund_name or '')[:4])
 
         # materials
@@ -322,23 +335,130 @@ def update_mold_period_v2(*, mold_id, product_name=None, casting_supplier_id=Non
 
         sql = f"UPDATE Mold SET {', '.join(sets)} WHERE id=?"
         params.append(int(mold_id))
+        # 费用汇总：先减旧值，更新后再加新值（同一事务）
+        mold_summary.apply(cur, mold_cols, mold_id, -1)
         cur.execute(sql, *params)
+        mold_summary.apply(cur, mold_cols, mold_id, +1)
+        if material_codes is not None:
+            mold_material.set_codes(cur, mold_cols, mold_id, material_codes)
         conn.commit()
+    _invalidate_mold_cache()
+    _reindex_mold(mold_id)
     return {'success': True}
 
 # ====================== 台账：列表（v2） ======================
-def list_mold_period_v2():
+# 列探测结果缓存（Mold 表结构极少变化，避免每次列表都查 8 次 sys.columns）
+MOLD_COLUMNS_TTL = 300
+_mold_columns_cache = {'at': 0.0, 'cols': None}
+
+# 总数缓存：过滤条件 -> (总数, 时间)；台账增删改时清空
+MOLD_COUNT_TTL = 60
+_mold_count_cache = {}
+
+# 排序选项：名称 -> (排序表达式, 方向)；可空列用哨兵值补齐，保证键集翻页比较稳定
+MOLD_SORTS = {
+    'id_desc': ('m.id', 'DESC'),
+    'id_asc': ('m.id', 'ASC'),
+    'start_date_desc': ("ISNULL(m.start_date, '19000101')", 'DESC'),
+    'start_date_asc': ("ISNULL(m.start_date, '19000101')", 'ASC'),
+    'end_date_desc': ("ISNULL(m.end_date, '19000101')", 'DESC'),
+    'end_date_asc': ("ISNULL(m.end_date, '19000101')", 'ASC'),
+    'amount_desc': ('ISNULL(m.amount, 0)', 'DESC'),
+    'amount_asc': ('ISNULL(m.amount, 0)', 'ASC'),
+    'product_name_asc': ("ISNULL(m.product_name, N'')", 'ASC'),
+    'product_name_desc': ("ISNULL(m.product_name, N'')", 'DESC'),
+}
+
+MOLD_PAGE_SIZE = 50
+MOLD_PAGE_SIZE_MAX = 500
+
+
+def _mold_columns(cur) -> set:
+    """Mold 表的列名集合（一次查询取全，进程内缓存 MOLD_COLUMNS_TTL 秒）"""
+    now = time.monotonic()
+    if _mold_columns_cache['cols'] is None or now - _mold_columns_cache['at'] > MOLD_COLUMNS_TTL:
+        cur.execute("SELECT name FROM sys.columns WHERE object_id = OBJECT_ID('Mold')")
+        _mold_columns_cache['cols'] = {r[0] for r in cur.fetchall()}
+        _mold_columns_cache['at'] = now
+    return _mold_columns_cache['cols']
+
+def _invalidate_mold_cache():
+    """台账新增/修改/删除后调用：清空总数缓存"""
+    _mold_count_cache.clear()
+
+def _encode_cursor(sort_key, mold_id):
+    kind = None
+    if isinstance(sort_key, datetime):
+        sort_key, kind = sort_key.isoformat(), 'datetime'  # 保留时分秒，同一天内的行才能正确翻页
+    elif isinstance(sort_key, date):
+        sort_key, kind = sort_key.isoformat(), 'date'
+    elif sort_key is not None and not isinstance(sort_key, (int, str)):
+        sort_key = str(sort_key)  # Decimal 等
+    raw = json.dumps([sort_key, mold_id, kind], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def _decode_cursor(cursor):
+    try:
+        sort_key, mold_id, *rest = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        kind = rest[0] if rest else None
+        if kind == 'datetime':
+            sort_key = datetime.fromisoformat(sort_key)
+        elif kind == 'date':
+            sort_key = date.fromisoformat(sort_key)
+        return sort_key, int(mold_id)
+    except Exception:
+        raise ValueError('无效的翻页游标')
+
+def _mold_filters(cols, *, keyword=None, product=None, supplier=None, supplier_id=None, company=None,
+                  date_from=None, date_to=None, is_invoiced=None,
+                  casting_supplier_id=None, mold_supplier_id=None, process=None):
+    """过滤条件 -> (WHERE 片段列表, 参数列表)，全部下推到 SQL"""
+    where, params = [], []
+    if keyword:
+        where.append("(m.product_name LIKE ? OR CAST(m.id AS NVARCHAR(20)) LIKE ?)")
+        params += [f"%{keyword}%", f"%{keyword}%"]
+    if product:
+        where.append("m.product_name LIKE ?"); params.append(f"%{product}%")
+    if supplier_id not in (None, ''):
+        where.append("(m.casting_supplier_id = ? OR m.mold_supplier_id = ?)")
+        params += [int(supplier_id), int(supplier_id)]
+    if supplier:
+        where.append("(s1.supplier_name LIKE ? OR s2.supplier_name LIKE ?)")
+        params += [f"%{supplier}%", f"%{supplier}%"]
+    if company and 'company' in cols:
+        where.append("m.company = ?"); params.append(company)
+    if date_from:
+        where.append("m.start_date >= ?"); params.append(date_from)
+    if date_to:
+        where.append("m.start_date <= ?"); params.append(date_to)
+    if is_invoiced not in (None, '') and 'is_invoiced' in cols:
+        where.append("ISNULL(m.is_invoiced, 0) = ?"); params.append(_to_bit(is_invoiced))
+    # 以下供报表下钻使用
+    if casting_supplier_id not in (None, ''):
+        where.append("m.casting_supplier_id = ?"); params.append(int(casting_supplier_id))
+    if mold_supplier_id not in (None, ''):
+        where.append("m.mold_supplier_id = ?"); params.append(int(mold_supplier_id))
+    if process not in (None, ''):
+        col = 'process' if 'process' in cols else ('process_id' if 'process_id' in cols else None)
+        if col:
+            where.append(f"CAST(m.{col} AS NVARCHAR(200)) = ?"); params.append(str(process))
+    return where, params
+
+def _select_mold_period(filters, sort='id_desc', after=None, limit=None):
+    """按过滤/排序/键集游标取台账行，返回 [(行dict, 排序键), ...]"""
+    sort_expr, direction = MOLD_SORTS.get(sort or 'id_desc', MOLD_SORTS['id_desc'])
     with get_dst_connection() as conn:
         cur = conn.cursor()
-        # 列探测
-        has_materials = _col_exists(cur, 'Mold', 'materials')
-        has_material_code = _col_exists(cur, 'Mold', 'material_code')
-        has_adv = _col_exists(cur, 'Mold', 'advance_amount')
-        has_bal = _col_exists(cur, 'Mold', 'balance_unpaid')
-        has_inv = _col_exists(cur, 'Mold', 'is_invoiced')
-        has_process = _col_exists(cur, 'Mold', 'process')
-        has_company = _col_exists(cur, 'Mold', 'company')
-        has_refund = _col_exists(cur, 'Mold', 'refund')
+        # 列探测（缓存）
+        mold_cols = _mold_columns(cur)
+        has_materials = 'materials' in mold_cols
+        has_material_code = 'material_code' in mold_cols
+        has_adv = 'advance_amount' in mold_cols
+        has_bal = 'balance_unpaid' in mold_cols
+        has_inv = 'is_invoiced' in mold_cols
+        has_process = 'process' in mold_cols
+        has_company = 'company' in mold_cols
+        has_refund = 'refund' in mold_cols
 
         cols = [
             'm.id','m.product_name',
@@ -358,15 +478,26 @@ def list_mold_period_v2():
         if has_process: cols.append('m.process')
         if has_company: cols.append('m.company')
         if has_refund: cols.append('m.refund')
+        cols.append(f'{sort_expr} as sort_key')
+
+        where, params = _mold_filters(mold_cols, **filters)
+        # 键集翻页：从上一页最后一行 (排序键, id) 之后继续，不用 OFFSET 扫描前面的行
+        if after:
+            last_key, last_id = _decode_cursor(after)
+            op = '<' if direction == 'DESC' else '>'
+            where.append(f"({sort_expr} {op} ? OR ({sort_expr} = ? AND m.id {op} ?))")
+            params += [last_key, last_key, last_id]
+        top = f"TOP ({int(limit)}) " if limit else ''
 
         sql = f"""
-            SELECT {', '.join(cols)}
+            SELECT {top}{', '.join(cols)}
             FROM Mold m
             LEFT JOIN Supplier s1 ON m.casting_supplier_id = s1.id
             LEFT JOIN Supplier s2 ON m.mold_supplier_id = s2.id
-            ORDER BY m.id DESC
+            {('WHERE ' + ' AND '.join(where)) if where else ''}
+            ORDER BY {sort_expr} {direction}, m.id {direction}
         """
-        cur.execute(sql)
+        cur.execute(sql, *params)
         rows = cur.fetchall()
 
     data = []
@@ -377,7 +508,10 @@ def list_mold_period_v2():
         d['product_name'] = r[idx]; idx += 1
 
         # materials / material_code 统一返回 'materials'（字符串）
-        mat_val = r[idx]; idx += 1
+        if has_materials or has_material_code:
+            mat_val = r[idx]; idx += 1
+        else:
+            mat_val = None
         d['materials'] = mat_val or ''
 
         d['casting_supplier'] = r[idx]; idx += 1
@@ -394,86 +528,227 @@ def list_mold_period_v2():
         if has_company: d['company'] = r[idx]; idx += 1
         if has_refund: d['refund'] = r[idx]; idx += 1
 
-        data.append(d)
+        data.append((d, r[idx]))
     return data
 
-# ====================== 台账：详情（v2） ======================
-def get_mold_period_v2(mold_id: int):
+def list_mold_period_v2(*, sort='id_desc', after=None, limit=None, **filters):
+    """
+    台账列表
+    - filters: keyword / product / supplier / supplier_id / company / date_from / date_to / is_invoiced
+    - sort: MOLD_SORTS 中的键，默认按 ID 倒序
+    - after + limit: 键集翻页（after 为上一页返回的 next_cursor）；不传 limit 返回全部（导出用）
+    """
+    return [d for d, _ in _select_mold_period(filters, sort, after, limit)]
+
+def count_mold_period_v2(**filters):
+    """满足过滤条件的台账总数（缓存 MOLD_COUNT_TTL 秒，增删改时失效）"""
+    key = tuple(sorted((k, str(v)) for k, v in filters.items() if v not in (None, '')))
+    hit = _mold_count_cache.get(key)
+    if hit and time.monotonic() - hit[1] <= MOLD_COUNT_TTL:
+        return hit[0]
     with get_dst_connection() as conn:
         cur = conn.cursor()
-        has_materials = _col_exists(cur, 'Mold', 'materials')
-        has_material_code = _col_exists(cur, 'Mold', 'material_code')
-        has_adv = _col_exists(cur, 'Mold', 'advance_amount')
-        has_bal = _col_exists(cur, 'Mold', 'balance_unpaid')
-        has_inv = _col_exists(cur, 'Mold', 'is_invoiced')
-        has_process_id = _col_exists(cur, 'Mold', 'process_id')
-        has_company = _col_exists(cur, 'Mold', 'company')
-        has_refund = _col_exists(cur, 'Mold', 'refund')
-
-        cols = [
-            'm.id','m.product_name',
-            'm.casting_supplier_id','m.mold_supplier_id',
-            'm.start_date','m.end_date','m.amount','m.remark'
-        ]
-        # 第 3 列放 materials（或 material_code）
-        if has_materials:
-            cols.insert(2, 'm.materials')
-        elif has_material_code:
-            cols.insert(2, 'm.material_code')
+        where, params = _mold_filters(_mold_columns(cur), **filters)
+        # 只有按供应商名称过滤时才需要连 Supplier
+        joins = """
+            LEFT JOIN Supplier s1 ON m.casting_supplier_id = s1.id
+            LEFT JOIN Supplier s2 ON m.mold_supplier_id = s2.id
+        """ if filters.get('supplier') else ''
+        cur.execute(f"""
+            SELECT COUNT(*) FROM Mold m {joins}
+            {('WHERE ' + ' AND '.join(where)) if where else ''}
+        """, *params)
+        total = int(cur.fetchone()[0])
+    _mold_count_cache[key] = (total, time.monotonic())
+    return total
+
+def page_mold_period_v2(*, sort='id_desc', after=None, limit=MOLD_PAGE_SIZE, with_total=True, **filters):
+    """
+    台账分页：{'data': [...], 'next_cursor': str|None, 'has_more': bool, 'total': int|None}
+    多取一行判断是否还有下一页
+    """
+    limit = max(1, min(int(limit or MOLD_PAGE_SIZE), MOLD_PAGE_SIZE_MAX))
+    rows = _select_mold_period(filters, sort, after, limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = _encode_cursor(rows[-1][1], rows[-1][0]['mold_id']) if has_more else None
+    return {
+        'data': [d for d, _ in rows],
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'total': count_mold_period_v2(**filters) if with_total else None,
+    }
+
+# ====================== 台账：导出（流式） ======================
+EXPORT_CHUNK_SIZE = 1000
+
+def _export_expr(field, mold_cols):
+    """导出字段 -> SELECT 表达式；表中不存在的列输出 NULL（与列表接口缺列时一致）"""
+    if field == 'mold_id':
+        return 'm.id'
+    if field == 'casting_supplier':
+        return 's1.supplier_name'
+    if field == 'mold_supplier':
+        return 's2.supplier_name'
+    if field == 'materials':
+        if 'materials' in mold_cols:
+            return 'm.materials'
+        return 'm.material_code' if 'material_code' in mold_cols else 'NULL'
+    return f'm.{field}' if field in mold_cols else 'NULL'
+
+def iter_mold_period_v2(fields, *, sort='id_desc', chunk_size=EXPORT_CHUNK_SIZE, **filters):
+    """
+    按导出字段只 SELECT 所需列，逐批 fetchmany 产出行元组列表（与 fields 顺序一致）
+    连接在生成器迭代期间保持打开，迭代结束或生成器被关闭时释放
+    """
+    sort_expr, direction = MOLD_SORTS.get(sort or 'id_desc', MOLD_SORTS['id_desc'])
+    with get_dst_connection() as conn:
+        cur = conn.cursor()
+        mold_cols = _mold_columns(cur)
+        exprs = [_export_expr(f, mold_cols) for f in fields]
+        where, params = _mold_filters(mold_cols, **filters)
+        # 只有用到供应商名称（导出列或过滤条件）时才连 Supplier
+        need_join = filters.get('supplier') or any(e.startswith(('s1.', 's2.')) for e in exprs)
+        joins = """
+            LEFT JOIN Supplier s1 ON m.casting_supplier_id = s1.id
+            LEFT JOIN Supplier s2 ON m.mold_supplier_id = s2.id
+        """ if need_join else ''
+        cur.execute(f"""
+            SELECT {', '.join(exprs)}
+            FROM Mold m {joins}
+            {('WHERE ' + ' AND '.join(where)) if where else ''}
+            ORDER BY {sort_expr} {direction}, m.id {direction}
+        """, *params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [tuple(r) for r in rows]
+
+# ====================== 费用汇总（报表） ======================
+def mold_cost_summary(dim='casting_supplier', key=None, period_from=None, period_to=None):
+    """
+    模具费用汇总（读 MoldCostSummary，不扫描 Mold）
+    - 不传 key：按维度分组的合计
+    - 传 key：该维度取值按月份展开（下钻）
+    """
+    if dim not in mold_summary.DIMENSIONS:
+        raise ValueError(f'不支持的汇总维度：{dim}')
+    with get_dst_connection() as conn:
+        cur = conn.cursor()
+        mold_summary.ensure(cur, _mold_columns(cur))
+        conn.commit()
+        if key is None:
+            return mold_summary.summarize(cur, dim, period_from, period_to)
+        return mold_summary.by_period(cur, dim, key, period_from, period_to)
 
-        if has_adv: cols.append('m.advance_amount')
-        if has_bal: cols.append('m.balance_unpaid')
-        if has_inv: cols.append('m.is_invoiced')
-        if has_process_id: cols.append('m.process_id')
-        if has_company: cols.append('m.company')
-        if has_refund: cols.append('m.refund')
+def rebuild_mold_cost_summary():
+    """按 Mold 全量重算费用汇总（校准用）"""
+    with get_dst_connection() as conn:
+        cur = conn.cursor()
+        cols = _mold_columns(cur)
+        mold_summary.ensure(cur, cols)
+        mold_summary.rebuild(cur, cols)
+        conn.commit()
+    return {'success': True}
 
-        sql = f"""
-            SELECT {', '.join(cols)},
-                   s1.supplier_name as casting_supplier, s2.supplier_name as mold_supplier
+# ====================== 台账：详情（v2） ======================
+def get_mold_period_v2(mold_id: int):
+    return get_mold_periods_v2([mold_id]).get(int(mold_id))
+
+# ====================== 批量查询（多个 ID 一次取回） ======================
+# 单次最多 1000 个：每类数据一条语句（SQL Server 单语句参数上限 2100）
+MAX_BATCH_IDS = 1000
+
+def get_mold_periods_v2(mold_ids):
+    """
+    多个台账详情（含附件）：{mold_id: dict}，字段与单条详情一致
+    主表一条语句、附件一条语句（IN 列表，按台账分组），不用 FOR JSON 以兼容 SQL Server 2012；
+    附件表不存在或查询失败时附件为空列表
+    """
+    ids = sorted({int(x) for x in mold_ids or []})[:MAX_BATCH_IDS]
+    if not ids:
+        return {}
+    with get_dst_connection() as conn:
+        cur = conn.cursor()
+        mold_cols = _mold_columns(cur)
+        fields = [('mold_id', 'm.id'), ('product_name', 'm.product_name'),
+                  ('materials', _export_expr('materials', mold_cols)),
+                  ('casting_supplier_id', 'm.casting_supplier_id'), ('mold_supplier_id', 'm.mold_supplier_id'),
+                  ('start_date', 'm.start_date'), ('end_date', 'm.end_date'),
+                  ('amount', 'm.amount'), ('remark', 'm.remark')]
+        fields += [(c, f'm.{c}') for c in ('advance_amount', 'balance_unpaid', 'is_invoiced',
+                                          'process_id', 'company', 'refund') if c in mold_cols]
+        fields += [('casting_supplier', 's1.supplier_name'), ('mold_supplier', 's2.supplier_name')]
+        cur.execute(f"""
+            SELECT {', '.join(expr for _, expr in fields)}
             FROM Mold m
             LEFT JOIN Supplier s1 ON m.casting_supplier_id = s1.id
             LEFT JOIN Supplier s2 ON m.mold_supplier_id = s2.id
-            WHERE m.id=?
-        """
-        cur.execute(sql, mold_id)
-        row = cur.fetchone()
+            WHERE m.id IN ({', '.join('?' * len(ids))})
+        """, *ids)
+        rows = cur.fetchall()
 
-        # 附件列表
-        try:
-            cur.execute("SELECT id, file_name FROM MoldAttachment WHERE mold_id=? ORDER BY id", mold_id)
-            atts = [{'id': a[0], 'file_name': a[1]} for a in cur.fetchall()]
-        except Exception:
-            atts = []
-    if not row:
-        return None
+        atts = {}
+        if rows:
+            try:
+                cur.execute(f"""
+                    SELECT mold_id, id, file_name FROM MoldAttachment
+                    WHERE mold_id IN ({', '.join('?' * len(ids))})
+                    ORDER BY mold_id, id
+                """, *ids)
+                for a in cur.fetchall():
+                    atts.setdefault(a[0], []).append({'id': a[1], 'file_name': a[2]})
+            except Exception:
+                atts = {}
+
+    result = {}
+    for row in rows:
+        d = dict(zip((k for k, _ in fields), row))
+        d['materials'] = d['materials'] or ''
+        d['attachments'] = atts.get(d['mold_id'], [])
+        result[d['mold_id']] = d
+    return result
+
+def get_inventory_by_codes(codes):
+    """多个物料编码 -> {cInvCode: {'cInvCode', 'cInvName'}}，一条语句"""
+    codes = sorted({str(c).strip() for c in codes or [] if str(c).strip()})[:MAX_BATCH_IDS]
+    if not codes:
+        return {}
+    with get_dst_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT cInvCode, cInvName FROM Inventory WHERE cInvCode IN ({', '.join('?' * len(codes))})",
+                    *codes)
+        return {r[0]: {'cInvCode': r[0], 'cInvName': r[1]} for r in cur.fetchall()}
+
+def get_suppliers_by_ids(supplier_ids):
+    """多个供应商 ID -> {id: {'id', 'supplier_name', 'contact', 'phone'}}，一条语句"""
+    ids = sorted({int(x) for x in supplier_ids or []})[:MAX_BATCH_IDS]
+    if not ids:
+        return {}
+    with get_dst_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT id, supplier_name, contact, phone FROM Supplier WHERE id IN ({', '.join('?' * len(ids))})",
+                    *ids)
+        return {r[0]: {'id': r[0], 'supplier_name': r[1], 'contact': r[2], 'phone': r[3]} for r in cur.fetchall()}
+
+# ====================== 联想搜索（内存索引） ======================
+mold_index = MoldSearchIndex(lambda: list_mold_period_v2(), lambda mold_id: get_mold_period_v2(mold_id))
 
-    idx = 0
-    d = {}
-    d['mold_id'] = row[idx]; idx += 1
-    d['product_name'] = row[idx]; idx += 1
-
-    mat_val = row[idx]; idx += 1
-    d['materials'] = mat_val or ''
-
-    d['casting_supplier_id'] = row[idx]; idx += 1
-    d['mold_supplier_id'] = row[idx]; idx += 1
-    d['start_date'] = row[idx]; idx += 1
-    d['end_date'] = row[idx]; idx += 1
-    d['amount'] = row[idx]; idx += 1
-    d['remark'] = row[idx]; idx += 1
-
-    if has_adv: d['advance_amount'] = row[idx]; idx += 1
-    if has_bal: d['balance_unpaid'] = row[idx]; idx += 1
-    if has_inv: d['is_invoiced'] = row[idx]; idx += 1
-    if has_process_id: d['process_id'] = row[idx]; idx += 1
-    if has_company: d['company'] = row[idx]; idx += 1
-    if has_refund: d['refund'] = row[idx]; idx += 1
-
-    d['casting_supplier'] = row[idx]; idx += 1
-    d['mold_supplier'] = row[idx]; idx += 1
-    d['attachments'] = atts
-    return d
+def search_molds(keyword, limit=20):
+    """模具联想：按 ID / 产品名称 / 物料编码 / 供应商（含拼音首字母）排序返回前 limit 条"""
+    return mold_index.search(keyword, limit)
+
+def _reindex_mold(mold_id, removed=False):
+    """台账变更后增量更新索引；失败时置为待重建，不影响业务写入"""
+    try:
+        if removed:
+            mold_index.remove(mold_id)
+        else:
+            mold_index.refresh(mold_id)
+    except Exception as ex:
+        print(f"[WARN] 模具索引更新失败，下次查询时重建: {ex}")
+        mold_index.invalidate()
 
 # ====================== 旧接口的兼容包装 ======================
 def add_mold_period(product_name, material_code, casting_supplier_id, mold_supplier_id,
@@ -505,23 +780,23 @@ def get_mold_period(mold_id):
 def delete_mold_period(mold_id: int):
     with get_dst_connection() as conn:
         cur = conn.cursor()
-        # 先删附件记录与文件
+        # 先删附件记录（内容文件在提交后按引用计数释放）
+        paths = []
         try:
-            cur.execute("SELECT id, file_path FROM MoldAttachment WHERE mold_id=?", mold_id)
-            rows = cur.fetchall()
-            for a_id, p in rows:
-                if p and os.path.isfile(p):
-                    try:
-                        os.remove(p)
-                    except Exception:
-                        pass
+            cur.execute("SELECT file_path FROM MoldAttachment WHERE mold_id=?", mold_id)
+            paths = [r[0] for r in cur.fetchall()]
             cur.execute("DELETE FROM MoldAttachment WHERE mold_id=?", mold_id)
         except Exception:
             pass
         # 再删主表
+        mold_summary.apply(cur, _mold_columns(cur), mold_id, -1)
+        mold_material.remove(cur, _mold_columns(cur), mold_id)
         cur.execute("DELETE FROM Mold WHERE id=?", mold_id)
         conn.commit()
-    # 删除目录（若空）
+    _invalidate_mold_cache()
+    _reindex_mold(mold_id, removed=True)
+    attachment_store.release(paths)
+    # 删除历史附件目录（若空）
     mold_dir = os.path.join(UPLOAD_ROOT, str(mold_id))
     if os.path.isdir(mold_dir):
         try:
@@ -530,6 +805,32 @@ def delete_mold_period(mold_id: int):
             pass
     return {'success': True}
 
+# ====================== 模具-物料对照 ======================
+def molds_for_material(cinvcode):
+    """物料编码 -> 使用该物料的模具列表"""
+    with get_dst_connection() as conn:
+        cur = conn.cursor()
+        data = mold_material.molds_for_item(cur, _mold_columns(cur), cinvcode)
+        conn.commit()  # 首次调用可能建表回填
+    return data
+
+def materials_for_molds(mold_ids):
+    """模具 -> 物料编码及名称 {mold_id: [...]}"""
+    with get_dst_connection() as conn:
+        cur = conn.cursor()
+        data = mold_material.items_for_molds(cur, _mold_columns(cur), mold_ids)
+        conn.commit()
+    return data
+
+def rebuild_mold_materials():
+    with get_dst_connection() as conn:
+        cur = conn.cursor()
+        cols = _mold_columns(cur)
+        mold_material.ensure(cur, cols)
+        mold_material.rebuild(cur, cols)
+        conn.commit()
+    return {'success': True}
+
 # ====================== 调拨记录（简化） ======================
 def list_transfer_records(mold_id: int):
     with get_dst_connection() as conn:
@@ -552,3 +853,55 @@ def list_transfer_records(mold_id: int):
             return data
         except Exception:
             return []
+
+def _supplier_id_by_name(cur, name):
+    cur.execute("SELECT TOP (1) id FROM Supplier WHERE supplier_name=? ORDER BY id", name)
+    r = cur.fetchone()
+    return r[0] if r else None
+
+def add_transfer_record(*, mold_id, to_supplier_id=None, from_supplier_id=None,
+                        to_supplier=None, from_supplier=None,
+                        transfer_date=None, quantity=None, note=None):
+    """
+    登记调拨（供应商可传 ID 或名称），并在同一事务内更新模具当前位置（MoldCurrentLocation）
+    未指定调出供应商时取模具当前所在供应商
+    """
+    with get_dst_connection() as conn:
+        cur = conn.cursor()
+        mold_location.ensure(cur)
+        if to_supplier_id in (None, '') and to_supplier:
+            to_supplier_id = _supplier_id_by_name(cur, to_supplier)
+        if from_supplier_id in (None, '') and from_supplier:
+            from_supplier_id = _supplier_id_by_name(cur, from_supplier)
+        if to_supplier_id in (None, ''):
+            return {'success': False, 'msg': '请选择调入供应商'}
+        if from_supplier_id in (None, ''):
+            current = mold_location.latest_for(cur, [mold_id]).get(int(mold_id))
+            from_supplier_id = current['latest_to_supplier_id'] if current else None
+
+        cur.execute("""
+            INSERT INTO MoldTransferRecord (mold_id, from_supplier_id, to_supplier_id, transfer_date, quantity, note)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, int(mold_id), from_supplier_id, int(to_supplier_id),
+            transfer_date or datetime.now().date(), quantity, note or '')
+        cur.execute("SELECT @@IDENTITY")
+        transfer_id = int(cur.fetchone()[0])
+        mold_location.on_transfer(cur, transfer_id)
+        conn.commit()
+    return {'success': True, 'id': transfer_id}
+
+def get_current_locations(mold_ids):
+    """多个模具的当前位置（一次查询），{mold_id: {...}}"""
+    with get_dst_connection() as conn:
+        cur = conn.cursor()
+        data = mold_location.latest_for(cur, mold_ids)
+        conn.commit()  # 首次调用可能建表回填
+    return data
+
+def rebuild_current_locations():
+    with get_dst_connection() as conn:
+        cur = conn.cursor()
+        mold_location.ensure(cur)
+        mold_location.rebuild(cur)
+        conn.commit()
+    return {'success': True}
@@ -0,0 +1,214 @@
+# modules/mold_import.py
+"""
+模具台账批量导入（Excel / CSV）
+- 表头可用字段名或导出文件的中文表头（与 /api/mold/period/export 一致，导出文件可直接改后导入）
+- 供应商、返还方式、模具工艺按名称集合一次性查出映射，不再逐行查库
+- 校验按列向量化进行（pandas），每行的所有错误一并返回
+- 校验通过的行在同一事务内按批 executemany 写入，费用汇总按本批新行一次性聚合计入
+用法：
+    df = read_sheet(file_storage)
+    result = import_molds(df, dry_run=False)
+"""
+
+import os
+
+import pandas as pd
+
+from db.session import get_dst_connection
+
+MAX_IMPORT_ROWS = 20000
+INSERT_BATCH_SIZE = 1000
+
+# 字段名 -> 中文表头
+IMPORT_HEADERS = {
+    'product_name': '产品名称', 'casting_supplier': '铸造供应商', 'mold_supplier': '模具供应商',
+    'materials': '物料编码(汇总)', 'start_date': '开模时间', 'end_date': '交付时间', 'amount': '金额',
+    'refund': '返还方式', 'process': '模具工艺', 'company': '所属公司', 'remark': '备注',
+    'advance_amount': '预付款', 'balance_unpaid': '余款未付', 'is_invoiced': '是否开票',
+}
+_HEADER_ALIASES = dict({v: k for k, v in IMPORT_HEADERS.items()}, **{'物料编码': 'materials'})
+
+_TRUE_VALUES = {'1', '是', 'y', 'yes', 'true', '已开票'}
+_FALSE_VALUES = {'', '0', '否', 'n', 'no', 'false', '未开票'}
+
+
+# ====================== 读取 ======================
+def read_sheet(file_storage):
+    """读取上传文件为全字符串 DataFrame（表头已归一为字段名，未知列丢弃）"""
+    ext = os.path.splitext(file_storage.filename or '')[1].lower()
+    if ext in ('.xlsx', '.xlsm', '.xls'):
+        df = pd.read_excel(file_storage.stream, dtype=str, keep_default_na=False)
+    elif ext == '.csv':
+        df = pd.read_csv(file_storage.stream, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+    else:
+        raise ValueError('仅支持 .xlsx / .xls / .csv 文件')
+    df = df.rename(columns=lambda c: _HEADER_ALIASES.get(str(c).strip(), str(c).strip()))
+    df = df[[c for c in df.columns if c in IMPORT_HEADERS]]
+    for c in IMPORT_HEADERS:
+        if c not in df.columns:
+            df[c] = ''
+    df = df.apply(lambda col: col.astype(str).str.strip())
+    # 整行为空的（Excel 末尾空行）直接去掉，行号仍按原表计算
+    return df[(df != '').any(axis=1)]
+
+
+# ====================== 集合查询 ======================
+def _name_map(cur, sql, names):
+    """按名称集合查 {名称: id}，IN 列表每批 1000 个（SQL Server 单语句参数上限 2100）"""
+    names = sorted(n for n in set(names) if n)
+    result = {}
+    for i in range(0, len(names), 1000):
+        part = names[i:i + 1000]
+        cur.execute(sql.format(', '.join('?' * len(part))), *part)
+        for r in cur.fetchall():
+            result.setdefault(r[1], r[0])
+    return result
+
+def _refund_names(cur):
+    try:
+        cur.execute("SELECT id, name FROM RefundMethod")
+        return {r[1]: r[0] for r in cur.fetchall()}
+    except Exception:
+        return {}
+
+def _process_ids(cur):
+    for tbl in ('MoldProcess', 'ProcessMethod'):
+        try:
+            cur.execute(f"SELECT id, name FROM {tbl}")
+            return {r[1]: r[0] for r in cur.fetchall()}
+        except Exception:
+            continue
+    return {}
+
+
+# ====================== 校验 ======================
+def _validate(df, suppliers, refunds, processes):
+    """
+    向量化校验：返回 (解析后的列 dict, 每行错误列表 Series)
+    """
+    errors = pd.Series([[] for _ in range(len(df))], index=df.index, dtype=object)
+
+    def flag(mask, msg):
+        for i in df.index[mask]:
+            errors.at[i].append(msg)
+
+    flag(df['product_name'] == '', '产品名称必填')
+
+    parsed = {}
+    for col, label in (('casting_supplier', '铸造供应商'), ('mold_supplier', '模具供应商')):
+        parsed[col] = df[col].map(suppliers)
+        flag(df[col] == '', f'{label}必填')
+        flag((df[col] != '') & parsed[col].isna(), f'{label}不存在')
+
+    for col, label in (('amount', '金额'), ('advance_amount', '预付款'), ('balance_unpaid', '余款未付')):
+        parsed[col] = pd.to_numeric(df[col].str.replace(',', '', regex=False), errors='coerce')
+        flag((df[col] != '') & parsed[col].isna(), f'{label}不是数字')
+
+    for col, label in (('start_date', '开模时间'), ('end_date', '交付时间')):
+        parsed[col] = pd.to_datetime(df[col], errors='coerce')
+        flag((df[col] != '') & parsed[col].isna(), f'{label}日期格式错误')
+    flag(parsed['start_date'].notna() & parsed['end_date'].notna()
+         & (parsed['end_date'] < parsed['start_date']), '交付时间早于开模时间')
+
+    flag((df['refund'] != '') & ~df['refund'].isin(list(refunds)), '返还方式不存在')
+    parsed['process'] = df['process'].map(processes)
+    flag((df['process'] != '') & parsed['process'].isna(), '模具工艺不存在')
+
+    inv = df['is_invoiced'].str.lower()
+    parsed['is_invoiced'] = inv.isin(_TRUE_VALUES)
+    flag(~inv.isin(_TRUE_VALUES | _FALSE_VALUES), '是否开票只能填 是/否')
+
+    return parsed, errors
+
+
+# ====================== 导入 ======================
+def _none(v):
+    return None if pd.isna(v) else v
+
+def import_molds(df, *, dry_run=False):
+    """
+    校验并导入；校验失败的行跳过，其余行一次事务写入
+    返回 {'success', 'total', 'inserted', 'failed', 'errors': [{'row', 'product_name', 'errors'}]}
+    行号 row 为表格中的行号（表头为第 1 行）
+    """
+    # 延迟导入，避免与 modules.mold 互相引用
+    from modules import mold, mold_summary, mold_material
+
+    if len(df) > MAX_IMPORT_ROWS:
+        return {'success': False, 'msg': f'单次最多导入 {MAX_IMPORT_ROWS} 行'}
+    if df.empty:
+        return {'success': False, 'msg': '文件中没有数据行'}
+
+    with get_dst_connection() as conn:
+        cur = conn.cursor()
+        cols = mold._mold_columns(cur)
+        suppliers = _name_map(
+            cur, "SELECT id, supplier_name FROM Supplier WHERE supplier_name IN ({})",
+            pd.concat([df['casting_supplier'], df['mold_supplier']]))
+        refunds = _refund_names(cur)
+        processes = _process_ids(cur)
+
+        parsed, errors = _validate(df, suppliers, refunds, processes)
+        ok = errors.map(len) == 0
+        report = [
+            {'row': int(i) + 2, 'product_name': df.at[i, 'product_name'], 'errors': errors.at[i]}
+            for i in df.index[~ok]
+        ]
+        result = {'success': True, 'total': len(df), 'inserted': 0, 'failed': len(report), 'errors': report}
+        if dry_run or not ok.any():
+            return dict(result, dry_run=bool(dry_run), valid=int(ok.sum()))
+
+        # 列集合按表结构决定（与单条新增 add_mold_period_v2 一致）
+        fields = [('product_name', df['product_name']),
+                  ('casting_supplier_id', parsed['casting_supplier']),
+                  ('mold_supplier_id', parsed['mold_supplier']),
+                  ('amount', parsed['amount']),
+                  ('start_date', parsed['start_date']),
+                  ('end_date', parsed['end_date']),
+                  ('remark', df['remark'])]
+        if 'materials' in cols:
+            fields.append(('materials', df['materials'].str.replace(r'[\s，;；]+', ',', regex=True).str.strip(',')))
+        elif 'material_code' in cols:
+            fields.append(('material_code', df['materials'].str.split(r'[\s,，;；]+', regex=True).str[0]))
+        if 'company' in cols:
+            fields.append(('company', df['company'].where(df['company'] != '')))
+        if 'process_id' in cols:
+            fields.append(('process_id', parsed['process']))
+        if 'refund' in cols:
+            fields.append(('refund', df['refund'].str[:4]))  # 列宽 NVARCHAR(4)
+        if 'advance_amount' in cols:
+            fields.append(('advance_amount', parsed['advance_amount']))
+        if 'balance_unpaid' in cols:
+            fields.append(('balance_unpaid', parsed['balance_unpaid']))
+        if 'is_invoiced' in cols:
+            fields.append(('is_invoiced', parsed['is_invoiced'].astype(int)))
+        if 'create_time' in cols:
+            fields.append(('create_time', pd.Series(pd.Timestamp.now(), index=df.index)))
+
+        frame = pd.DataFrame({name: series for name, series in fields})[ok]
+        for c in ('casting_supplier_id', 'mold_supplier_id', 'process_id'):
+            if c in frame:
+                frame[c] = frame[c].astype('Int64')
+        for c in ('start_date', 'end_date'):
+            frame[c] = frame[c].dt.date
+        rows = [tuple(_none(v) for v in r) for r in frame.astype(object).itertuples(index=False, name=None)]
+
+        # 汇总表/物料关联表须在写 Mold 前就绪；锁住当前最大 ID 之后的区间，本事务新行即 id > after_id
+        mold_summary.ensure(cur, cols)
+        mold_material.ensure(cur, cols)
+        cur.execute("SELECT ISNULL(MAX(id), 0) FROM Mold WITH (UPDLOCK, HOLDLOCK)")
+        after_id = int(cur.fetchone()[0])
+
+        sql = f"INSERT INTO Mold ({', '.join(frame.columns)}) VALUES ({', '.join('?' * len(frame.columns))})"
+        cur.fast_executemany = True
+        for i in range(0, len(rows), INSERT_BATCH_SIZE):
+            cur.executemany(sql, rows[i:i + INSERT_BATCH_SIZE])
+        cur.fast_executemany = False
+        mold_summary.apply_new(cur, cols, after_id)
+        mold_material.backfill(cur, cols, after_id)
+        conn.commit()
+
+    mold._invalidate_mold_cache()
+    mold.mold_index.invalidate()
+    result['inserted'] = len(rows)
+    return result
@@ -0,0 +1,104 @@
+# modules/mold_location.py
+"""
+模具当前位置（物化表 MoldCurrentLocation，每个模具一行）
+- 记录每个模具最近一次调拨：调入供应商即当前所在供应商
+- 每次登记调拨（modules/mold.py add_transfer_record）在同一事务内更新；补录更早日期的调拨不会覆盖
+- 表不存在时自动建表并从 MoldTransferRecord 回填；rebuild() 可随时全量重算
+- latest_for() 一次查询返回多个模具的当前位置，调拨页面不再逐个请求
+"""
+
+LOCATION_TABLE = 'MoldCurrentLocation'
+
+_table_ready = False
+
+
+def ensure(cur):
+    """当前位置表不存在则建表并回填（须在本事务写调拨记录之前调用）"""
+    global _table_ready
+    if _table_ready:
+        return
+    cur.execute("SELECT OBJECT_ID(?)", LOCATION_TABLE)
+    if cur.fetchone()[0] is None:
+        cur.execute(f"""
+            CREATE TABLE {LOCATION_TABLE} (
+                mold_id INT NOT NULL PRIMARY KEY,
+                transfer_id INT NOT NULL,
+                supplier_id INT NULL,
+                from_supplier_id INT NULL,
+                transfer_date DATE NULL,
+                quantity INT NULL,
+                note NVARCHAR(255) NULL,
+                updated_at DATETIME NOT NULL DEFAULT GETDATE()
+            )
+        """)
+        rebuild(cur)
+        return  # 本事务可能回滚，下次调用再确认表已存在后才缓存
+    _table_ready = True
+
+def rebuild(cur):
+    """按调拨记录全量重算（每个模具取调拨日期最新、同日取 ID 最大的一条；调用方负责提交）"""
+    cur.execute(f"DELETE FROM {LOCATION_TABLE}")
+    cur.execute(f"""
+        INSERT INTO {LOCATION_TABLE}
+            (mold_id, transfer_id, supplier_id, from_supplier_id, transfer_date, quantity, note)
+        SELECT mold_id, id, to_supplier_id, from_supplier_id, transfer_date, quantity, note
+        FROM (
+            SELECT t.*, ROW_NUMBER() OVER (
+                PARTITION BY t.mold_id ORDER BY ISNULL(t.transfer_date, '19000101') DESC, t.id DESC) AS rn
+            FROM MoldTransferRecord t
+        ) x
+        WHERE x.rn = 1
+    """)
+
+def on_transfer(cur, transfer_id):
+    """登记调拨后调用：该调拨不早于当前记录时，更新模具当前位置"""
+    ensure(cur)
+    cur.execute(f"""
+        MERGE {LOCATION_TABLE} WITH (HOLDLOCK) AS loc
+        USING (
+            SELECT mold_id, id, to_supplier_id, from_supplier_id, transfer_date, quantity, note
+            FROM MoldTransferRecord WHERE id = ?
+        ) AS t
+        ON loc.mold_id = t.mold_id
+        WHEN MATCHED AND (
+            ISNULL(t.transfer_date, '19000101') > ISNULL(loc.transfer_date, '19000101')
+            OR (ISNULL(t.transfer_date, '19000101') = ISNULL(loc.transfer_date, '19000101') AND t.id > loc.transfer_id)
+        ) THEN UPDATE SET
+            transfer_id = t.id, supplier_id = t.to_supplier_id, from_supplier_id = t.from_supplier_id,
+            transfer_date = t.transfer_date, quantity = t.quantity, note = t.note, updated_at = GETDATE()
+        WHEN NOT MATCHED THEN INSERT
+            (mold_id, transfer_id, supplier_id, from_supplier_id, transfer_date, quantity, note)
+            VALUES (t.mold_id, t.id, t.to_supplier_id, t.from_supplier_id, t.transfer_date, t.quantity, t.note);
+    """, int(transfer_id))
+
+def latest_for(cur, mold_ids):
+    """
+    多个模具的当前位置 {mold_id: {...}}；无调拨记录的模具不在结果中
+    SQL Server 单语句参数上限 2100，按 1000 个一批查询
+    """
+    ensure(cur)
+    ids = sorted({int(x) for x in mold_ids or []})
+    result = {}
+    for i in range(0, len(ids), 1000):
+        part = ids[i:i + 1000]
+        cur.execute(f"""
+            SELECT loc.mold_id, loc.transfer_id, loc.supplier_id, s_to.supplier_name,
+                   loc.from_supplier_id, s_from.supplier_name, loc.transfer_date, loc.quantity, loc.note
+            FROM {LOCATION_TABLE} loc
+            LEFT JOIN Supplier s_to ON s_to.id = loc.supplier_id
+            LEFT JOIN Supplier s_from ON s_from.id = loc.from_supplier_id
+            WHERE loc.mold_id IN ({', '.join('?' * len(part))})
+        """, *part)
+        for r in cur.fetchall():
+            result[r[0]] = {
+                'mold_id': r[0],
+                'transfer_id': r[1],
+                'latest_to_supplier_id': r[2],
+                'latest_to_supplier': r[3],
+                'from_supplier_id': r[4],
+                'from_supplier': r[5],
+                'transfer_date': r[6],
+                'quantity': r[7],
+                'note': r[8],
+            }
+    return result
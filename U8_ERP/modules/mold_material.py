@@ -0,0 +1,143 @@
+# modules/mold_material.py
+"""
+模具-物料对照（规范化关联表 MoldMaterial，每个模具每个物料编码一行）
+- Mold.materials 仍保存逗号分隔的编码（兼容旧页面/导出），MoldMaterial 与之同步维护：
+  新增/修改台账（modules/mold.py）、批量导入、删除台账时在同一事务内更新
+- 主键 (mold_id, cinvcode) 支持"模具 -> 物料"，索引 (cinvcode, mold_id) 支持"物料 -> 模具"，
+  两个方向都是索引查找，不再对 Mold.materials 做 LIKE 全表扫描
+- cinvcode 与 Inventory.cInvCode、MJWLDZhao.cinvcode 同口径，可直接关联
+- 表不存在时自动建表，并用 STRING_SPLIT 从现有 materials 一次性回填
+"""
+
+import re
+
+MATERIAL_TABLE = 'MoldMaterial'
+CODE_MAX_LEN = 60
+
+_SPLIT_RE = re.compile(r'[\s,，;；]+')
+
+_table_ready = False
+
+
+def split_codes(value):
+    """'A001, A002；A003' -> ['A001', 'A002', 'A003']（去重、保序、按列宽截断）"""
+    if isinstance(value, (list, tuple)):
+        parts = [str(x) for x in value]
+    else:
+        parts = _SPLIT_RE.split(str(value or ''))
+    seen, codes = set(), []
+    for p in parts:
+        p = p.strip()[:CODE_MAX_LEN]
+        if p and p not in seen:
+            seen.add(p)
+            codes.append(p)
+    return codes
+
+def _source_expr(cols):
+    """Mold 上保存编码的列；都不存在时返回 None"""
+    if 'materials' in cols:
+        return 'm.materials'
+    return 'm.material_code' if 'material_code' in cols else None
+
+
+# ====================== 表结构 / 回填 ======================
+def ensure(cur, cols):
+    """关联表不存在则建表并回填（须在本事务写 Mold 之前调用）"""
+    global _table_ready
+    if _table_ready:
+        return
+    cur.execute("SELECT OBJECT_ID(?)", MATERIAL_TABLE)
+    if cur.fetchone()[0] is None:
+        cur.execute(f"""
+            CREATE TABLE {MATERIAL_TABLE} (
+                mold_id INT NOT NULL,
+                cinvcode NVARCHAR({CODE_MAX_LEN}) NOT NULL,
+                CONSTRAINT PK_{MATERIAL_TABLE} PRIMARY KEY (mold_id, cinvcode)
+            )
+        """)
+        cur.execute(f"CREATE INDEX IX_{MATERIAL_TABLE}_cinvcode ON {MATERIAL_TABLE} (cinvcode, mold_id)")
+        backfill(cur, cols)
+        return  # 本事务可能回滚，下次调用再确认表已存在后才缓存
+    _table_ready = True
+
+def backfill(cur, cols, after_id=0):
+    """
+    把 id > after_id 的台账的 materials 拆分写入关联表（调用方负责提交）
+    建表时 after_id=0 全量回填；批量导入后传入导入前的最大 ID
+    优先用 STRING_SPLIT 在服务端一条语句完成；数据库兼容级别低于 130 时改为本地拆分后批量写入
+    """
+    src = _source_expr(cols)
+    if src is None:
+        return
+    normalized = f"REPLACE(REPLACE(REPLACE(REPLACE({src}, N'，', N','), N';', N','), N'；', N','), N' ', N',')"
+    try:
+        cur.execute(f"""
+            INSERT INTO {MATERIAL_TABLE} (mold_id, cinvcode)
+            SELECT DISTINCT m.id, LEFT(LTRIM(RTRIM(s.value)), {CODE_MAX_LEN})
+            FROM Mold m
+            CROSS APPLY STRING_SPLIT({normalized}, N',') s
+            WHERE m.id > ? AND {src} IS NOT NULL AND LTRIM(RTRIM(s.value)) <> N''
+        """, int(after_id))
+        return
+    except Exception:
+        pass
+    cur.execute(f"SELECT m.id, {src} FROM Mold m WHERE m.id > ? AND {src} IS NOT NULL", int(after_id))
+    rows = [(r[0], code) for r in cur.fetchall() for code in split_codes(r[1])]
+    sql = f"INSERT INTO {MATERIAL_TABLE} (mold_id, cinvcode) VALUES (?, ?)"
+    for i in range(0, len(rows), 1000):
+        cur.executemany(sql, rows[i:i + 1000])
+
+def rebuild(cur, cols):
+    cur.execute(f"DELETE FROM {MATERIAL_TABLE}")
+    backfill(cur, cols)
+
+
+# ====================== 维护 ======================
+def set_codes(cur, cols, mold_id, codes):
+    """整体替换某模具的物料编码（新增/修改台账时调用，与写 Mold 同一事务）"""
+    ensure(cur, cols)
+    cur.execute(f"DELETE FROM {MATERIAL_TABLE} WHERE mold_id = ?", int(mold_id))
+    codes = split_codes(codes)
+    if codes:
+        cur.executemany(f"INSERT INTO {MATERIAL_TABLE} (mold_id, cinvcode) VALUES (?, ?)",
+                        [(int(mold_id), c) for c in codes])
+
+def remove(cur, cols, mold_id):
+    """删除台账前调用"""
+    ensure(cur, cols)
+    cur.execute(f"DELETE FROM {MATERIAL_TABLE} WHERE mold_id = ?", int(mold_id))
+
+
+# ====================== 查询 ======================
+def molds_for_item(cur, cols, cinvcode):
+    """物料 -> 使用该物料的模具（按索引 (cinvcode, mold_id) 查找）"""
+    ensure(cur, cols)
+    cur.execute(f"""
+        SELECT m.id, m.product_name, s1.supplier_name, s2.supplier_name, m.start_date, m.amount
+        FROM {MATERIAL_TABLE} mm
+        JOIN Mold m ON m.id = mm.mold_id
+        LEFT JOIN Supplier s1 ON s1.id = m.casting_supplier_id
+        LEFT JOIN Supplier s2 ON s2.id = m.mold_supplier_id
+        WHERE mm.cinvcode = ?
+        ORDER BY m.id DESC
+    """, str(cinvcode).strip())
+    keys = ('mold_id', 'product_name', 'casting_supplier', 'mold_supplier', 'start_date', 'amount')
+    return [dict(zip(keys, r)) for r in cur.fetchall()]
+
+def items_for_molds(cur, cols, mold_ids):
+    """模具 -> 物料编码及存货名称 {mold_id: [{'cinvcode', 'cinvname'}]}，IN 列表每批 1000 个"""
+    ensure(cur, cols)
+    ids = sorted({int(x) for x in mold_ids or []})
+    result = {i: [] for i in ids}
+    for i in range(0, len(ids), 1000):
+        part = ids[i:i + 1000]
+        cur.execute(f"""
+            SELECT mm.mold_id, mm.cinvcode, inv.cInvName
+            FROM {MATERIAL_TABLE} mm
+            LEFT JOIN Inventory inv ON inv.cInvCode = mm.cinvcode
+            WHERE mm.mold_id IN ({', '.join('?' * len(part))})
+            ORDER BY mm.mold_id, mm.cinvcode
+        """, *part)
+        for r in cur.fetchall():
+            result[r[0]].append({'cinvcode': r[1], 'cinvname': r[2]})
+    return result
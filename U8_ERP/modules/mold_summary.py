@@ -0,0 +1,199 @@
+# modules/mold_summary.py
+"""
+模具费用汇总（增量维护的汇总表 MoldCostSummary）
+- 维度 dim：all（合计）/ casting_supplier / mold_supplier / company / process，
+  dim_key 为供应商ID、公司、工艺等（转为字符串），period 为开模月份 'YYYY-MM'（无开模时间为空串）
+- 度量：模具数、金额、预付款、余款未付、已开票数、已开票金额
+- 台账新增/修改/删除时，在同一事务内先减去旧行贡献、再加上新行贡献（见 modules/mold.py），
+  报表只读汇总表，不再扫描 Mold
+- 表不存在时自动建表并全量重建；rebuild() 也可随时手工重建校准
+"""
+
+from decimal import Decimal
+
+SUMMARY_TABLE = 'MoldCostSummary'
+DIMENSIONS = ('all', 'casting_supplier', 'mold_supplier', 'company', 'process')
+MEASURES = ('mold_count', 'amount', 'advance_amount', 'balance_unpaid', 'invoiced_count', 'invoiced_amount')
+
+_table_ready = False
+
+
+# ====================== 表结构 ======================
+def _dim_exprs(cols):
+    """各维度在 Mold 上的取值表达式（列不存在时归入空键）"""
+    return {
+        'all': "N''",
+        'casting_supplier': 'm.casting_supplier_id',
+        'mold_supplier': 'm.mold_supplier_id',
+        'company': 'm.company' if 'company' in cols else "N''",
+        'process': 'm.process' if 'process' in cols else ('m.process_id' if 'process_id' in cols else "N''"),
+    }
+
+def _measure_exprs(cols):
+    amount = 'ISNULL(m.amount, 0)'
+    invoiced = 'ISNULL(CAST(m.is_invoiced AS INT), 0)' if 'is_invoiced' in cols else '0'
+    return {
+        'amount': amount,
+        'advance_amount': 'ISNULL(m.advance_amount, 0)' if 'advance_amount' in cols else '0',
+        'balance_unpaid': 'ISNULL(m.balance_unpaid, 0)' if 'balance_unpaid' in cols else '0',
+        'invoiced': invoiced,
+    }
+
+def ensure(cur, cols):
+    """汇总表不存在则建表并全量重建（须在本事务写 Mold 之前调用）"""
+    global _table_ready
+    if _table_ready:
+        return
+    cur.execute("SELECT OBJECT_ID(?)", SUMMARY_TABLE)
+    if cur.fetchone()[0] is None:
+        cur.execute(f"""
+            CREATE TABLE {SUMMARY_TABLE} (
+                dim NVARCHAR(20) NOT NULL,
+                dim_key NVARCHAR(200) NOT NULL,
+                period NVARCHAR(7) NOT NULL,
+                mold_count INT NOT NULL DEFAULT 0,
+                amount DECIMAL(18,2) NOT NULL DEFAULT 0,
+                advance_amount DECIMAL(18,2) NOT NULL DEFAULT 0,
+                balance_unpaid DECIMAL(18,2) NOT NULL DEFAULT 0,
+                invoiced_count INT NOT NULL DEFAULT 0,
+                invoiced_amount DECIMAL(18,2) NOT NULL DEFAULT 0,
+                CONSTRAINT PK_{SUMMARY_TABLE} PRIMARY KEY (dim, dim_key, period)
+            )
+        """)
+        rebuild(cur, cols)
+        return  # 本事务可能回滚，下次调用再确认表已存在后才缓存
+    _table_ready = True
+
+def rebuild(cur, cols):
+    """按 Mold 全量重算汇总表（调用方负责提交）"""
+    m = _measure_exprs(cols)
+    cur.execute(f"DELETE FROM {SUMMARY_TABLE}")
+    for dim, key_expr in _dim_exprs(cols).items():
+        cur.execute(f"""
+            INSERT INTO {SUMMARY_TABLE}
+                (dim, dim_key, period, mold_count, amount, advance_amount, balance_unpaid, invoiced_count, invoiced_amount)
+            SELECT ?, k.dim_key, k.period, COUNT(*),
+                   SUM({m['amount']}), SUM({m['advance_amount']}), SUM({m['balance_unpaid']}),
+                   SUM({m['invoiced']}), SUM(CASE WHEN {m['invoiced']} = 1 THEN {m['amount']} ELSE 0 END)
+            FROM Mold m
+            CROSS APPLY (SELECT ISNULL(CAST({key_expr} AS NVARCHAR(200)), N'') AS dim_key,
+                                ISNULL(CONVERT(NVARCHAR(7), m.start_date, 120), N'') AS period) k
+            GROUP BY k.dim_key, k.period
+        """, dim)
+
+
+# ====================== 增量维护 ======================
+def _contribution(cur, cols, mold_id):
+    """单条台账对各维度的贡献；台账不存在返回 None"""
+    dims = _dim_exprs(cols)
+    m = _measure_exprs(cols)
+    cur.execute(f"""
+        SELECT {', '.join(f"ISNULL(CAST({dims[d]} AS NVARCHAR(200)), N'')" for d in DIMENSIONS)},
+               ISNULL(CONVERT(NVARCHAR(7), m.start_date, 120), N''),
+               {m['amount']}, {m['advance_amount']}, {m['balance_unpaid']}, {m['invoiced']}
+        FROM Mold m WHERE m.id = ?
+    """, int(mold_id))
+    r = cur.fetchone()
+    if not r:
+        return None
+    n = len(DIMENSIONS)
+    keys = dict(zip(DIMENSIONS, r[:n]))
+    period = r[n]
+    amount, advance, balance, invoiced = (Decimal(str(x or 0)) for x in r[n + 1:n + 5])
+    invoiced = 1 if invoiced else 0
+    return keys, period, (1, amount, advance, balance, invoiced, amount if invoiced else Decimal(0))
+
+def apply(cur, cols, mold_id, sign):
+    """
+    把台账 mold_id 当前的贡献按 sign（+1 / -1）计入汇总表
+    修改前调用 sign=-1、修改后调用 sign=+1；删除前 sign=-1；新增后 sign=+1
+    """
+    ensure(cur, cols)
+    contrib = _contribution(cur, cols, mold_id)
+    if contrib is None:
+        return
+    keys, period, measures = contrib
+    delta = [v * sign for v in measures]
+    sets = ', '.join(f"{c} = {c} + ?" for c in MEASURES)
+    for dim in DIMENSIONS:
+        cur.execute(f"""
+            UPDATE {SUMMARY_TABLE} WITH (UPDLOCK, HOLDLOCK) SET {sets}
+            WHERE dim = ? AND dim_key = ? AND period = ?;
+            IF @@ROWCOUNT = 0
+                INSERT INTO {SUMMARY_TABLE} (dim, dim_key, period, {', '.join(MEASURES)})
+                VALUES (?, ?, ?, {', '.join('?' * len(MEASURES))});
+        """, *delta, dim, keys[dim], period, dim, keys[dim], period, *delta)
+
+
+def apply_new(cur, cols, after_id):
+    """
+    批量导入后调用：把 id > after_id 的台账（本事务新插入的行）按维度聚合后一次计入汇总表
+    每个维度一条 MERGE，不再逐行 apply
+    """
+    ensure(cur, cols)
+    m = _measure_exprs(cols)
+    for dim, key_expr in _dim_exprs(cols).items():
+        cur.execute(f"""
+            MERGE {SUMMARY_TABLE} WITH (HOLDLOCK) AS s
+            USING (
+                SELECT k.dim_key, k.period, COUNT(*) AS mold_count,
+                       SUM({m['amount']}) AS amount, SUM({m['advance_amount']}) AS advance_amount,
+                       SUM({m['balance_unpaid']}) AS balance_unpaid, SUM({m['invoiced']}) AS invoiced_count,
+                       SUM(CASE WHEN {m['invoiced']} = 1 THEN {m['amount']} ELSE 0 END) AS invoiced_amount
+                FROM Mold m
+                CROSS APPLY (SELECT ISNULL(CAST({key_expr} AS NVARCHAR(200)), N'') AS dim_key,
+                                    ISNULL(CONVERT(NVARCHAR(7), m.start_date, 120), N'') AS period) k
+                WHERE m.id > ?
+                GROUP BY k.dim_key, k.period
+            ) AS d
+            ON s.dim = ? AND s.dim_key = d.dim_key AND s.period = d.period
+            WHEN MATCHED THEN UPDATE SET {', '.join(f's.{c} = s.{c} + d.{c}' for c in MEASURES)}
+            WHEN NOT MATCHED THEN INSERT (dim, dim_key, period, {', '.join(MEASURES)})
+                VALUES (?, d.dim_key, d.period, {', '.join(f'd.{c}' for c in MEASURES)});
+        """, int(after_id), dim, dim)
+
+
+# ====================== 查询 ======================
+def _period_where(period_from, period_to):
+    where, params = [], []
+    if period_from:
+        where.append("s.period >= ?"); params.append(str(period_from)[:7])
+    if period_to:
+        where.append("s.period <= ?"); params.append(str(period_to)[:7])
+    return where, params
+
+def _row(cols, r):
+    d = dict(zip(cols, r))
+    for k in MEASURES:
+        if isinstance(d.get(k), Decimal):
+            d[k] = float(d[k])
+    return d
+
+def summarize(cur, dim, period_from=None, period_to=None):
+    """按维度汇总（供应商维度带名称），按金额倒序"""
+    where, params = _period_where(period_from, period_to)
+    name_expr, join = "s.dim_key", ''
+    if dim in ('casting_supplier', 'mold_supplier'):
+        name_expr = "ISNULL(sp.supplier_name, s.dim_key)"
+        join = "LEFT JOIN Supplier sp ON sp.id = TRY_CAST(s.dim_key AS INT)"
+    cur.execute(f"""
+        SELECT s.dim_key, MAX({name_expr}),
+               {', '.join(f'SUM(s.{c})' for c in MEASURES)}
+        FROM {SUMMARY_TABLE} s {join}
+        WHERE {' AND '.join(['s.dim = ?'] + where)}
+        GROUP BY s.dim_key
+        HAVING SUM(s.mold_count) > 0
+        ORDER BY SUM(s.amount) DESC
+    """, dim, *params)
+    return [_row(('key', 'name') + MEASURES, r) for r in cur.fetchall()]
+
+def by_period(cur, dim, key, period_from=None, period_to=None):
+    """某维度取值（如某供应商）按月份展开"""
+    where, params = _period_where(period_from, period_to)
+    cur.execute(f"""
+        SELECT s.period, {', '.join(f's.{c}' for c in MEASURES)}
+        FROM {SUMMARY_TABLE} s
+        WHERE {' AND '.join(['s.dim = ?', 's.dim_key = ?', 's.mold_count > 0'] + where)}
+        ORDER BY s.period
+    """, dim, str(key), *params)
+    return [_row(('period',) + MEASURES, r) for r in cur.fetchall()]
@@ -6,67 +6,91 @@ MRP计算主流程（数据库纯流版）
 - BOM取自 BOM
 - 结果写入 MRPYSJG
 - 所有连接由 db/session.py 管理
+- 同步生成的本地快照（modules/snapshot.py）新鲜时，fetch_* 直接读本地 Parquet，不再查库
+- 回落查库时走 db/statements.py 的参数化语句（mrp.*），不再拼接 SQL
 """
 
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, date
 from db.session import get_dst_connection
+from db.statements import Statements
+from modules.snapshot import read_snapshot
+from modules.profiler import profiled_job
+
+def _to_date(x):
+    if isinstance(x, datetime):
+        return x.date()
+    if isinstance(x, date):
+        return x
+    return datetime.strptime(str(x)[:10], '%Y-%m-%d').date()
+
+def _query_df(name, params=()):
+    """执行登记语句并转为 DataFrame"""
+    with get_dst_connection() as conn:
+        stmts = Statements(conn)
+        rows = stmts.fetchall(name, params)
+        return pd.DataFrame.from_records([tuple(r) for r in rows], columns=stmts.columns(name))
+
+ORDER_COLUMNS = ['id', 'MoCode', 'InvCode', 'InvName', 'DueDate', 'Qty']
+
+def _normalize_due_date(df):
+    """DueDate 统一为 datetime.date（空值为 None）：快照读出为 datetime64，驱动查库可能为 date/datetime/字符串"""
+    due = pd.to_datetime(df['DueDate'], errors='coerce')
+    df = df.copy()
+    df['DueDate'] = pd.Series([None if pd.isna(d) else d.date() for d in due], index=df.index, dtype=object)
+    return df
 
 def fetch_orders(start_date=None, end_date=None):
     """
     从 mom_order 表读取生产订单（可选过滤计划完工日）
-    """
-    sql = """
-        SELECT id, MoCode, InvCode, InvName, DueDate, Qty
-        FROM mom_order
-        WHERE 1=1
-    """
-    params = []
-    if start_date:
-        sql += " AND DueDate >= ?"
-        params.append(start_date)
-    if end_date:
-        sql += " AND DueDate <= ?"
-        params.append(end_date)
-    with get_dst_connection() as conn:
-        df = pd.read_sql(sql, conn, params=params)
-    return df
+    - 优先读本地快照；快照与查库两条路径返回相同的列、相同的行（指定区间端时 DueDate 为空的行不返回）
+    """
+    df = read_snapshot('mom_order', columns=ORDER_COLUMNS)
+    if df is not None:
+        due = pd.to_datetime(df['DueDate'], errors='coerce')
+        mask = pd.Series(True, index=df.index)
+        if start_date:
+            mask &= due >= pd.Timestamp(_to_date(start_date))
+        if end_date:
+            mask &= due <= pd.Timestamp(_to_date(end_date))
+        return _normalize_due_date(df[mask].reset_index(drop=True))
+
+    # 始终使用同一条语句文本，未指定的区间端传 NULL（不限，DueDate 为空的订单不会被丢掉）
+    return _normalize_due_date(_query_df('mrp.orders', {
+        'start_date': _to_date(start_date) if start_date else None,
+        'end_date': _to_date(end_date) if end_date else None,
+    }))
 
 def fetch_bom():
     """
-    从 BOM 表获取BOM明细
-    """
-    sql = """
-        SELECT mother_code, child_code, base_qty_n
-        FROM BOM
+    从 BOM 表获取BOM明细（优先读本地快照）
     """
-    with get_dst_connection() as conn:
-        df = pd.read_sql(sql, conn)
-    return df
+    df = read_snapshot('bom', columns=['mother_code', 'child_code', 'base_qty_n'])
+    if df is not None:
+        return df
+
+    return _query_df('mrp.bom')
 
 def fetch_inventory_snapshot():
     """
     取最新的库存快照表数据
-    - 只取当天 snapshot_date 的数据
+    - 只取当天 snapshot_date 的数据（优先读本地快照）
     """
     today = datetime.now().date()
-    sql = """
-        SELECT cInvCode, qty
-        FROM prospect_stock
-        WHERE snapshot_date = ?
-        AND source_type = '现存量结存数'
-    """
-    with get_dst_connection() as conn:
-        df = pd.read_sql(sql, conn, params=[today])
-    return df
+    df = read_snapshot('prospect_stock', columns=['cInvCode', 'qty', 'source_type', 'snapshot_date'])
+    if df is not None:
+        df = df[(df['snapshot_date'] == today.strftime('%Y-%m-%d')) & (df['source_type'] == '现存量结存数')]
+        return df[['cInvCode', 'qty']].reset_index(drop=True)
+
+    return _query_df('mrp.inventory_snapshot', {'snapshot_date': today})
 
 def fetch_inventory_name_dict():
     """
-    取 Inventory 表的物料名称字典（用于MRPYSJG写入冗余名）
+    取 Inventory 表的物料名称字典（用于MRPYSJG写入冗余名，优先读本地快照）
     """
-    sql = "SELECT cInvCode, cInvName FROM Inventory"
-    with get_dst_connection() as conn:
-        df = pd.read_sql(sql, conn)
+    df = read_snapshot('inventory', columns=['cInvCode', 'cInvName'])
+    if df is None:
+        df = _query_df('mrp.inventory_names')
     return dict(zip(df.cInvCode, df.cInvName))
 
 def clear_today_mrp_result():
@@ -74,10 +98,8 @@ def clear_today_mrp_result():
     写入MRP结果前，删除今天已有的MRPYSJG数据（防重复/唯一索引冲突）
     """
     today = datetime.now().date()
-    sql = "DELETE FROM MRPYSJG WHERE dRequirDate = ?"
     with get_dst_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(sql, (today,))
+        Statements(conn).execute('mrp.clear_today', {'dRequirDate': today})
         conn.commit()
 
 def calculate_bom_demand(bom_df, result_list, order_row, product_code, quantity):
@@ -102,6 +124,7 @@ def calculate_bom_demand(bom_df, result_list, order_row, product_code, quantity)
         # 递归处理多级BOM
         calculate_bom_demand(bom_df, result_list, order_row, child_code, demand)
 
+@profiled_job('run_mrp')
 def run_mrp(start_date=None, end_date=None):
     """
     主流程：1.读订单 2.BOM分解 3.取库存 4.合并需求 5.写入MRPYSJG
@@ -137,7 +160,7 @@ def run_mrp(start_date=None, end_date=None):
     print("📝 写入MRPYSJG表...")
     today = datetime.now().date()
     with get_dst_connection() as conn:
-        cursor = conn.cursor()
+        stmts = Statements(conn)
         count = 0
         for (cinvcode, dRequirDate), total_demand in mrp_result.items():
             # 冗余物料名
@@ -145,11 +168,7 @@ def run_mrp(start_date=None, end_date=None):
             # 获取库存
             as_quantity = inventory_map.get(cinvcode, 0)
             # 若有多地库存、需合并/区分，可自行扩展
-            cursor.execute("""
-                INSERT INTO MRPYSJG
-                (cinvcode, cinvname, Total_demand, dRequirDate, AS_iQuantity)
-                VALUES (?, ?, ?, ?, ?)
-            """, cinvcode, cinvname, total_demand, dRequirDate, as_quantity)
+            stmts.execute('mrp.insert_result', (cinvcode, cinvname, total_demand, dRequirDate, as_quantity))
             count += 1
         conn.commit()
     print(f"✅ 共写入MRP明细{count}条。")
@@ -0,0 +1,292 @@
+# modules/profiler.py
+"""
+按需采样剖析（单个请求 / 单次后台任务）
+- 采样线程每 PROFILE_INTERVAL_MS 毫秒抓一次目标线程的调用栈，不修改被测代码、不用 sys.setprofile，
+  开销与调用次数无关，可在生产环境对单个慢请求使用
+- 墙钟（wall）按采样间隔计权；CPU 按线程 CPU 时钟（Linux 下 pthread_getcpuclockid）的增量计权，
+  两者相比即可看出时间花在计算还是等待（数据库、网络、锁）
+- 结果为 flamegraph 折叠栈格式（每行 "帧;帧;帧 微秒"），flamegraph.pl、speedscope 可直接打开；
+  同时记录本次的 SQL 耗时明细（db/sql_trace.py）
+- 触发方式：
+    1. 请求：管理员带请求头 X-Profile: 1（api/profile_api.py），响应头 X-Profile-Id 返回剖析编号
+    2. 任务：POST /api/profile/arm 预约，下一次 sync_all / sync_all_accounts / run_mrp 执行时剖析一次；
+       任务剖析只采样任务线程及其经 sql_trace.bind() 派生的工作线程（按线程名分根），SQL 统计范围相同，
+       同时段的其他请求不会混入
+- 文件存于 PROFILE_DIR：<编号>.wall.folded / <编号>.cpu.folded / <编号>.json，保留最近 PROFILE_KEEP 份
+"""
+
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+from config import PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_MAX_SECONDS, PROFILE_KEEP
+from db import sql_trace
+
+PROFILE_HEADER = 'X-Profile'
+MAX_STACK_DEPTH = 128
+FOLDED_KINDS = ('wall', 'cpu')
+
+_ID_RE = re.compile(r'^[\w.-]+$')
+_seq = 0
+_seq_lock = threading.Lock()
+_local = threading.local()
+_armed = {}  # 任务名 -> 剩余次数
+_armed_lock = threading.Lock()
+_labels = {}  # code 对象 -> 帧标签
+
+
+def _frame_label(code):
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+def _fold(frame):
+    parts = []
+    while frame is not None and len(parts) < MAX_STACK_DEPTH:
+        parts.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(parts)).replace('\n', ' ')
+
+def _cpu_clock(thread_id):
+    try:
+        return time.pthread_getcpuclockid(thread_id)
+    except (AttributeError, OSError):
+        return None  # Windows 等不支持线程 CPU 时钟的平台只出墙钟剖析
+
+def _next_id(label):
+    global _seq
+    with _seq_lock:
+        _seq += 1
+        seq = _seq
+    slug = re.sub(r'[^\w.-]+', '_', label).strip('_')[:60]
+    return f"{datetime.now():%Y%m%d_%H%M%S}_{os.getpid()}_{seq}_{slug}"
+
+
+class Profiler:
+    """
+    采样剖析器
+    :param label: 说明（请求为 "GET /api/mold/period/list"，任务为任务名）
+    :param thread_id: 只采样该线程；None 为任务剖析，采样当前线程及 sql_trace.bind() 派生的工作线程
+    """
+
+    def __init__(self, label, kind='request', thread_id=None, interval_ms=None):
+        self.label = label
+        self.kind = kind
+        self.thread_id = thread_id
+        self.interval = (interval_ms or PROFILE_INTERVAL_MS) / 1000
+        self.wall = {}
+        self.cpu = {}
+        self.samples = 0
+        self._cpu_last = {}
+        self._clocks = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._trace = None
+
+    # ---------- 采样 ----------
+    def start(self):
+        self.started_at = datetime.now()
+        self._t0 = time.perf_counter()
+        self._last = self._t0
+        self._trace = sql_trace.begin('thread' if self.thread_id else 'job')
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        deadline = self._t0 + PROFILE_MAX_SECONDS
+        while not self._stop.wait(self.interval):
+            self._sample()
+            if time.perf_counter() > deadline:
+                break
+
+    def _sample(self):
+        now = time.perf_counter()
+        wall_us = int((now - self._last) * 1e6)
+        self._last = now
+        frames = sys._current_frames()
+        if self.thread_id is not None:
+            targets = {self.thread_id: None}
+        else:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            targets = {tid: names.get(tid, str(tid)) for tid in self._trace.thread_ids()}
+        for tid, thread_name in targets.items():
+            frame = frames.get(tid)
+            if frame is None:
+                continue
+            stack = _fold(frame)
+            if thread_name is not None:
+                stack = f"{thread_name};{stack}"
+            self.wall[stack] = self.wall.get(stack, 0) + wall_us
+            cpu_us = self._cpu_delta(tid)
+            if cpu_us:
+                self.cpu[stack] = self.cpu.get(stack, 0) + cpu_us
+        self.samples += 1
+
+    def _cpu_delta(self, tid):
+        if tid not in self._clocks:
+            self._clocks[tid] = _cpu_clock(tid)
+        clock = self._clocks[tid]
+        if clock is None:
+            return 0
+        try:
+            now = time.clock_gettime(clock)
+        except OSError:  # 线程已结束
+            self._clocks[tid] = None
+            return 0
+        last = self._cpu_last.get(tid)
+        self._cpu_last[tid] = now
+        return int((now - last) * 1e6) if last is not None else 0
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.wall_seconds = time.perf_counter() - self._t0
+        sql_trace.end(self._trace)
+        return self
+
+    # ---------- 保存 ----------
+    def save(self, **extra):
+        """写出折叠栈与元数据，返回元数据 dict（含 id）"""
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profile_id = _next_id(self.label)
+        for kind, stacks in (('wall', self.wall), ('cpu', self.cpu)):
+            with open(os.path.join(PROFILE_DIR, f"{profile_id}.{kind}.folded"), 'w', encoding='utf-8') as f:
+                for stack, weight in sorted(stacks.items(), key=lambda x: -x[1]):
+                    f.write(f"{stack} {weight}\n")
+        meta = {
+            'id': profile_id,
+            'label': self.label,
+            'kind': self.kind,
+            'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'wall_seconds': round(self.wall_seconds, 3),
+            'cpu_seconds': round(sum(self.cpu.values()) / 1e6, 3),
+            'samples': self.samples,
+            'interval_ms': self.interval * 1000,
+            'sql_total_ms': self._trace.total_ms(),
+            'sql': self._trace.breakdown(),
+            **extra,
+        }
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=1, default=str)
+        _prune()
+        return meta
+
+
+# ====================== 请求剖析 ======================
+def start_request(label):
+    """在当前（请求）线程开始剖析"""
+    _local.profiler = Profiler(label, 'request', thread_id=threading.get_ident()).start()
+    return _local.profiler
+
+def finish_request(save=True, **extra):
+    """结束当前线程的剖析；save=False 时丢弃结果。未在剖析时返回 None"""
+    p = getattr(_local, 'profiler', None)
+    if p is None:
+        return None
+    _local.profiler = None
+    p.stop()
+    return p.save(**extra) if save else None
+
+def active():
+    return getattr(_local, 'profiler', None) is not None
+
+
+# ====================== 任务剖析 ======================
+JOBS = ('sync_all', 'sync_all_accounts', 'run_mrp')
+
+def arm(job, count=1):
+    """预约剖析接下来 count 次指定任务"""
+    if job not in JOBS:
+        raise ValueError(f"未知任务 {job}，可选：{', '.join(JOBS)}")
+    with _armed_lock:
+        _armed[job] = _armed.get(job, 0) + max(1, int(count))
+    return armed()
+
+def armed():
+    with _armed_lock:
+        return dict(_armed)
+
+def _take(job):
+    with _armed_lock:
+        if _armed.get(job, 0) <= 0:
+            return False
+        _armed[job] -= 1
+        if not _armed[job]:
+            del _armed[job]
+        return True
+
+def profiled_job(job):
+    """
+    任务装饰器：已预约且当前不在剖析中（请求剖析或外层任务剖析）时剖析本次执行，否则直接调用
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if active() or sql_trace.active() is not None or not _take(job):
+                return func(*args, **kwargs)
+            p = Profiler(job, 'job').start()
+            _local.profiler = p
+            status = 'done'
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                status = 'failed'
+                raise
+            finally:
+                _local.profiler = None
+                p.stop()
+                meta = p.save(status=status)
+                print(f"[INFO] 任务 {job} 剖析完成：{meta['id']}（{meta['wall_seconds']}s，SQL {meta['sql_total_ms']}ms）")
+        return wrapper
+    return decorator
+
+
+# ====================== 查询 ======================
+def list_profiles(limit=50):
+    """最近的剖析记录（元数据，不含 SQL 明细），按时间倒序"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    names = sorted((n for n in os.listdir(PROFILE_DIR) if n.endswith('.json')),
+                   key=lambda n: os.path.getmtime(os.path.join(PROFILE_DIR, n)), reverse=True)
+    result = []
+    for name in names[:limit]:
+        meta = load_meta(name[:-len('.json')])
+        if meta:
+            meta.pop('sql', None)
+            result.append(meta)
+    return result
+
+def load_meta(profile_id):
+    if not _ID_RE.match(profile_id or ''):
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def folded_path(profile_id, kind):
+    """折叠栈文件路径；编号非法或文件不存在返回 None"""
+    if kind not in FOLDED_KINDS or not _ID_RE.match(profile_id or ''):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.{kind}.folded")
+    return path if os.path.isfile(path) else None
+
+def _prune():
+    names = sorted((n for n in os.listdir(PROFILE_DIR) if n.endswith('.json')),
+                   key=lambda n: os.path.getmtime(os.path.join(PROFILE_DIR, n)), reverse=True)
+    for name in names[PROFILE_KEEP:]:
+        profile_id = name[:-len('.json')]
+        for suffix in ('.json', '.wall.folded', '.cpu.folded'):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + suffix))
+            except OSError:
+                pass
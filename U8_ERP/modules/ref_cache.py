@@ -0,0 +1,77 @@
+# modules/ref_cache.py
+"""
+参考数据（字典）进程内缓存
+- 返还方式、模具工艺等小字典：首次读取时加载，之后直接返回内存中的列表和 ETag
+- 写入时失效：DataSettingService 增删改字典后调用 invalidate(分组)，同组的所有字典一并失效
+- MAX_AGE 为兜底过期时间（库里被其他程序直接改动时最多延迟这么久）
+- ETag 为数据内容的摘要，接口据此返回 304，浏览器不必重复下载
+用法：
+    ref_cache.register('refund_methods', loader, group='refund')
+    data, etag = ref_cache.get('refund_methods')
+    ref_cache.invalidate('refund')
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+MAX_AGE = 3600
+
+_loaders = {}   # name -> (loader, group)
+_entries = {}   # name -> {'data', 'etag', 'at'}
+_versions = {}  # name -> 失效次数（加载期间被失效则不写回旧数据）
+_stats = {'hits': 0, 'loads': 0, 'invalidations': 0}
+_lock = threading.Lock()
+
+
+def register(name, loader, group=None):
+    """登记字典加载函数（无参，返回可 JSON 序列化的数据）"""
+    with _lock:
+        _loaders[name] = (loader, group or name)
+        _versions.setdefault(name, 0)
+
+def _etag(data):
+    raw = json.dumps(data, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+def get(name):
+    """返回 (数据, ETag)；未缓存或已过期时调用加载函数"""
+    now = time.time()
+    with _lock:
+        entry = _entries.get(name)
+        if entry and now - entry['at'] < MAX_AGE:
+            _stats['hits'] += 1
+            return entry['data'], entry['etag']
+        loader, _ = _loaders[name]
+        version = _versions[name]
+
+    data = loader()  # 不持锁加载，避免慢查询阻塞其他字典
+    etag = _etag(data)
+    with _lock:
+        _stats['loads'] += 1
+        if _versions[name] == version:
+            _entries[name] = {'data': data, 'etag': etag, 'at': now}
+    return data, etag
+
+def invalidate(*groups):
+    """按分组（或字典名）失效；不传参数时全部失效"""
+    with _lock:
+        for name, (_, group) in _loaders.items():
+            if not groups or group in groups or name in groups:
+                _entries.pop(name, None)
+                _versions[name] += 1
+                _stats['invalidations'] += 1
+
+def stats():
+    with _lock:
+        return dict(_stats, cached=sorted(_entries), registered=sorted(_loaders))
+
+def response(name):
+    """Flask 响应：带 ETag，If-None-Match 命中时返回 304（每次都向服务端确认，但不访问数据库）"""
+    from flask import jsonify, request
+    data, etag = get(name)
+    resp = jsonify(data)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
@@ -0,0 +1,462 @@
+# modules/search_index.py
+"""
+模具联想搜索的内存索引
+- 索引字段：模具ID、产品名称、物料编码、铸造/模具供应商名称
+- 倒排表以 1~2 字 n-gram 为键；中文另外登记拼音首字母（需 pypinyin，未安装时只按原文匹配；
+  pypinyin 导入约 0.3 秒，首次构建索引时才导入，不计入应用启动）
+- 查询：取各 n-gram 倒排表交集得到候选，再逐条确认子串命中并打分，返回前 N 条
+- 增量维护：台账新增/修改后 refresh(mold_id)，删除后 remove(mold_id)（见 modules/mold.py）
+- 另设 REBUILD_SECONDS 定期全量重建，兜底其他进程的修改与供应商改名
+- 重建：同一时刻只有一个线程加载全量数据；已有旧索引时其他查询不等待、继续用旧索引。
+  加载期间的增量修改记入待补队列，新索引装好后重放；期间 invalidate() 则新索引装好后仍视为过期
+
+物料 / 供应商联想索引（TypeaheadIndex）
+- 编码（供应商无编码时用名称）建前缀树，名称与编码建三字 gram 倒排表
+- sync_inventory / sync_supplier 完成后打补丁或置为待重建（见 modules/sync.py），查询不再访问 SQL Server
+"""
+
+import threading
+import time
+
+from config import CURRENT_ACCOUNT_CODE
+from db.session import get_dst_connection
+
+REBUILD_SECONDS = 600
+DEFAULT_LIMIT = 20
+
+# 字段权重：同一关键字命中多个字段时取最高分
+FIELD_WEIGHTS = {
+    'mold_id': 100,
+    'product_name': 60,
+    'materials': 40,
+    'casting_supplier': 20,
+    'mold_supplier': 20,
+}
+PREFIX_BONUS = 15   # 字段以关键字开头
+PINYIN_FACTOR = 0.5  # 拼音首字母命中按原权重折半
+
+
+_pinyin = None  # (lazy_pinyin, Style)；未安装 pypinyin 时为 False
+
+
+# ====================== 工具函数 ======================
+def _norm(text):
+    return str(text or '').strip().lower()
+
+def _pinyin_funcs():
+    global _pinyin
+    if _pinyin is None:
+        try:
+            from pypinyin import lazy_pinyin, Style
+            _pinyin = (lazy_pinyin, Style)
+        except Exception:
+            _pinyin = False
+    return _pinyin
+
+def _initials(text):
+    """拼音首字母串，如 '铝壳体' -> 'lkt'；无中文或未安装 pypinyin 时返回空串"""
+    if not text or text.isascii():
+        return ''
+    funcs = _pinyin_funcs()
+    if not funcs:
+        return ''
+    lazy_pinyin, style = funcs
+    return ''.join(lazy_pinyin(text, style=style.FIRST_LETTER, errors='ignore')).lower()
+
+def _grams(text):
+    """1-gram + 2-gram 集合（短关键字也能走倒排表）"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    grams.discard(' ')
+    return grams
+
+def _query_grams(text):
+    """查询只取最有区分度的一组：长度 >= 2 用 2-gram，否则用单字"""
+    if len(text) >= 2:
+        return {text[i:i + 2] for i in range(len(text) - 1)}
+    return {text}
+
+
+class MoldSearchIndex:
+    """
+    模具台账内存索引（线程安全）
+    :param load_all: 返回全部台账 dict 列表的函数（字段同 list_mold_period_v2）
+    :param load_one: 按 mold_id 返回单条台账 dict 的函数，不存在返回 None
+    """
+
+    def __init__(self, load_all, load_one):
+        self._load_all = load_all
+        self._load_one = load_one
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()  # 同一时刻只有一个线程全量加载
+        self._docs = {}      # mold_id -> {'row': 简要信息, 'texts': {字段: 规范化文本}, 'py': {字段: 首字母}}
+        self._postings = {}  # gram -> set(mold_id)
+        self._built_at = None
+        self._generation = 0  # invalidate() 计数
+        self._pending = None  # 重建加载期间的增量修改：mold_id -> 台账 dict（None 为删除）；不在重建时为 None
+
+    # ---- 构建 / 增量维护 ----
+    def rebuild(self):
+        with self._build_lock:
+            return self._rebuild()
+
+    def _rebuild(self):
+        with self._lock:
+            self._pending = {}
+            generation = self._generation
+        try:
+            rows = self._load_all()
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            self._docs, self._postings = {}, {}
+            for r in rows:
+                self._add(r)
+            for mold_id, row in self._pending.items():
+                self._remove(mold_id)
+                if row:
+                    self._add(row)
+            self._pending = None
+            self._built_at = time.monotonic() if generation == self._generation else None
+        return len(rows)
+
+    def refresh(self, mold_id):
+        """台账新增/修改后调用；索引尚未构建且不在构建中时无需处理（首次查询会全量构建）"""
+        if self._built_at is None and self._pending is None:
+            return
+        mold_id = int(mold_id)
+        row = self._load_one(mold_id)
+        with self._lock:
+            self._remove(mold_id)
+            if row:
+                self._add(row)
+            if self._pending is not None:
+                self._pending[mold_id] = row
+
+    def remove(self, mold_id):
+        mold_id = int(mold_id)
+        with self._lock:
+            self._remove(mold_id)
+            if self._pending is not None:
+                self._pending[mold_id] = None
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+            self._generation += 1
+
+    def _stale(self):
+        return self._built_at is None or time.monotonic() - self._built_at > REBUILD_SECONDS
+
+    def _ensure_built(self):
+        if not self._stale():
+            return
+        # 已有旧索引时不排队等别人的重建，先用旧索引返回
+        if not self._build_lock.acquire(blocking=self._built_at is None):
+            return
+        try:
+            if self._stale():
+                self._rebuild()
+        finally:
+            self._build_lock.release()
+
+    def _add(self, r):
+        mold_id = int(r['mold_id'])
+        texts = {f: _norm(r.get(f)) for f in FIELD_WEIGHTS}
+        texts['mold_id'] = str(mold_id)
+        py = {f: _initials(texts[f]) for f in ('product_name', 'casting_supplier', 'mold_supplier')}
+        self._docs[mold_id] = {
+            'row': {
+                'mold_id': mold_id,
+                'product_name': r.get('product_name') or '',
+                'materials': r.get('materials') or '',
+                'casting_supplier': r.get('casting_supplier') or '',
+                'mold_supplier': r.get('mold_supplier') or '',
+            },
+            'texts': texts,
+            'py': py,
+        }
+        for text in list(texts.values()) + list(py.values()):
+            for g in _grams(text):
+                self._postings.setdefault(g, set()).add(mold_id)
+
+    def _remove(self, mold_id):
+        doc = self._docs.pop(mold_id, None)
+        if not doc:
+            return
+        for text in list(doc['texts'].values()) + list(doc['py'].values()):
+            for g in _grams(text):
+                ids = self._postings.get(g)
+                if ids is not None:
+                    ids.discard(mold_id)
+                    if not ids:
+                        del self._postings[g]
+
+    # ---- 查询 ----
+    def search(self, keyword, limit=DEFAULT_LIMIT):
+        """返回按得分倒序的前 limit 条简要台账（同分按 ID 倒序，即新登记的在前）"""
+        kw = _norm(keyword)
+        if not kw:
+            return []
+        self._ensure_built()
+        with self._lock:
+            candidates = None
+            for g in _query_grams(kw):
+                ids = self._postings.get(g)
+                if not ids:
+                    return []
+                candidates = set(ids) if candidates is None else candidates & ids
+                if not candidates:
+                    return []
+            scored = []
+            for mold_id in candidates:
+                doc = self._docs[mold_id]
+                score = self._score(doc, kw)
+                if score > 0:
+                    scored.append((score, mold_id, doc['row']))
+        scored.sort(key=lambda x: (-x[0], -x[1]))
+        return [dict(row, score=score) for score, _, row in scored[:limit]]
+
+    @staticmethod
+    def _score(doc, kw):
+        best = 0
+        for field, weight in FIELD_WEIGHTS.items():
+            text = doc['texts'][field]
+            if kw in text:
+                s = weight + (PREFIX_BONUS if text.startswith(kw) else 0)
+                if field == 'mold_id' and text != kw:
+                    s = weight // 2  # ID 只有完全相等才算强命中
+                best = max(best, s)
+            py = doc['py'].get(field)
+            if py and kw in py:
+                best = max(best, weight * PINYIN_FACTOR + (PREFIX_BONUS if py.startswith(kw) else 0))
+        return best
+
+    def stats(self):
+        with self._lock:
+            return {
+                'docs': len(self._docs),
+                'grams': len(self._postings),
+                'age_seconds': None if self._built_at is None else round(time.monotonic() - self._built_at, 1),
+                'pinyin': bool(_pinyin_funcs()),
+            }
+
+
+# ====================== 物料 / 供应商联想 ======================
+class PrefixTrie:
+    """编码前缀树：节点为 dict，键 '' 存放以该节点结尾的条目 key"""
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, text, key):
+        node = self.root
+        for ch in text:
+            node = node.setdefault(ch, {})
+        node.setdefault('', set()).add(key)
+
+    def delete(self, text, key):
+        path, node = [], self.root
+        for ch in text:
+            if ch not in node:
+                return
+            path.append((node, ch))
+            node = node[ch]
+        keys = node.get('')
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del node['']
+        # 回收空节点
+        for parent, ch in reversed(path):
+            if parent[ch]:
+                break
+            del parent[ch]
+
+    def prefixed(self, prefix, limit):
+        """以 prefix 开头的条目 key，按编码字典序，最多 limit 个"""
+        node = self.root
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return []
+        out, stack = [], [node]
+        while stack and len(out) < limit:
+            node = stack.pop()
+            out.extend(sorted(node.get('', ())))
+            stack.extend(node[ch] for ch in sorted((c for c in node if c), reverse=True))
+        return out[:limit]
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TypeaheadIndex:
+    """
+    编码 + 名称联想索引（线程安全）
+    - 编码前缀：前缀树；名称/编码包含：三字 gram 倒排表取交集后确认子串；
+      关键字不足 3 个字时在内存中顺序扫描（仍不访问数据库）
+    - 排序：编码完全相等 > 编码前缀 > 名称前缀 > 名称包含 > 编码包含；同档按文本长度、编码排序
+    :param load_all: 返回 [(key, code, name, 返回给前端的 dict), ...] 的函数
+    """
+
+    def __init__(self, load_all):
+        self._load_all = load_all
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._items = {}     # key -> (code_norm, name_norm, payload)
+        self._trie = PrefixTrie()
+        self._grams = {}     # trigram -> set(key)
+        self._built_at = None
+        self._generation = 0
+        self._pending = None  # 重建加载期间的增量修改：key -> (code, name, payload)（None 为删除）
+
+    def rebuild(self):
+        with self._build_lock:
+            return self._rebuild()
+
+    def _rebuild(self):
+        with self._lock:
+            self._pending = {}
+            generation = self._generation
+        try:
+            rows = self._load_all()
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            self._items, self._trie, self._grams = {}, PrefixTrie(), {}
+            for key, code, name, payload in rows:
+                self._put(key, code, name, payload)
+            for key, item in self._pending.items():
+                self._drop(key)
+                if item:
+                    self._put(key, *item)
+            self._pending = None
+            self._built_at = time.monotonic() if generation == self._generation else None
+        return len(rows)
+
+    def upsert(self, key, code, name, payload):
+        """增量修改；索引尚未构建且不在构建中时忽略（首次查询会全量构建）"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending[key] = (code, name, payload)
+            elif self._built_at is None:
+                return
+            self._drop(key)
+            self._put(key, code, name, payload)
+
+    def remove(self, key):
+        with self._lock:
+            self._drop(key)
+            if self._pending is not None:
+                self._pending[key] = None
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+            self._generation += 1
+
+    def _stale(self):
+        return self._built_at is None or time.monotonic() - self._built_at > REBUILD_SECONDS
+
+    def _ensure_built(self):
+        if not self._stale():
+            return
+        if not self._build_lock.acquire(blocking=self._built_at is None):
+            return
+        try:
+            if self._stale():
+                self._rebuild()
+        finally:
+            self._build_lock.release()
+
+    def _put(self, key, code, name, payload):
+        code_n, name_n = _norm(code), _norm(name)
+        self._items[key] = (code_n, name_n, payload)
+        self._trie.insert(code_n, key)
+        for g in _trigrams(code_n) | _trigrams(name_n):
+            self._grams.setdefault(g, set()).add(key)
+
+    def _drop(self, key):
+        item = self._items.pop(key, None)
+        if not item:
+            return
+        code_n, name_n, _ = item
+        self._trie.delete(code_n, key)
+        for g in _trigrams(code_n) | _trigrams(name_n):
+            keys = self._grams.get(g)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._grams[g]
+
+    def search(self, keyword, limit=50):
+        kw = _norm(keyword)
+        if not kw:
+            return []
+        self._ensure_built()
+        with self._lock:
+            ranked = {}
+            # 编码前缀（前缀树，天然有序）
+            for key in self._trie.prefixed(kw, limit):
+                code_n = self._items[key][0]
+                ranked[key] = (0 if code_n == kw else 1, len(code_n), code_n)
+            # 包含匹配
+            if len(kw) >= 3:
+                candidates = None
+                for g in _trigrams(kw):
+                    keys = self._grams.get(g, set())
+                    candidates = set(keys) if candidates is None else candidates & keys
+                    if not candidates:
+                        break
+                candidates = candidates or set()
+            else:
+                candidates = self._items.keys()
+            for key in candidates:
+                if key in ranked:
+                    continue
+                code_n, name_n, _ = self._items[key]
+                if name_n.startswith(kw):
+                    ranked[key] = (2, len(name_n), code_n)
+                elif kw in name_n:
+                    ranked[key] = (3, len(name_n), code_n)
+                elif kw in code_n:
+                    ranked[key] = (4, len(code_n), code_n)
+            keys = sorted(ranked, key=ranked.get)[:limit]
+            return [self._items[k][2] for k in keys]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'items': len(self._items),
+                'grams': len(self._grams),
+                'age_seconds': None if self._built_at is None else round(time.monotonic() - self._built_at, 1),
+            }
+
+
+def _load_inventory():
+    with get_dst_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT cInvCode, cInvName FROM Inventory")
+        return [(r[0], r[0], r[1], {'cInvCode': r[0], 'cInvName': r[1]}) for r in cur.fetchall()]
+
+def _load_suppliers():
+    # 供应商无编码，名称同时进前缀树
+    with get_dst_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id, supplier_name FROM Supplier")
+        return [(r[0], r[1], r[1], {'id': r[0], 'supplier_name': r[1]}) for r in cur.fetchall()]
+
+
+inventory_index = TypeaheadIndex(_load_inventory)
+supplier_index = TypeaheadIndex(_load_suppliers)
+
+
+def is_current_account(account_code):
+    """索引只覆盖当前账套的目标库；其他账套的同步不影响索引"""
+    return account_code in (None, CURRENT_ACCOUNT_CODE)
@@ -0,0 +1,149 @@
+# modules/snapshot.py
+"""
+本地列式快照缓存
+- 同步阶段（sync.py）在写入目标库的同时，把抽取结果写成 Parquet 文件（zstd 压缩）
+- 目录结构：SNAPSHOT_DIR/<账套代码>/<name>.<generation>.parquet，manifest.json 记录各快照当前代次
+- generation（同步代次）每次写入递增；旧代次保留 SNAPSHOT_KEEP 份后清理，避免读者正在映射的文件被删
+- 读取使用 memory_map，在 SNAPSHOT_MAX_AGE_HOURS 内视为新鲜；过期/缺失/未安装 pyarrow 时返回 None，
+  调用方（mrp.py 的 fetch_*）回落到 SQL 查询
+- pyarrow 在首次读写快照时才导入，不影响应用启动时间
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from config import CURRENT_ACCOUNT_CODE, SNAPSHOT_DIR, SNAPSHOT_MAX_AGE_HOURS, SNAPSHOT_KEEP
+
+MANIFEST = 'manifest.json'
+_lock = threading.Lock()
+_arrow_modules = None
+
+
+# ====================== 工具函数 ======================
+def _arrow():
+    """(pyarrow, pyarrow.parquet)；未安装时为 (None, None)"""
+    global _arrow_modules
+    if _arrow_modules is None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+            _arrow_modules = (pyarrow, pyarrow.parquet)
+        except Exception:
+            _arrow_modules = (None, None)
+    return _arrow_modules
+
+def _account_dir(account_code=None):
+    d = os.path.join(SNAPSHOT_DIR, account_code or CURRENT_ACCOUNT_CODE)
+    os.makedirs(d, exist_ok=True)
+    return d
+
+def _load_manifest(d):
+    try:
+        with open(os.path.join(d, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {'generation': 0, 'snapshots': {}}
+
+def _save_manifest(d, manifest):
+    # 先写临时文件再原子替换，其他进程不会读到半截 manifest
+    tmp = os.path.join(d, f"{MANIFEST}.{os.getpid()}.tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, os.path.join(d, MANIFEST))
+
+def _to_arrow_column(values):
+    """单列转 Arrow 数组；类型混杂（如 Decimal 与 int 并存）时退化为字符串列"""
+    pa, _ = _arrow()
+    try:
+        return pa.array(values)
+    except Exception:
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+def _prune(d, name, keep_files):
+    prefix = f"{name}."
+    for fn in os.listdir(d):
+        if fn.startswith(prefix) and fn.endswith('.parquet') and fn not in keep_files:
+            try:
+                os.remove(os.path.join(d, fn))
+            except Exception:
+                pass  # Windows 下仍被映射的文件删不掉，下次再清
+
+
+# ====================== 写入 ======================
+def write_snapshot(name, columns, rows, account_code=None, meta=None):
+    """
+    写入一份快照（失败只打印告警，不影响同步主流程）
+    :param name: 快照名，如 'bom' / 'mom_order' / 'prospect_stock' / 'inventory'
+    :param columns: 列名列表
+    :param rows: 行元组列表，与 columns 一一对应
+    :param meta: 附加信息（如同步区间），原样记入 manifest
+    :return: 本次代次号；未写入时返回 None
+    """
+    pa, pq = _arrow()
+    if pa is None:
+        return None
+    try:
+        table = pa.table({col: _to_arrow_column([r[i] for r in rows]) for i, col in enumerate(columns)})
+        d = _account_dir(account_code)
+        with _lock:
+            manifest = _load_manifest(d)
+            generation = int(manifest.get('generation', 0)) + 1
+            file_name = f"{name}.{generation}.parquet"
+            tmp = os.path.join(d, file_name + '.tmp')
+            pq.write_table(table, tmp, compression='zstd')
+            os.replace(tmp, os.path.join(d, file_name))
+
+            entry = manifest['snapshots'].get(name) or {}
+            history = ([entry['file']] if entry.get('file') else []) + entry.get('history', [])
+            manifest['generation'] = generation
+            manifest['snapshots'][name] = {
+                'file': file_name,
+                'generation': generation,
+                'rows': len(rows),
+                'written_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'meta': meta or {},
+                'history': history[:max(SNAPSHOT_KEEP - 1, 0)],
+            }
+            _save_manifest(d, manifest)
+            _prune(d, name, {file_name, *manifest['snapshots'][name]['history']})
+        return generation
+    except Exception as ex:
+        print(f"[WARN] 快照 {name} 写入失败: {ex}")
+        return None
+
+
+# ====================== 读取 ======================
+def snapshot_info(name, account_code=None):
+    """返回快照在 manifest 中的登记信息，不存在返回 None"""
+    return _load_manifest(_account_dir(account_code))['snapshots'].get(name)
+
+def is_fresh(info, max_age_hours=None):
+    if not info:
+        return False
+    max_age = SNAPSHOT_MAX_AGE_HOURS if max_age_hours is None else max_age_hours
+    try:
+        written_at = datetime.strptime(info['written_at'], '%Y-%m-%d %H:%M:%S')
+    except Exception:
+        return False
+    return datetime.now() - written_at <= timedelta(hours=max_age)
+
+def read_snapshot(name, columns=None, account_code=None, max_age_hours=None):
+    """
+    读取新鲜快照为 DataFrame（memory_map 方式，仅读取所需列）
+    :return: pandas.DataFrame；无可用快照时返回 None
+    """
+    _, pq = _arrow()
+    if pq is None:
+        return None
+    d = _account_dir(account_code)
+    info = _load_manifest(d)['snapshots'].get(name)
+    if not is_fresh(info, max_age_hours):
+        return None
+    try:
+        table = pq.read_table(os.path.join(d, info['file']), columns=columns, memory_map=True)
+        return table.to_pandas()
+    except Exception as ex:
+        print(f"[WARN] 快照 {name} 读取失败，改为查询数据库: {ex}")
+        return None
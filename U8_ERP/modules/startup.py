@@ -0,0 +1,96 @@
+# modules/startup.py
+"""
+启动耗时报告
+- create_app 结束时调用 record()：记录 app.py 及各蓝图的导入耗时、本次创建耗时、已被加载的重型依赖
+  （pandas/SQLAlchemy/pyarrow 等），两者合计超过 STARTUP_TARGET_SECONDS 时打印告警；
+  结果存于 app.extensions['startup']
+- 重型依赖应在首次使用时才导入（见 api/mold_api.py、modules/user.py、modules/snapshot.py），
+  启动阶段出现在 heavy_loaded 里说明有模块在顶层引入了它
+- 命令行测冷启动（每次新开解释器，-X importtime 统计各顶层包导入耗时）：
+    python -m modules.startup            # 默认 5 次取中位数，超过目标时退出码为 1
+    python -m modules.startup --runs 10 --top 15
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from config import STARTUP_TARGET_SECONDS
+
+HEAVY_MODULES = ('pandas', 'numpy', 'sqlalchemy', 'pyarrow', 'openpyxl', 'pypinyin')
+
+
+def record(app, started, import_seconds=0.0):
+    """create_app 末尾调用；started 为 create_app 开始时的 time.perf_counter()，import_seconds 为 app.py 导入耗时"""
+    elapsed = time.perf_counter() - started
+    total = import_seconds + elapsed
+    heavy = [m for m in HEAVY_MODULES if m in sys.modules]
+    report = {
+        'import_seconds': round(import_seconds, 3),
+        'create_app_seconds': round(elapsed, 3),
+        'total_seconds': round(total, 3),
+        'target_seconds': STARTUP_TARGET_SECONDS,
+        'heavy_loaded': heavy,
+    }
+    app.extensions['startup'] = report
+    if total > STARTUP_TARGET_SECONDS or heavy:
+        print(f"[WARN] 启动耗时 {total:.3f}s（导入 {import_seconds:.3f}s + create_app {elapsed:.3f}s，"
+              f"目标 {STARTUP_TARGET_SECONDS}s），启动时已加载重型依赖：{', '.join(heavy) or '无'}")
+    return report
+
+
+# ====================== 冷启动测量 ======================
+_PROBE = (
+    "import time; t = time.perf_counter(); "
+    "from app import create_app; create_app(); "
+    "print('CREATE_APP', time.perf_counter() - t)"
+)
+
+def _parse_importtime(stderr):
+    """-X importtime 输出 -> {顶层包: 自身耗时合计(秒)}"""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, _, name = (p.strip() for p in line[len('import time:'):].split('|'))
+            top = name.split('.')[0]
+            totals[top] = totals.get(top, 0) + int(self_us) / 1e6
+        except ValueError:
+            continue
+    return totals
+
+def measure(runs=5):
+    """新开解释器 runs 次执行 create_app，返回 {'seconds': [...], 'median', 'imports': {包: 秒}}"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    seconds, imports = [], {}
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', _PROBE],
+                              cwd=root, capture_output=True, text=True)
+        out = [l for l in proc.stdout.splitlines() if l.startswith('CREATE_APP')]
+        if proc.returncode != 0 or not out:
+            raise RuntimeError(f"create_app 启动失败：\n{proc.stderr[-2000:]}")
+        seconds.append(float(out[-1].split()[1]))
+        imports = _parse_importtime(proc.stderr)  # 取最后一次（磁盘缓存已热）
+    return {'seconds': seconds, 'median': statistics.median(seconds), 'imports': imports}
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='create_app 冷启动耗时与导入开销')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    result = measure(args.runs)
+    print(f"create_app 冷启动：中位数 {result['median']:.3f}s（目标 {STARTUP_TARGET_SECONDS}s），"
+          f"各次 {', '.join(f'{s:.3f}' for s in result['seconds'])}")
+    print('导入耗时（按顶层包汇总）：')
+    for name, sec in sorted(result['imports'].items(), key=lambda x: -x[1])[:args.top]:
+        flag = '  <- 重型依赖' if name in HEAVY_MODULES else ''
+        print(f"  {name:<24}{sec * 1000:8.1f} ms{flag}")
+    return 0 if result['median'] <= STARTUP_TARGET_SECONDS else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
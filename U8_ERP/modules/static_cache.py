@@ -0,0 +1,149 @@
+# modules/static_cache.py
+"""
+页面静态文件内存缓存（templates/ 下的 HTML 等）
+- 启动时把目录下全部文件读入内存，预先压缩为 gzip；brotli（已安装 brotli 包时）在某文件首次被
+  支持 br 的浏览器请求时再压缩并缓存 —— quality 11 每个文件要数十毫秒，全部放在启动时会拖慢冷启动
+- 按请求头 Accept-Encoding 直接返回压缩好的字节，不再每次读盘、不再现场压缩
+- 每种编码一个强 ETag（内容 SHA-256），Cache-Control: no-cache —— 浏览器每次带 If-None-Match 确认，
+  页面未变时返回 304（无响应体），改版后立即生效
+- reload=True（开发模式）时每次请求检查文件修改时间，变化则重新加载该文件；新增文件也能被发现
+用法：
+    pages = StaticCache(templates_dir, reload=DEBUG_MODE)
+    return pages.response(filename)   # 不存在返回 None
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    brotli = None
+
+# 太小的文件压缩收益不足以抵消解压开销
+MIN_COMPRESS_SIZE = 512
+BROTLI_QUALITY = 11  # 只压一次，取最高压缩率
+
+
+class StaticCache:
+
+    def __init__(self, root, reload=False, cache_control='no-cache'):
+        self.root = os.path.abspath(root)
+        self.reload = reload
+        self.cache_control = cache_control
+        self._files = {}  # 相对路径（/ 分隔）-> entry
+        self._lock = threading.Lock()
+        self.load_all()
+
+    # ---------- 加载 ----------
+    def load_all(self):
+        files = {}
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                rel = os.path.relpath(path, self.root).replace(os.sep, '/')
+                files[rel] = self._build(path)
+        with self._lock:
+            self._files = files
+        return len(files)
+
+    @staticmethod
+    def _build(path):
+        with open(path, 'rb') as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()[:20]
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        bodies = {'identity': (raw, digest)}
+        if len(raw) >= MIN_COMPRESS_SIZE:
+            gz = gzip.compress(raw, compresslevel=9, mtime=0)
+            if len(gz) < len(raw):
+                bodies['gzip'] = (gz, digest + '-gz')
+        return {'path': path, 'mtime': os.stat(path).st_mtime_ns, 'mimetype': mimetype, 'bodies': bodies,
+                'br_pending': brotli is not None and len(raw) >= MIN_COMPRESS_SIZE, 'lock': threading.Lock()}
+
+    @staticmethod
+    def _ensure_br(entry):
+        """首次需要 br 时压缩并写回条目；同一文件并发请求只压一次"""
+        with entry['lock']:
+            if not entry['br_pending']:
+                return
+            raw, digest = entry['bodies']['identity']
+            br = brotli.compress(raw, quality=BROTLI_QUALITY)
+            if len(br) < len(raw):
+                entry['bodies']['br'] = (br, digest + '-br')
+            entry['br_pending'] = False
+
+    def _resolve(self, filename):
+        """请求路径 -> 缓存条目；只认根目录内的文件"""
+        rel = os.path.normpath(filename).replace(os.sep, '/').lstrip('/')
+        if rel.startswith('..'):
+            return None
+        with self._lock:
+            entry = self._files.get(rel)
+        if not self.reload:
+            return entry
+        path = os.path.join(self.root, rel)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            with self._lock:
+                self._files.pop(rel, None)
+            return None
+        if entry is None or entry['mtime'] != mtime:
+            if not os.path.isfile(path):
+                return None
+            entry = self._build(path)
+            with self._lock:
+                self._files[rel] = entry
+        return entry
+
+    # ---------- 响应 ----------
+    @staticmethod
+    def _accepted(accept_encoding):
+        return {part.split(';')[0].strip().lower() for part in (accept_encoding or '').split(',')}
+
+    @classmethod
+    def _pick_encoding(cls, entry, accept_encoding):
+        accepted = cls._accepted(accept_encoding)
+        for enc in ('br', 'gzip'):
+            if enc in entry['bodies'] and enc in accepted:
+                return enc
+        return 'identity'
+
+    def response(self, filename):
+        """Flask 响应（含 304）；文件不存在返回 None"""
+        from flask import Response, request
+
+        entry = self._resolve(filename)
+        if entry is None:
+            return None
+        accept_encoding = request.headers.get('Accept-Encoding')
+        if entry['br_pending'] and 'br' in self._accepted(accept_encoding):
+            self._ensure_br(entry)
+        enc = self._pick_encoding(entry, accept_encoding)
+        body, etag = entry['bodies'][enc]
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': self.cache_control,
+            'Vary': 'Accept-Encoding',
+        }
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+        if enc != 'identity':
+            headers['Content-Encoding'] = enc
+        return Response(body, mimetype=entry['mimetype'], headers=headers)
+
+    def stats(self):
+        with self._lock:
+            files = list(self._files.values())
+        return {
+            'files': len(files),
+            'raw_bytes': sum(len(f['bodies']['identity'][0]) for f in files),
+            'gzip_bytes': sum(len(f['bodies'].get('gzip', f['bodies']['identity'])[0]) for f in files),
+            'brotli': brotli is not None,
+            'brotli_files': sum(1 for f in files if 'br' in f['bodies']),
+            'reload': self.reload,
+        }
@@ -1,7 +1,16 @@
 # modules/sync.py
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
+from config import ACCOUNT_SETS, SYNC_MAX_WORKERS
+from db import sql_trace
 from db.session import get_u8_connection, get_dst_connection
+from db.statements import Statements
+from modules.sync_progress import stage
+from modules.profiler import profiled_job
+from modules.snapshot import write_snapshot
+from modules.search_index import inventory_index, supplier_index, is_current_account
 
 # ---- 类型安全转换工具 ----
 def safe_str(x, maxlen=None):
@@ -45,118 +54,254 @@ def safe_datetime(x):
                 return datetime.now()
     return datetime.now()
 
+# ---- 本地快照列名（与目标表列一一对应，见 modules/snapshot.py） ----
+INVENTORY_COLUMNS = ['cInvCode', 'cInvName']
+BOM_COLUMNS = [
+    'mother_code', 'mother_name', 'mother_std', 'mother_unit', 'parent_scrap',
+    'version', 'version_desc', 'version_effdate', 'ident_code', 'ident_desc', 'status',
+    'mother_type', 'apply_did', 'row_no', 'child_sort_seq', 'process_seq', 'process_name',
+    'child_code', 'child_name', 'child_std', 'child_unit', 'base_qty_n', 'base_qty_d', 'comp_scrap',
+    'is_fixed', 'supply_type', 'use_qty', 'eff_beg_date', 'eff_end_date', 'is_byproduct',
+    'material_type', 'remark',
+]
+MOM_ORDER_COLUMNS = [
+    'MoCode', 'sortseq', 'status', 'audit_status', 'mo_type', 'InvCode',
+    'InvName', 'StartDate', 'DueDate', 'UnitName', 'Qty', 'MrpQty', 'MDeptCode',
+    'DepName', 'DeclaredQty', 'QualifiedInQty', 'UnfinishedQty', 'Assembler',
+    'SOCode', 'track_type', 'DemandCode', 'CreateUser', 'CloseUser', 'Define11',
+]
+PROSPECT_COLUMNS = ['cInvCode', 'cInvName', 'qty', 'source_type', 'snapshot_date', 'created_time']
+
+def _log_error(error_list, st, msg):
+    """记录一条同步异常，并计入当前阶段的异常数"""
+    if error_list is not None:
+        error_list.append(msg)
+    st.error()
+
+
+# ---- 批量写入（失败二分定位坏行） ----
+BAD_ROW_SAMPLES = 5      # 每类错误最多保留的坏行样例数
+BAD_ROW_REPR_MAX = 200   # 坏行样例截断长度
+
+def _error_class(ex):
+    """错误分类：pyodbc 异常取 SQLSTATE（如 22001 截断、23000 约束/主键冲突），其余取异常类名"""
+    state = ex.args[0] if getattr(ex, 'args', None) else None
+    if isinstance(state, str) and len(state) == 5:
+        return f"{type(ex).__name__}:{state}"
+    return type(ex).__name__
+
+class BatchWriter:
+    """
+    批量写入器
+    - 按 batch_size 执行 executemany，每批提交一次
+    - 创建时先提交连接上未提交的内容，此后每个事务只包含当前这一批（pyodbc 关闭自动提交时
+      SQL Server 处于 IMPLICIT_TRANSACTIONS 模式，写入语句自动开启事务，提交后 @@TRANCOUNT 回到 0）；
+      不再显式 BEGIN/SAVE TRANSACTION —— 在隐式事务模式下显式 BEGIN 会使 @@TRANCOUNT 变为 2，
+      commit() 只减一层，批次实际并未提交、锁跨批持有
+    - 某批失败时回滚当前事务（即只撤销这一批），再把该批二分后分别重试，直到定位到单个坏行
+      其余行照常写入并提交，坏行按错误分类计数，仅保留少量样例
+    - 行转换失败（写入前）也通过 record_bad(row, ex, '转换') 计入，同样有界
+    - finish() 把汇总写入 error_list（条数有界，不再逐行记录整行内容）
+    用法：
+        w = BatchWriter(dst_s, 'dst.bom.insert', 'BOM-INSERT', st, error_list)
+        w.write(rows)   # 或逐行 w.add(row)
+        w.finish()
+    """
+
+    def __init__(self, stmts, name, tag, st, error_list=None, batch_size=1000, keep_rows=False):
+        self.stmts, self.name, self.conn = stmts, name, stmts.conn
+        # 之前未提交的内容先提交，失败回滚时只会撤销本写入器当前这一批
+        self.conn.commit()
+        self.tag, self.st, self.error_list = tag, st, error_list
+        self.batch_size = batch_size
+        self.buffer = []
+        self.written = 0
+        # keep_rows=True 时保留已成功写入（已提交）的行，供写本地快照，快照与库内数据一致
+        self.written_rows = [] if keep_rows else None
+        self.bad = 0
+        self.bad_counts = {}   # (阶段, 错误分类) -> 坏行数
+        self.bad_samples = {}  # (阶段, 错误分类) -> [样例]
+
+    def add(self, row):
+        self.buffer.append(row)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def write(self, rows):
+        for i in range(0, len(rows), self.batch_size):
+            self._write_batch(rows[i:i + self.batch_size])
+            self.conn.commit()
+
+    def flush(self):
+        if self.buffer:
+            batch, self.buffer = self.buffer, []
+            self._write_batch(batch)
+            self.conn.commit()
+
+    def record_bad(self, row, ex, phase='写入'):
+        """记录一个坏行（phase：'写入' 为写库失败，'转换' 为写入前的行转换失败）"""
+        key = (phase, _error_class(ex))
+        self.bad += 1
+        self.bad_counts[key] = self.bad_counts.get(key, 0) + 1
+        samples = self.bad_samples.setdefault(key, [])
+        if len(samples) < BAD_ROW_SAMPLES:
+            samples.append(f"{repr(row)[:BAD_ROW_REPR_MAX]} => {str(ex)[:BAD_ROW_REPR_MAX]}")
+        self.st.error()
+
+    def finish(self):
+        """写入剩余缓冲，并把坏行汇总追加到 error_list"""
+        self.flush()
+        if self.error_list is not None:
+            for (phase, cls), n in self.bad_counts.items():
+                self.error_list.append(f"[{self.tag}] {cls} 共 {n} 行{phase}失败，样例：\n  " +
+                                       "\n  ".join(self.bad_samples.get((phase, cls), [])))
+        return self.written
+
+    # ---- 内部 ----
+    def _write_batch(self, batch, bisecting=False):
+        if not batch:
+            return
+        try:
+            self.stmts.executemany(self.name, batch)
+        except Exception as ex:
+            if not self._rollback():
+                # 连接已不可用：本批无法拆分重试，整体计为坏行
+                for row in batch:
+                    self.record_bad(row, ex)
+                return
+            if len(batch) == 1:
+                self.record_bad(batch[0], ex)
+                return
+            mid = len(batch) // 2
+            self._write_batch(batch[:mid], bisecting=True)
+            self._write_batch(batch[mid:], bisecting=True)
+            return
+        self.written += len(batch)
+        self.st.written(len(batch))
+        if self.written_rows is not None:
+            self.written_rows.extend(batch)
+        if bisecting:
+            # 二分过程中每个成功的子批立即提交，后续子批出错不会牵连已写入的行
+            self.conn.commit()
+
+    def _rollback(self):
+        """回滚当前事务（只含失败的这一批）；返回 False 表示回滚失败、本批无法再拆分重试"""
+        try:
+            self.conn.rollback()
+            return True
+        except Exception:
+            return False
+
 
 # 1. 存货档案同步
-def sync_inventory(error_list=None):
+def sync_inventory(error_list=None, account_code=None):
     """存货档案表差异同步"""
-    with get_u8_connection() as u8, get_dst_connection() as dst:
-        u8_cur, dst_cur = u8.cursor(), dst.cursor()
-        u8_cur.execute("SELECT cInvCode, cInvName FROM inventory")
-        u8_data = {safe_str(r[0]): safe_str(r[1]) for r in u8_cur.fetchall()}
-        dst_cur.execute("SELECT cInvCode, cInvName FROM Inventory")
-        dst_data = {safe_str(r[0]): safe_str(r[1]) for r in dst_cur.fetchall()}
-        # 新增/更新
+    with stage('inventory', account_code) as st, get_u8_connection(account_code) as u8, get_dst_connection(account_code) as dst:
+        u8s, dsts = Statements(u8), Statements(dst)
+        st.query('u8.inventory')
+        u8_data = {safe_str(r[0]): safe_str(r[1]) for r in u8s.fetchall('u8.inventory')}
+        st.read(len(u8_data))
+        st.query('dst.inventory.select')
+        dst_data = {safe_str(r[0]): safe_str(r[1]) for r in dsts.fetchall('dst.inventory.select')}
+        # 新增/更新（changed / deleted 记录实际生效的变更，用于给联想索引打补丁）
+        changed, deleted = [], []
+        st.query('dst.inventory.insert/update')
         for code, name in u8_data.items():
             if code in dst_data:
                 if name != dst_data[code]:
                     try:
-                        dst_cur.execute("UPDATE Inventory SET cInvName=? WHERE cInvCode=?", (name, code))
+                        dsts.execute('dst.inventory.update', (name, code))
+                        st.written()
+                        changed.append((code, name))
                     except Exception as ex:
-                        if error_list is not None: error_list.append(f"[Inventory-UPDATE]{code}-{name} {ex}")
+                        _log_error(error_list, st, f"[Inventory-UPDATE]{code}-{name} {ex}")
             else:
                 try:
-                    dst_cur.execute("INSERT INTO Inventory (cInvCode, cInvName) VALUES (?,?)", (code, name))
+                    dsts.execute('dst.inventory.insert', (code, name))
+                    st.written()
+                    changed.append((code, name))
                 except Exception as ex:
-                    if error_list is not None: error_list.append(f"[Inventory-INSERT]{code}-{name} {ex}")
+                    _log_error(error_list, st, f"[Inventory-INSERT]{code}-{name} {ex}")
         # 删除
+        st.query('dst.inventory.delete')
         to_delete = set(dst_data.keys()) - set(u8_data.keys())
         for code in to_delete:
             try:
-                dst_cur.execute("DELETE FROM Inventory WHERE cInvCode=?", (code,))
+                dsts.execute('dst.inventory.delete', (code,))
+                st.written()
+                deleted.append(code)
             except Exception as ex:
-                if error_list is not None: error_list.append(f"[Inventory-DELETE]{code} {ex}")
+                _log_error(error_list, st, f"[Inventory-DELETE]{code} {ex}")
         dst.commit()
+    write_snapshot('inventory', INVENTORY_COLUMNS, list(u8_data.items()), account_code)
+    if is_current_account(account_code):
+        for code, name in changed:
+            inventory_index.upsert(code, code, name, {'cInvCode': code, 'cInvName': name})
+        for code in deleted:
+            inventory_index.remove(code)
     print('Inventory差异同步完成')
 
 # 2. 供应商同步
-def sync_supplier(error_list=None):
+def sync_supplier(error_list=None, account_code=None):
     """供应商档案同步"""
-    with get_u8_connection() as u8, get_dst_connection() as dst:
-        u8_cur, dst_cur = u8.cursor(), dst.cursor()
-        u8_cur.execute("SELECT cVenName, cVenPerson, cVenPhone FROM Vendor")
-        u8_data = {safe_str(r[0]): (safe_str(r[1]), safe_str(r[2])) for r in u8_cur.fetchall()}
-        dst_cur.execute("SELECT supplier_name, contact, phone FROM Supplier")
-        dst_data = {safe_str(r[0]): (safe_str(r[1]), safe_str(r[2])) for r in dst_cur.fetchall()}
+    with stage('supplier', account_code) as st, get_u8_connection(account_code) as u8, get_dst_connection(account_code) as dst:
+        u8s, dsts = Statements(u8), Statements(dst)
+        st.query('u8.vendor')
+        u8_data = {safe_str(r[0]): (safe_str(r[1]), safe_str(r[2])) for r in u8s.fetchall('u8.vendor')}
+        st.read(len(u8_data))
+        st.query('dst.supplier.select')
+        dst_data = {safe_str(r[0]): (safe_str(r[1]), safe_str(r[2])) for r in dsts.fetchall('dst.supplier.select')}
+        st.query('dst.supplier.insert/update')
         for name, (person, phone) in u8_data.items():
             if name in dst_data:
                 if (person, phone) != dst_data[name]:
                     try:
-                        dst_cur.execute("UPDATE Supplier SET contact=?, phone=? WHERE supplier_name=?", (person, phone, name))
+                        dsts.execute('dst.supplier.update', (person, phone, name))
+                        st.written()
                     except Exception as ex:
-                        if error_list is not None: error_list.append(f"[Supplier-UPDATE]{name} {ex}")
+                        _log_error(error_list, st, f"[Supplier-UPDATE]{name} {ex}")
             else:
                 try:
-                    dst_cur.execute("INSERT INTO Supplier (supplier_name, contact, phone) VALUES (?, ?, ?)", (name, person, phone))
+                    dsts.execute('dst.supplier.insert', (name, person, phone))
+                    st.written()
                 except Exception as ex:
-                    if error_list is not None: error_list.append(f"[Supplier-INSERT]{name} {ex}")
+                    _log_error(error_list, st, f"[Supplier-INSERT]{name} {ex}")
         # 删除
+        st.query('dst.supplier.delete')
         to_delete = set(dst_data.keys()) - set(u8_data.keys())
         for name in to_delete:
             try:
-                dst_cur.execute("DELETE FROM Supplier WHERE supplier_name=?", (name,))
+                dsts.execute('dst.supplier.delete', (name,))
+                st.written()
             except Exception as ex:
-                if error_list is not None: error_list.append(f"[Supplier-DELETE]{name} {ex}")
+                _log_error(error_list, st, f"[Supplier-DELETE]{name} {ex}")
         dst.commit()
+    # 新增供应商的 id 由目标库生成，直接置为待重建，下次联想时整表加载
+    if is_current_account(account_code):
+        supplier_index.invalidate()
     print('Supplier差异同步完成')
 
 # 3. BOM同步
-def sync_bom(error_list=None):
+def sync_bom(error_list=None, account_code=None):
     """BOM差异同步（主键：母件编码+版本+子件编码+工序）"""
     BATCH_SIZE = 1000
-    with get_u8_connection() as u8, get_dst_connection() as dst:
-        u8_cur, dst_cur = u8.cursor(), dst.cursor()
+    with stage('bom', account_code) as st, get_u8_connection(account_code) as u8, get_dst_connection(account_code) as dst:
+        u8s, dsts = Statements(u8), Statements(dst)
         # 查询U8 BOM所有数据
-        u8_cur.execute("""
-            SELECT 
-                E.cInvCode, E.cInvName, E.cInvStd, F.cComUnitName, C.ParentScrap,
-                A.Version, A.VersionDesc, A.VersionEffDate, A.IdentCode, A.IdentDesc,
-                CASE WHEN A.CloseTime IS NULL THEN '审核' ELSE '停用' END,
-                CASE WHEN E.iPlanDefault = 1 THEN '自制件'
-                     WHEN E.iPlanDefault = 2 THEN '委外件'
-                     WHEN E.iPlanDefault = 3 THEN '采购件' END,
-                A.ApplyDId, NULL, B.SortSeq, B.OpSeq, NULL,
-                H.cInvCode, H.cInvName, H.cInvStd, I.cComUnitName, B.BaseQtyN, B.BaseQtyD, B.CompScrap,
-                CASE WHEN B.FVFlag = 0 THEN '是' ELSE '否' END, 
-                CASE WHEN H.iSupplyType = 0 THEN '领用'
-                     WHEN H.iSupplyType = 1 THEN '入库倒冲'
-                     WHEN H.iSupplyType = 2 THEN '工序倒冲'
-                     WHEN H.iSupplyType = 3 THEN '虚拟件' END,
-                B.BaseQtyN, B.EffBegDate, B.EffEndDate,
-                CASE WHEN B.ByproductFlag = 0 THEN '否' END, 
-                CASE WHEN H.iPlanDefault = 1 THEN '自制件'
-                     WHEN H.iPlanDefault = 2 THEN '委外件'
-                     WHEN H.iPlanDefault = 3 THEN '采购件' END,
-                B.Remark
-            FROM bom_bom A
-            LEFT JOIN bom_opcomponent B ON A.BomId = B.BomId
-            LEFT JOIN bom_parent C ON A.BomId = C.BomId
-            LEFT JOIN bas_part D ON C.ParentId = D.PartId
-            LEFT JOIN Inventory E ON D.InvCode = E.cInvCode
-            LEFT JOIN ComputationUnit F ON F.cComunitCode = E.cComUnitCode
-            LEFT JOIN bas_part G ON B.ComponentId = G.PartId
-            LEFT JOIN Inventory H ON G.InvCode = H.cInvCode
-            LEFT JOIN ComputationUnit I ON H.cComunitCode = I.cComUnitCode
-            WHERE A.CloseTime IS NULL and E.cInvCode is not null
-        """)
-        u8_rows = u8_cur.fetchall()
+        st.query('u8.bom')
+        u8_rows = u8s.fetchall('u8.bom')
+        st.read(len(u8_rows))
         print(f"[INFO] 从U8读取到{len(u8_rows)}条BOM数据")
         # 获取本地所有BOM主键集合
-        dst_cur.execute("SELECT mother_code, version, child_code, process_seq FROM BOM")
-        local_keys = set((r[0], r[1], r[2], r[3]) for r in dst_cur.fetchall())
+        st.query('dst.bom.keys')
+        local_keys = set((r[0], r[1], r[2], r[3]) for r in dsts.fetchall('dst.bom.keys'))
         u8_keys = set()
-        # 批量插入准备
+        # 批量插入准备；转换失败的行计入写入器的坏行汇总
+        # 快照 = 本地已有的行 + 本次实际写入成功的行（写入失败、转换失败的行不进快照）
+        writer = BatchWriter(dsts, 'dst.bom.insert', 'BOM-INSERT', st, error_list, BATCH_SIZE, keep_rows=True)
         insert_rows = []
-        for idx, row in enumerate(u8_rows):
+        kept_rows = []
+        for row in u8_rows:
             try:
                 row_safe = tuple(
                     safe_str(x) if isinstance(x, str) or x is None
@@ -170,78 +315,44 @@ def sync_bom(error_list=None):
                 k = (row_safe[0], row_safe[5], row_safe[17], row_safe[15])
                 u8_keys.add(k)
                 if k in local_keys:
+                    kept_rows.append(row_safe)
                     continue  # 已存在，无需插入
                 insert_rows.append(row_safe)
             except Exception as ex:
-                if error_list is not None: error_list.append(f"[BOM-ROW][{idx}]{ex}")
+                writer.record_bad(row, ex, '转换')
         # 批量写入
-        insert_sql = """
-            INSERT INTO BOM (
-                mother_code, mother_name, mother_std, mother_unit, parent_scrap,
-                version, version_desc, version_effdate, ident_code, ident_desc, status,
-                mother_type, apply_did, row_no, child_sort_seq, process_seq, process_name,
-                child_code, child_name, child_std, child_unit, base_qty_n, base_qty_d, comp_scrap,
-                is_fixed, supply_type, use_qty, eff_beg_date, eff_end_date, is_byproduct,
-                material_type, remark
-            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-        """
-        total_inserted = 0
-        for i in range(0, len(insert_rows), BATCH_SIZE):
-            batch = insert_rows[i:i + BATCH_SIZE]
-            try:
-                dst_cur.executemany(insert_sql, batch)
-                total_inserted += len(batch)
-            except Exception as ex:
-                if error_list is not None: error_list.append(f"[BOM-BATCH-INSERT][{i}]{ex}")
+        st.query('dst.bom.insert')
+        writer.write(insert_rows)
+        total_inserted = writer.finish()
         # 删除本地多余BOM
         to_delete = local_keys - u8_keys
-        delete_sql = "DELETE FROM BOM WHERE mother_code=? AND version=? AND child_code=? AND process_seq=?"
-        delete_rows = list(to_delete)
-        for i in range(0, len(delete_rows), BATCH_SIZE):
-            batch = delete_rows[i:i + BATCH_SIZE]
-            try:
-                dst_cur.executemany(delete_sql, batch)
-            except Exception as ex:
-                if error_list is not None: error_list.append(f"[BOM-BATCH-DELETE][{i}]{ex}")
+        st.query('dst.bom.delete')
+        deleter = BatchWriter(dsts, 'dst.bom.delete', 'BOM-DELETE', st, error_list, BATCH_SIZE)
+        deleter.write(list(to_delete))
+        total_deleted = deleter.finish()
         dst.commit()
-        print(f"[INFO] BOM同步完成：新增{total_inserted}条，删除{len(to_delete)}条")
+        print(f"[INFO] BOM同步完成：新增{total_inserted}条，删除{total_deleted}条，失败{writer.bad + deleter.bad}条")
+    write_snapshot('bom', BOM_COLUMNS, kept_rows + writer.written_rows, account_code)
     print('BOM差异同步完成')
 
 # 4. 生产订单同步
-def sync_mom_order(start_date, end_date, error_list=None):
+def sync_mom_order(start_date, end_date, error_list=None, account_code=None):
     """生产订单全量同步"""
     BATCH_SIZE = 1000
-    # 1. 先清空本地 mom_order 表
-    with get_dst_connection() as dst:
-        dst_cur = dst.cursor()
-        dst_cur.execute("TRUNCATE TABLE mom_order")
-        dst.commit()
-    # 2. 拉取U8区间生产订单数据
-    sql = """
-        SELECT A.MoCode, B.sortseq, G.EnumName, H.EnumName, I.EnumName, B.InvCode, 
-               E.cInvName, C.StartDate, C.DueDate, F.cComUnitName, B.Qty, B.MrpQty, B.MDeptCode,
-               D.cDepName, B.DeclaredQty, B.QualifiedInQty, (B.Qty - B.QualifiedInQty), B.Define31,
-               B.Define33, J.EnumName, B.DemandCode, A.CreateUser, B.CloseUser, A.Define11
-        FROM mom_order A
-        LEFT JOIN mom_orderdetail B ON A.MoId = B.MoId
-        LEFT JOIN mom_morder C ON A.MoId = C.MoId
-        LEFT JOIN Department D ON B.MDeptCode = D.cDepCode
-        LEFT JOIN Inventory E ON B.InvCode = E.cInvCode
-        LEFT JOIN ComputationUnit F ON E.cComUnitCode = F.cComunitCode
-        LEFT JOIN (select * from AA_Enum where enumtype = 'MO.Status' AND LocaleID = 'zh-CN') G ON B.Status = G.EnumCode
-        LEFT JOIN (select * from AA_Enum where enumtype = 'MO.AuditStatus' AND LocaleID = 'zh-CN') H ON B.AuditStatus = H.EnumCode
-        LEFT JOIN (select * from AA_Enum where enumtype = 'MO.MoClass' AND LocaleID = 'zh-CN') I ON B.MoClass = I.EnumCode
-        LEFT JOIN (select * from AA_Enum where enumtype = 'MO.SoType' AND LocaleID = 'zh-CN') J ON B.SoType = J.EnumCode
-        WHERE G.EnumName = '审核'
-          AND C.DueDate >= ? AND C.DueDate <= ?
-    """
     batch_rows = []
-    with get_u8_connection() as u8, get_dst_connection() as dst:
-        u8_cur, dst_cur = u8.cursor(), dst.cursor()
-        u8_cur.execute(sql, (start_date, end_date))
-        all_rows = u8_cur.fetchall()
+    with stage('mom_order', account_code) as st, get_u8_connection(account_code) as u8, get_dst_connection(account_code) as dst:
+        u8s, dsts = Statements(u8), Statements(dst)
+        # 1. 先清空本地 mom_order 表
+        st.query('dst.mom_order.truncate')
+        dsts.execute('dst.mom_order.truncate')
+        dst.commit()
+        # 2. 拉取U8区间生产订单数据
+        st.query(f"u8.mom_order {start_date} ~ {end_date}")
+        all_rows = u8s.fetchall('u8.mom_order', {'start_date': start_date, 'end_date': end_date})
+        st.read(len(all_rows))
         print(f"[INFO] 查询U8生产订单 {len(all_rows)} 条")
-        for idx, row in enumerate(all_rows):
+        writer = BatchWriter(dsts, 'dst.mom_order.insert', 'mom_order-INSERT', st, error_list, BATCH_SIZE)
+        for row in all_rows:
             try:
                 row_safe = tuple(
                     safe_str(x) if isinstance(x, str) or x is None
@@ -253,29 +364,32 @@ def sync_mom_order(start_date, end_date, error_list=None):
                 )
                 batch_rows.append(row_safe)
             except Exception as ex:
-                if error_list is not None: error_list.append(f"[mom_order-ROW][{idx}]{ex}")
-        insert_sql = """
-            INSERT INTO mom_order (
-                MoCode, sortseq, status, audit_status, mo_type, InvCode,
-                InvName, StartDate, DueDate, UnitName, Qty, MrpQty, MDeptCode,
-                DepName, DeclaredQty, QualifiedInQty, UnfinishedQty, Assembler,
-                SOCode, track_type, DemandCode, CreateUser, CloseUser, Define11
-            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-        """
-        total_inserted = 0
-        for i in range(0, len(batch_rows), BATCH_SIZE):
-            batch = batch_rows[i:i + BATCH_SIZE]
-            try:
-                dst_cur.executemany(insert_sql, batch)
-                total_inserted += len(batch)
-            except Exception as ex:
-                if error_list is not None: error_list.append(f"[mom_order-BATCH-INSERT][{i}]{ex}")
+                writer.record_bad(row, ex, '转换')
+        st.query('dst.mom_order.insert')
+        writer.write(batch_rows)
+        total_inserted = writer.finish()
         dst.commit()
-        print(f"[INFO] mom_order同步完成，共插入{total_inserted}条")
+        print(f"[INFO] mom_order同步完成，共插入{total_inserted}条，失败{writer.bad}条")
+        # 表为清空后全量写入：从目标表读回作快照（含自增 id，与 MRP 查库路径一致）
+        st.query('dst.mom_order.snapshot')
+        snapshot_rows = dsts.fetchall('dst.mom_order.snapshot')
+    write_snapshot('mom_order', ['id'] + MOM_ORDER_COLUMNS, snapshot_rows, account_code,
+                   meta={'start_date': str(start_date), 'end_date': str(end_date)})
     print('mom_order全量同步完成')
 
 # 5. 库存展望全量同步
-def sync_prospect_stock(start_date, end_date, error_list=None):
+PROSPECT_QUERIES = [
+    'u8.prospect.current_stock',           # 1. 现存量结存数
+    'u8.prospect.po_in_transit',           # 2. 在途采购订单数
+    'u8.prospect.arrival_pending',         # 3. 采购到货待检数
+    'u8.prospect.mo_unfinished',           # 4. 生产未完成数量
+    'u8.prospect.so_undelivered',          # 5. 销售订单未发货数量
+    'u8.prospect.dispatch_unshipped',      # 6. 发货未出库数量
+    'u8.prospect.material_out_unaudited',  # 7. 材料出库单未审核数量
+    'u8.prospect.mo_unissued',             # 8. 生产未领料数量
+]
+
+def sync_prospect_stock(start_date, end_date, error_list=None, account_code=None):
     """库存展望表全量同步（目标库连接）"""
 
     # 定义每个字段最大长度，便于 safe_str 截断
@@ -283,118 +397,33 @@ def sync_prospect_stock(start_date, end_date, error_list=None):
     CINVNAME_MAXLEN = 100
     SOURCETYPE_MAXLEN = 50
 
-    # 1. 先清空本地表
-    with get_dst_connection() as dst_conn:
-        dst_cur = dst_conn.cursor()
-        dst_cur.execute("TRUNCATE TABLE prospect_stock")
-        dst_conn.commit()
-
-    # 日期参数处理
-    if isinstance(end_date, (datetime, date)):
-        end_date_str = end_date.strftime('%Y-%m-%d')
+    # 日期参数处理：作为 DATE 参数绑定（语句见 db/statements.py，不再拼接进 SQL 文本）
+    if isinstance(end_date, datetime):
+        end_dt = end_date.date()
+    elif isinstance(end_date, date):
+        end_dt = end_date
     else:
-        end_date_str = str(end_date)
+        end_dt = datetime.strptime(str(end_date)[:10], '%Y-%m-%d').date()
+    end_date_str = end_dt.strftime('%Y-%m-%d')
     snapshot_date = datetime.now().date()
-    created_time = datetime.now()
-
-    sqls = [
-        # 1. 现存量结存数
-        ("""
-            SELECT a.cInvCode, b.cInvName, SUM(a.iQuantity) AS qty, '现存量结存数' AS source_type
-            FROM CurrentStock a
-            LEFT JOIN inventory b ON a.cInvCode = b.cInvCode
-            WHERE a.iQuantity > 0 AND a.cwhcode IN ('0401','0402','0403') AND a.cInvCode NOT LIKE '51%'
-            GROUP BY a.cInvCode, b.cInvName
-        """),
-        # 2. 在途采购订单数
-        (f"""
-            SELECT a.cInvCode, c.cInvName, SUM(a.iQuantity - ISNULL(e.在途采购订单数, 0)) AS qty, '在途采购订单数' AS source_type
-            FROM PO_Podetails a
-            LEFT JOIN PO_Pomain b ON a.POID = b.POID
-            LEFT JOIN Inventory c ON a.cInvCode = c.cInvCode
-            LEFT JOIN (
-                SELECT cInvCode, iPOsID, SUM(iQuantity) AS 在途采购订单数
-                FROM rdrecords01
-                GROUP BY cInvCode, iPOsID
-            ) e ON a.ID = e.iPOsID
-            WHERE a.dArriveDate <= '{end_date_str}' AND a.cbCloser IS NULL AND b.cPOID IS NOT NULL AND a.cInvCode NOT LIKE '51%'
-            GROUP BY a.cInvCode, c.cInvName
-        """),
-        # 3. 采购到货待检数
-        (f"""
-            SELECT d.cInvCode, a.cInvName, SUM(d.iQuantity) AS qty, '采购到货待检数' AS source_type
-            FROM rdrecords01 d
-            LEFT JOIN RdRecord01 e ON d.ID = e.ID
-            LEFT JOIN inventory a ON a.cInvCode = d.cInvCode
-            WHERE e.dDate <= '{end_date_str}' AND e.cHandler IS NULL AND d.cInvCode NOT LIKE '51%'
-            GROUP BY d.cInvCode, a.cInvName
-        """),
-        # 4. 生产未完成数量
-        (f"""
-            SELECT B.InvCode, E.cInvName, SUM(B.Qty - B.QualifiedInQty) AS qty, '生产未完成数量' AS source_type
-            FROM mom_order A
-            LEFT JOIN mom_orderdetail B ON A.MoId = B.MoId
-            LEFT JOIN mom_morder C ON A.MoId = C.MoId
-            LEFT JOIN Inventory E ON B.InvCode = E.cInvCode
-            WHERE C.DueDate <= '{end_date_str}' AND B.Status <> '4' AND B.InvCode NOT LIKE '51%'
-            GROUP BY B.InvCode, E.cInvName
-        """),
-        # 5. 销售订单未发货数量
-        (f"""
-            SELECT a.cInvCode, b.cInvName, SUM(a.iQuantity - ISNULL(d.发货数量, 0)) AS qty, '销售订单未发货数量' AS source_type
-            FROM SO_SODetails a
-            LEFT JOIN Inventory b ON a.cInvCode = b.cInvCode
-            LEFT JOIN SO_SOMain c ON a.cSOCode = c.cSOCode
-            LEFT JOIN (
-                SELECT cInvCode, iSOsID, SUM(iQuantity) AS 发货数量
-                FROM DispatchLists
-                GROUP BY cInvCode, iSOsID
-            ) d ON a.iSOsID = d.iSOsID
-            WHERE c.dPreDateBT <= '{end_date_str}' AND a.cSCloser IS NULL AND c.cVerifier IS NOT NULL AND a.cInvCode NOT LIKE '51%'
-            GROUP BY a.cInvCode, b.cInvName
-        """),
-        # 6. 发货未出库数量
-        (f"""
-            SELECT a.cInvCode, c.cInvName, SUM(a.iQuantity - ISNULL(d.出库数量, 0)) AS qty, '发货未出库数量' AS source_type
-            FROM DispatchLists a
-            LEFT JOIN DispatchList b ON a.DLID = b.DLID
-            LEFT JOIN Inventory c ON a.cInvCode = c.cInvCode
-            LEFT JOIN (
-                SELECT cInvCode, iDLsID, SUM(iQuantity) AS 出库数量
-                FROM rdrecords32
-                GROUP BY cInvCode, iDLsID
-            ) d ON a.iDLsID = d.iDLsID
-            WHERE b.dDate <= '{end_date_str}' AND a.cSCloser IS NULL AND a.cInvCode NOT LIKE '51%'
-            GROUP BY a.cInvCode, c.cInvName
-        """),
-        # 7. 材料出库单未审核数量
-        (f"""
-            SELECT b.cInvCode, c.cInvName, b.iQuantity AS qty, '材料出库单未审核数量' AS source_type
-            FROM rdrecords11 b
-            LEFT JOIN rdRecord11 a ON a.ID = b.ID
-            LEFT JOIN Inventory c ON b.cInvCode = c.cInvCode
-            WHERE a.dDate <= '{end_date_str}' AND a.cHandler IS NULL AND b.cInvCode NOT LIKE '51%'
-        """),
-        # 8. 生产未领料数量
-        (f"""
-            SELECT A.InvCode, D.cInvName, SUM(A.Qty - A.IssQty) AS qty, '生产未领料数量' AS source_type
-            FROM mom_moallocate A
-            LEFT JOIN mom_orderdetail B ON A.MoDId = B.MoDId
-            LEFT JOIN mom_morder C ON B.MoId = C.MoId
-            LEFT JOIN Inventory D ON A.InvCode = D.cInvCode
-            WHERE C.DueDate <= '{end_date_str}' AND B.Status <> '4' AND A.InvCode NOT LIKE '51%'
-            GROUP BY A.InvCode, D.cInvName
-        """)
-    ]
+
     BATCH_SIZE = 3000  # 每批插入条数
-    buffer = []
 
-    with get_u8_connection() as u8_conn, get_dst_connection() as dst_conn:
-        u8_cur, dst_cur = u8_conn.cursor(), dst_conn.cursor()
-        for sql in sqls:
+    with stage('prospect_stock', account_code) as st, get_u8_connection(account_code) as u8_conn, get_dst_connection(account_code) as dst_conn:
+        u8s, dsts = Statements(u8_conn), Statements(dst_conn)
+        # 1. 先清空本地表
+        st.query('dst.prospect_stock.truncate')
+        dsts.execute('dst.prospect_stock.truncate')
+        dst_conn.commit()
+
+        # 满 BATCH_SIZE 自动批量写入并 commit；失败批次二分定位坏行
+        writer = BatchWriter(dsts, 'dst.prospect_stock.insert', 'prospect_stock-INSERT', st, error_list, BATCH_SIZE,
+                             keep_rows=True)
+        for name in PROSPECT_QUERIES:
             try:
-                u8_cur.execute(sql)
-                rows = u8_cur.fetchall()
+                st.query(name)
+                rows = u8s.fetchall(name, {'end_date': end_dt})
+                st.read(len(rows))
                 for row in rows:
                     try:
                         cInvCode = safe_str(row[0], CINVCODE_MAXLEN)
@@ -403,59 +432,41 @@ def sync_prospect_stock(start_date, end_date, error_list=None):
                         source_type = safe_str(row[3], SOURCETYPE_MAXLEN)
                         snap_date = safe_date(snapshot_date).strftime('%Y-%m-%d')  # DATE to str
                         create_time = safe_datetime(datetime.now()).strftime('%Y-%m-%d %H:%M:%S')  # DATETIME to str
-
-                        buffer.append((cInvCode, cInvName, qty, source_type, snap_date, create_time))
-
-                        # 满BATCH_SIZE就批量写入并commit
-                        if len(buffer) >= BATCH_SIZE:
-                            try:
-                                dst_cur.executemany(
-                                    "INSERT INTO prospect_stock (cInvCode, cInvName, qty, source_type, snapshot_date, created_time) VALUES (?, ?, ?, ?, ?, ?)",
-                                    buffer
-                                )
-                                dst_conn.commit()
-                                buffer.clear()
-                            except Exception as ex:
-                                print("[prospect_stock-BATCH-INSERT]", ex)
-                                if error_list is not None:
-                                    error_list.append(f"[prospect_stock-BATCH-INSERT] {ex}")
-                                buffer.clear()
                     except Exception as ex:
-                        print("[prospect_stock-INSERT]", ex)
-                        if error_list is not None:
-                            error_list.append(f"[prospect_stock-INSERT] {ex}  {row}")
+                        writer.record_bad(row, ex, '转换')
+                        continue
+                    writer.add((cInvCode, cInvName, qty, source_type, snap_date, create_time))
                 # 每个SQL执行完，及时插入剩余不足一批的
-                if buffer:
-                    try:
-                        dst_cur.executemany(
-                            "INSERT INTO prospect_stock (cInvCode, cInvName, qty, source_type, snapshot_date, created_time) VALUES (?, ?, ?, ?, ?, ?)",
-                            buffer
-                        )
-                        dst_conn.commit()
-                    except Exception as ex:
-                        print("[prospect_stock-BATCH-INSERT-LAST]", ex)
-                        if error_list is not None:
-                            error_list.append(f"[prospect_stock-BATCH-INSERT-LAST] {ex}")
-                    buffer.clear()
+                writer.flush()
             except Exception as ex:
-                print("[prospect_stock-SELECT]", ex)
-                if error_list is not None:
-                    error_list.append(f"[prospect_stock-SELECT] {ex}")
+                print("[prospect_stock-SELECT]", name, ex)
+                _log_error(error_list, st, f"[prospect_stock-SELECT][{name}] {ex}")
+        total_inserted = writer.finish()
+        print(f"[INFO] prospect_stock同步完成，共插入{total_inserted}条，失败{writer.bad}条")
+    write_snapshot('prospect_stock', PROSPECT_COLUMNS, writer.written_rows, account_code,
+                   meta={'end_date': end_date_str, 'snapshot_date': str(snapshot_date)})
     print('prospect_stock全量同步完成')
 
 
 # ========== 主调度入口 ==========
-def sync_all(start_date, end_date):
+@profiled_job('sync_all')
+def sync_all(start_date, end_date, account_code=None):
     """
     主调度入口：按前端传递的区间参数调用各同步模块
+    :param account_code: 账套代码，不传则同步当前账套；异常日志按账套分文件
+    :return: 本账套同步汇总 {account, status, errors, elapsed, error_file}
     """
     error_list = []
-    sync_inventory(error_list)
-    sync_supplier(error_list)
-    sync_bom(error_list)
-    sync_mom_order(start_date, end_date, error_list)
-    sync_prospect_stock(start_date, end_date, error_list)
-    error_file = os.path.abspath("sync_error_log.txt")
+    started = time.monotonic()
+    with stage('all', account_code) as st:
+        st.query('inventory'); sync_inventory(error_list, account_code)
+        st.query('supplier'); sync_supplier(error_list, account_code)
+        st.query('bom'); sync_bom(error_list, account_code)
+        st.query('mom_order'); sync_mom_order(start_date, end_date, error_list, account_code)
+        st.query('prospect_stock'); sync_prospect_stock(start_date, end_date, error_list, account_code)
+        st.errors = len(error_list)
+    log_name = f"sync_error_log_{account_code}.txt" if account_code else "sync_error_log.txt"
+    error_file = os.path.abspath(log_name)
     with open(error_file, "w", encoding="utf-8") as f:
         if error_list:
             for i, err in enumerate(error_list, 1):
@@ -463,6 +474,43 @@ def sync_all(start_date, end_date):
         else:
             f.write("本次同步无异常。\n")
     print(f"[调试] 日志输出路径：{error_file}")
+    return {
+        'account': account_code,
+        'status': 'done',
+        'errors': len(error_list),
+        'elapsed': round(time.monotonic() - started, 2),
+        'error_file': error_file,
+    }
+
+@profiled_job('sync_all_accounts')
+def sync_all_accounts(start_date, end_date, account_codes=None, max_workers=None):
+    """
+    多账套并行同步：每个账套在独立线程中跑完整流程（独立连接、独立异常日志）
+    :param account_codes: 要同步的账套代码列表，不传则为 ACCOUNT_SETS 全部
+    :param max_workers: 并发账套数，不传取 config.SYNC_MAX_WORKERS
+    :return: 汇总 {accounts: [各账套汇总], failed: 失败账套数, elapsed: 总耗时}
+    """
+    codes = list(account_codes or ACCOUNT_SETS.keys())
+    unknown = [c for c in codes if c not in ACCOUNT_SETS]
+    if unknown:
+        raise ValueError(f"未配置的账套: {', '.join(unknown)}")
+    started = time.monotonic()
+
+    def run(code):
+        try:
+            return sync_all(start_date, end_date, account_code=code)
+        except Exception as ex:
+            print(f"[ERROR] 账套{code}同步失败: {ex}")
+            return {'account': code, 'status': 'failed', 'msg': str(ex)}
+
+    workers = max(1, min(len(codes), max_workers or SYNC_MAX_WORKERS))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sync-account') as pool:
+        results = list(pool.map(sql_trace.bind(run), codes))
+    return {
+        'accounts': results,
+        'failed': sum(1 for r in results if r['status'] == 'failed'),
+        'elapsed': round(time.monotonic() - started, 2),
+    }
 
 if __name__ == '__main__':
     sync_all('2025-07-01', '2025-07-31')
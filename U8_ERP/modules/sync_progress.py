@@ -0,0 +1,145 @@
+# modules/sync_progress.py
+"""
+同步进度广播
+- 各同步阶段（sync.py）通过 stage() 上报：读取行数、写入行数、行/秒、当前阶段与查询、累计异常数
+- 事件保存在进程内环形缓冲区，带递增序号，供 /api/sync/progress/stream（SSE）订阅
+- 写入/读取计数做了节流（默认 0.5 秒最多广播一次），避免逐行 INSERT 时刷屏
+"""
+
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# 环形缓冲区长度 / 计数类事件最小广播间隔（秒）
+MAX_EVENTS = 500
+PUBLISH_INTERVAL = 0.5
+
+
+class SyncProgress:
+    """进程内进度事件总线（线程安全）"""
+
+    def __init__(self, maxlen=MAX_EVENTS):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=maxlen)
+        self._seq = 0
+        self._latest = {}  # (account, stage) -> 最新一条事件，供非流式查询
+
+    def publish(self, event: dict) -> int:
+        with self._cond:
+            self._seq += 1
+            event = dict(event, seq=self._seq, ts=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            self._events.append(event)
+            if event.get('stage'):
+                self._latest[(event.get('account'), event['stage'])] = event
+            self._cond.notify_all()
+            return self._seq
+
+    def events_after(self, last_seq: int, timeout: float = None) -> list:
+        """
+        返回序号大于 last_seq 的事件；若暂无新事件则最多等待 timeout 秒
+        若订阅方落后太多（缓冲区已滚动），直接从最早的可用事件开始
+        """
+        with self._cond:
+            if self._seq <= last_seq and timeout:
+                self._cond.wait_for(lambda: self._seq > last_seq, timeout=timeout)
+            return [e for e in self._events if e['seq'] > last_seq]
+
+    def running(self) -> bool:
+        """是否有阶段仍在进行（最新事件既不是 done 也不是 failed）"""
+        with self._cond:
+            return any(e['status'] not in ('done', 'failed') for e in self._latest.values())
+
+    def latest(self) -> list:
+        with self._cond:
+            return sorted(self._latest.values(), key=lambda e: e['seq'])
+
+    @property
+    def last_seq(self) -> int:
+        with self._cond:
+            return self._seq
+
+
+progress = SyncProgress()
+
+
+class StageProgress:
+    """
+    单个同步阶段的计数器，用法：
+        with stage('bom') as st:
+            st.query('U8 BOM 查询')
+            st.read(len(rows))
+            st.written(n)
+            st.error()
+    退出 with 时自动广播 done / failed
+    """
+
+    def __init__(self, name, account=None, bus=None):
+        self.name = name
+        self.account = account
+        self.bus = bus or progress
+        self.current_query = None
+        self.rows_read = 0
+        self.rows_written = 0
+        self.errors = 0
+        self.started = time.monotonic()
+        self._last_publish = 0.0
+        self._publish('start', force=True)
+
+    # ---- 上报 ----
+    def query(self, text):
+        self.current_query = text
+        self._publish('query', force=True)
+
+    def read(self, n=1):
+        self.rows_read += n
+        self._publish('read')
+
+    def written(self, n=1):
+        self.rows_written += n
+        self._publish('write')
+
+    def error(self, n=1):
+        self.errors += n
+        self._publish('error')
+
+    def finish(self, status='done', msg=None):
+        self._publish(status, force=True, msg=msg)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.finish('done')
+        else:
+            self.finish('failed', msg=str(exc))
+        return False
+
+    # ---- 内部 ----
+    def snapshot(self, status, msg=None):
+        elapsed = time.monotonic() - self.started
+        return {
+            'stage': self.name,
+            'account': self.account,
+            'status': status,
+            'query': self.current_query,
+            'rows_read': self.rows_read,
+            'rows_written': self.rows_written,
+            'rows_per_sec': round(self.rows_written / elapsed, 1) if elapsed > 0 else 0.0,
+            'errors': self.errors,
+            'elapsed': round(elapsed, 2),
+            'msg': msg,
+        }
+
+    def _publish(self, status, force=False, msg=None):
+        now = time.monotonic()
+        if not force and now - self._last_publish < PUBLISH_INTERVAL:
+            return
+        self._last_publish = now
+        self.bus.publish(self.snapshot(status, msg))
+
+
+def stage(name, account=None):
+    """开始一个同步阶段并返回其计数器（多账套并行同步时带上账套代码以区分）"""
+    return StageProgress(name, account)
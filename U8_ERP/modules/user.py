@@ -4,12 +4,21 @@
 - 提供用户注册、登录验证、用户信息查询、用户启用/禁用等功能
 - 所有操作均通过SQLAlchemy ORM操作数据库
 - 支持多账套数据库（如有需求可传入account_code参数）
+- 登录成功签发带有效期的签名令牌（itsdangerous），令牌只含用户名和账套
+- 按令牌识别身份时走进程内用户缓存（USER_CACHE_TTL），启用/禁用、用户增删改时失效，
+  已登录请求识别身份不访问数据库
+- SQLAlchemy 与 ORM 模型在首次访问数据库时才导入，只处理已登录请求/页面的进程不加载
 """
 
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
-from db.models import SysUser
-from config import get_conn_str, CURRENT_ACCOUNT_CODE
+import threading
+import time
+
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from config import get_conn_str, CURRENT_ACCOUNT_CODE, SECRET_KEY, TOKEN_MAX_AGE, USER_CACHE_TTL
+
+# 引擎按连接串缓存（自带连接池），不再每次查询新建引擎
+_engines = {}
+_engines_lock = threading.Lock()
 
 def get_engine(account_code=None):
     """
@@ -18,9 +27,23 @@ def get_engine(account_code=None):
     :return: SQLAlchemy engine对象
     """
     conn_str = get_conn_str(account_code)
-    # pyodbc支持的SQLAlchemy连接字符串写法
-    sqlalchemy_url = f"mssql+pyodbc:///?odbc_connect={conn_str.replace(';', '%3B')}"
-    return create_engine(sqlalchemy_url, echo=False, future=True)
+    with _engines_lock:
+        engine = _engines.get(conn_str)
+        if engine is None:
+            from sqlalchemy import create_engine
+            # pyodbc支持的SQLAlchemy连接字符串写法
+            sqlalchemy_url = f"mssql+pyodbc:///?odbc_connect={conn_str.replace(';', '%3B')}"
+            engine = _engines[conn_str] = create_engine(sqlalchemy_url, echo=False, future=True, pool_pre_ping=True)
+        return engine
+
+def dispose_engines():
+    """
+    丢弃已缓存引擎的连接池（多进程部署时在子进程 fork 后调用，不与父进程共用 ODBC 连接）
+    """
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose(close=False)
+        _engines.clear()
 
 def get_session(account_code=None):
     """
@@ -28,6 +51,7 @@ def get_session(account_code=None):
     :param account_code: 账套代码
     :return: session对象
     """
+    from sqlalchemy.orm import sessionmaker
     engine = get_engine(account_code)
     Session = sessionmaker(bind=engine)
     return Session()
@@ -39,6 +63,7 @@ def get_user_by_username(username, account_code=None):
     :param account_code: 账套代码
     :return: SysUser对象或None
     """
+    from db.models import SysUser
     session = get_session(account_code)
     user = session.query(SysUser).filter(SysUser.username == username).first()
     session.close()
@@ -55,6 +80,7 @@ def create_user(username, password, realname='', role='user', remark=None, accou
     :param account_code: 账套代码
     :return: 创建的SysUser对象
     """
+    from db.models import SysUser
     session = get_session(account_code)
     user = SysUser(
         username=username,
@@ -67,6 +93,7 @@ def create_user(username, password, realname='', role='user', remark=None, accou
     session.commit()
     session.refresh(user)
     session.close()
+    invalidate_user(username, account_code)
     return user
 
 def check_user_login(username, password, account_code=None):
@@ -79,6 +106,7 @@ def check_user_login(username, password, account_code=None):
     """
     user = get_user_by_username(username, account_code)
     if user and user.password == password and user.is_active:
+        _cache_put(account_code, username, _identity_of(user))
         return user
     else:
         return None
@@ -90,12 +118,14 @@ def set_user_active(username, is_active=True, account_code=None):
     :param is_active: True为启用，False为禁用
     :param account_code: 账套代码
     """
+    from db.models import SysUser
     session = get_session(account_code)
     user = session.query(SysUser).filter(SysUser.username == username).first()
     if user:
         user.is_active = is_active
         session.commit()
     session.close()
+    invalidate_user(username, account_code)
 
 def list_users(account_code=None):
     """
@@ -103,7 +133,75 @@ def list_users(account_code=None):
     :param account_code: 账套代码
     :return: 用户对象列表
     """
+    from db.models import SysUser
     session = get_session(account_code)
     users = session.query(SysUser).all()
     session.close()
     return users
+
+# ====================== 身份缓存 ======================
+# (账套, 用户名) -> (身份 dict, 写入时间)；身份不含密码
+_user_cache = {}
+_user_cache_lock = threading.Lock()
+
+def _identity_of(user):
+    return {
+        "id": user.id,
+        "username": user.username,
+        "realname": user.realname,
+        "role": user.role,
+        "is_active": bool(user.is_active),
+    }
+
+def _cache_key(account_code, username):
+    return (account_code or CURRENT_ACCOUNT_CODE, username)
+
+def _cache_put(account_code, username, identity):
+    with _user_cache_lock:
+        _user_cache[_cache_key(account_code, username)] = (identity, time.time())
+
+def get_identity(username, account_code=None):
+    """
+    用户身份（id/用户名/姓名/角色/是否启用），优先取缓存；用户不存在返回 None
+    不存在的用户也缓存（值为 None），避免伪造用户名反复打到数据库
+    """
+    key = _cache_key(account_code, username)
+    with _user_cache_lock:
+        hit = _user_cache.get(key)
+        if hit and time.time() - hit[1] < USER_CACHE_TTL:
+            return hit[0]
+    user = get_user_by_username(username, account_code)
+    identity = _identity_of(user) if user else None
+    _cache_put(account_code, username, identity)
+    return identity
+
+def invalidate_user(username=None, account_code=None):
+    """用户变更后调用；不传用户名时清空全部（如按 ID 修改、批量修改）"""
+    with _user_cache_lock:
+        if username is None:
+            _user_cache.clear()
+        else:
+            _user_cache.pop(_cache_key(account_code, username), None)
+
+# ====================== 登录令牌 ======================
+_serializer = URLSafeTimedSerializer(SECRET_KEY, salt="u8-erp-login")
+
+def issue_token(user, account_code=None):
+    """登录成功后签发令牌（签名 + 时间戳，TOKEN_MAX_AGE 秒内有效）"""
+    return _serializer.dumps({"u": user.username, "a": account_code or CURRENT_ACCOUNT_CODE})
+
+def verify_token(token):
+    """
+    校验令牌并返回身份 dict（含 account_code）；签名错误、过期、用户不存在或已禁用返回 None
+    签名校验在本地完成，身份取自缓存，稳定状态下不访问数据库
+    """
+    if not token:
+        return None
+    try:
+        data = _serializer.loads(token, max_age=TOKEN_MAX_AGE)
+    except (BadSignature, SignatureExpired):
+        return None
+    identity = get_identity(data.get("u"), data.get("a"))
+    if not identity or not identity["is_active"]:
+        return None
+    return dict(identity, account_code=data.get("a"))
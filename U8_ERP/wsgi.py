@@ -0,0 +1,26 @@
+# wsgi.py
+"""
+生产部署入口（WSGI）
+- gunicorn 按 gunicorn.conf.py 启动工作进程（默认单进程 × 多线程），应用在主进程预加载后 fork
+- 直接运行本文件等同于：gunicorn -c gunicorn.conf.py wsgi:app；此时本文件作为 __main__ 只负责拼参数，
+  应用由 gunicorn 导入 wsgi 模块时创建一次
+用法：
+    python wsgi.py                            # 前台运行
+    gunicorn -c gunicorn.conf.py wsgi:app     # 或直接调用 gunicorn
+    kill -HUP <主进程PID>                      # 平滑轮换工作进程（进行中的请求处理完再退出）
+"""
+
+import os
+import sys
+
+if __name__ != '__main__':
+    from app import create_app
+
+    app = create_app()
+else:
+    from gunicorn.app.wsgiapp import run
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(here)
+    sys.argv = [sys.argv[0], '-c', os.path.join(here, 'gunicorn.conf.py'), 'wsgi:app'] + sys.argv[1:]
+    run()